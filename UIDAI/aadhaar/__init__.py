@@ -0,0 +1 @@
+# Shared helpers for the Aadhaar profiling and merge scripts.
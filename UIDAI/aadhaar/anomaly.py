@@ -0,0 +1,221 @@
+"""Dense per-district and per-pincode daily series, with vectorized anomaly checks.
+
+advanced_insights.py used to check only the national monthly totals for
+month-over-month jumps, because a groupby per district would be slow. A
+SeriesIndex instead holds one dense matrix per measure (enrolment,
+demographic and biometric totals):
+
+- one row per district (or pincode) and one column per day from the first
+  to the last date; days without rows are 0,
+- float32 and C-contiguous, so each series is a contiguous run of memory.
+
+Each check runs over every series at once and returns the flagged cells:
+
+    zscore      |x - mean| / std of the `window` days before, over threshold
+    mad         0.6745 * |x - median| / MAD of the `window` days before,
+                over threshold (more robust to the spikes it is looking for)
+    pct_change  change from the previous day or month, in %, over threshold
+
+A cell is only flagged when it or its baseline reaches `min_count`, so
+small counts going from 1 to 3 are not reported. Rolling means and
+variances come from cumulative sums. Rolling medians come from sorting a
+sliding window view, a block of series at a time.
+
+District series come from the rollup cube's state x district x day cells
+without reading the CSV. Pincode series stream cleaned_aadhar_data.csv once.
+
+Usage: python -m aadhaar.anomaly [--level district|pincode] [--method zscore|mad|pct_change]
+                                 [--measure enrolment] [--window 14] [--threshold T] [--freq day|month]
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from aadhaar import dates, metrics, schema
+from aadhaar.cube import BIOMETRIC, DEMOGRAPHIC, ENROLMENT, Cube
+
+SERIES_MEASURES = {'enrolment': ENROLMENT, 'demographic': DEMOGRAPHIC, 'biometric': BIOMETRIC}
+LEVELS = {'district': ['state', 'district'], 'pincode': ['state', 'district', 'pincode']}
+METHODS = ['zscore', 'mad', 'pct_change']
+WINDOW = 14
+THRESHOLDS = {'zscore': 3.0, 'mad': 3.5, 'pct_change': 50.0}
+MIN_COUNT = 10
+CHUNK_SIZE = 500000
+# Series per block for the rolling median (block x days x window float32s)
+MEDIAN_BLOCK = 2048
+
+
+def _day_numbers(values):
+    if pd.api.types.is_integer_dtype(values.dtype):
+        return values.to_numpy(dtype=np.int64)
+    days = values.to_numpy(dtype='datetime64[D]')
+    return np.where(np.isnat(days), dates.MISSING_DAY, days.astype(np.int64))
+
+
+def _median(windows):
+    # Median along the last axis. Sorting short windows is several times
+    # faster than np.median's partition per window.
+    ordered = np.sort(windows, axis=-1)
+    n = ordered.shape[-1]
+    return (ordered[..., (n - 1) // 2].astype(np.float64) + ordered[..., n // 2]) / 2
+
+
+class SeriesIndex:
+    def __init__(self, keys, first_day, values):
+        # keys: one row of key columns per series; values: measure ->
+        # (series, days) float32
+        self.keys = keys
+        self.first_day = first_day
+        self.values = values
+
+    @classmethod
+    def from_cells(cls, cells, levels):
+        # Rows summed per key and day (more than one row per key and day is fine)
+        day = _day_numbers(cells['date'])
+        known = (day != dates.MISSING_DAY) & cells[levels].notna().all(axis=1).to_numpy()
+        cells, day = cells[known], day[known]
+        codes, keys = pd.MultiIndex.from_frame(cells[levels].astype(object)).factorize(sort=True)
+        keys = pd.DataFrame(list(keys), columns=levels)
+        first = int(day.min()) if len(day) else 0
+        span = int(day.max()) - first + 1 if len(day) else 0
+        slot = codes.astype(np.int64) * span + (day - first)
+        values = {}
+        for measure, columns in SERIES_MEASURES.items():
+            weights = cells[columns].to_numpy(dtype=np.float64).sum(axis=1)
+            dense = np.bincount(slot, weights=weights, minlength=len(keys) * span)
+            values[measure] = dense.astype(np.float32).reshape(len(keys), span)
+        return cls(keys, first, values)
+
+    @classmethod
+    def from_cube(cls, cube):
+        return cls.from_cells(cube.cells, LEVELS['district'])
+
+    @classmethod
+    def from_csv(cls, csv_path, level='pincode', chunksize=CHUNK_SIZE):
+        levels = LEVELS[level]
+        measures = [col for columns in SERIES_MEASURES.values() for col in columns]
+        parts = []
+        with metrics.span('series_index') as s:
+            for chunk in schema.read_chunks(csv_path, schema.CLEANED, usecols=levels + ['date'] + measures,
+                                            chunksize=chunksize):
+                parts.append(chunk.groupby(levels + ['date'], observed=True, sort=False)[measures].sum())
+            cells = (pd.concat(parts).reset_index() if parts
+                     else schema.empty(schema.CLEANED, levels + ['date'] + measures))
+            index = cls.from_cells(cells, levels)
+            s.rows_out = len(index.keys)
+        return index
+
+    @property
+    def days(self):
+        return self.first_day + np.arange(self.values['enrolment'].shape[1])
+
+    def monthly(self, measure):
+        # (month periods, (series, months) sums); the first and last months
+        # may be partial, as in the national trend
+        months = self.days.astype('datetime64[D]').astype('datetime64[M]')
+        starts = np.flatnonzero(np.r_[True, months[1:] != months[:-1]]) if len(months) else np.zeros(0, int)
+        values = self.values[measure]
+        sums = np.add.reduceat(values, starts, axis=1) if len(starts) else values
+        return pd.PeriodIndex(months[starts], freq='M'), sums
+
+    def _flags(self, measure, mask, value, baseline, score, periods):
+        series, column = np.nonzero(mask)
+        flags = self.keys.iloc[series].reset_index(drop=True)
+        flags['period'] = periods[column]
+        flags['measure'] = measure
+        flags['value'] = value[series, column]
+        flags['baseline'] = baseline[series, column]
+        flags['score'] = score[series, column]
+        order = np.lexsort((column, series, -np.abs(flags['score'].to_numpy())))
+        return flags.iloc[order].reset_index(drop=True)
+
+    def _periods(self, offset=0):
+        return pd.DatetimeIndex(dates.decode_days(self.days[offset:].astype(np.int32)))
+
+    def zscore(self, measure='enrolment', window=WINDOW, threshold=THRESHOLDS['zscore'], min_count=MIN_COUNT):
+        x = self.values[measure].astype(np.float64)
+        if x.shape[1] <= window:
+            return self._flags(measure, np.zeros((len(x), 0), bool), x, x, x, self._periods())
+        zero = np.zeros((len(x), 1))
+        c1 = np.concatenate([zero, np.cumsum(x, axis=1)], axis=1)
+        c2 = np.concatenate([zero, np.cumsum(x * x, axis=1)], axis=1)
+        # Trailing window [t - window, t) for every t >= window
+        s1 = c1[:, window:-1] - c1[:, :-window - 1]
+        s2 = c2[:, window:-1] - c2[:, :-window - 1]
+        mean = s1 / window
+        std = np.sqrt(np.maximum(s2 - s1 * mean, 0) / (window - 1))
+        current = x[:, window:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            score = np.where(std > 0, (current - mean) / std, 0.0)
+        mask = (np.abs(score) > threshold) & (np.maximum(current, mean) >= min_count)
+        return self._flags(measure, mask, current, mean, score, self._periods(window))
+
+    def mad(self, measure='enrolment', window=WINDOW, threshold=THRESHOLDS['mad'], min_count=MIN_COUNT):
+        x = self.values[measure]
+        if x.shape[1] <= window:
+            return self._flags(measure, np.zeros((len(x), 0), bool), x, x, x, self._periods())
+        current = x[:, window:].astype(np.float64)
+        median = np.empty_like(current)
+        spread = np.empty_like(current)
+        for start in range(0, len(x), MEDIAN_BLOCK):
+            block = np.lib.stride_tricks.sliding_window_view(x[start:start + MEDIAN_BLOCK], window, axis=1)[:, :-1]
+            med = _median(block)
+            median[start:start + MEDIAN_BLOCK] = med
+            spread[start:start + MEDIAN_BLOCK] = _median(np.abs(block - med[..., None].astype(np.float32)))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            score = np.where(spread > 0, 0.6745 * (current - median) / spread, 0.0)
+        mask = (np.abs(score) > threshold) & (np.maximum(current, median) >= min_count)
+        return self._flags(measure, mask, current, median, score, self._periods(window))
+
+    def pct_change(self, measure='enrolment', threshold=THRESHOLDS['pct_change'], freq='month',
+                   min_count=MIN_COUNT):
+        if freq == 'month':
+            periods, x = self.monthly(measure)
+        else:
+            periods, x = self._periods(), self.values[measure]
+        x = x.astype(np.float64)
+        previous, current = x[:, :-1], x[:, 1:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            score = np.where(previous > 0, (current - previous) / previous * 100, 0.0)
+        mask = (np.abs(score) > threshold) & (np.maximum(current, previous) >= min_count)
+        return self._flags(measure, mask, current, previous, score, periods[1:])
+
+    def detect(self, method, measure='enrolment', threshold=None, window=WINDOW, freq='month',
+               min_count=MIN_COUNT):
+        threshold = THRESHOLDS[method] if threshold is None else threshold
+        with metrics.span(f'anomaly_{method}', rows_in=self.values[measure].size) as s:
+            if method == 'pct_change':
+                flags = self.pct_change(measure, threshold, freq, min_count)
+            else:
+                flags = getattr(self, method)(measure, window, threshold, min_count)
+            s.rows_out = len(flags)
+        return flags
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Flag anomalous district or pincode days and months.')
+    parser.add_argument('--csv', default='cleaned_aadhar_data.csv')
+    parser.add_argument('--level', choices=list(LEVELS), default='district')
+    parser.add_argument('--method', choices=METHODS, default='mad')
+    parser.add_argument('--measure', choices=list(SERIES_MEASURES), default='enrolment')
+    parser.add_argument('--window', type=int, default=WINDOW, help='trailing days for zscore and mad')
+    parser.add_argument('--threshold', type=float, default=None,
+                        help='score above which a cell is flagged (default: ' +
+                             ', '.join(f'{m} {t:g}' for m, t in THRESHOLDS.items()) + ')')
+    parser.add_argument('--freq', choices=['day', 'month'], default='month', help='period of pct_change')
+    parser.add_argument('--min-count', type=float, default=MIN_COUNT)
+    parser.add_argument('--top', type=int, default=20, help='flags to print')
+    parser.add_argument('--out', help='write every flagged cell to this CSV')
+    args = parser.parse_args()
+    if args.level == 'district':
+        index = SeriesIndex.from_cube(Cube.load_or_build(args.csv))
+    else:
+        index = SeriesIndex.from_csv(args.csv, args.level)
+    flags = index.detect(args.method, args.measure, args.threshold, args.window, args.freq, args.min_count)
+    print(f"{len(flags)} anomalous cells in {len(index.keys)} {args.level} series x "
+          f"{index.values[args.measure].shape[1]} days ({args.method}, {args.measure})")
+    if not flags.empty:
+        print(flags.head(args.top).to_string(index=False))
+    if args.out:
+        flags.to_csv(args.out, index=False)
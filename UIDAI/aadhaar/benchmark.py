@@ -0,0 +1,217 @@
+"""End-to-end benchmark of the pipeline stages on synthetic shards.
+
+Generates data with aadhaar/synthetic.py when the work directory does not
+already hold shards for the requested row count. Each stage then runs in its
+own process inside the work directory. A full run starts from a cold cache;
+with --stages the outputs of earlier runs are reused.
+
+    profile_<dataset>   the shard profiler over every shard of one dataset
+    ingest              columnar cache build for all shards
+    merge               merge_csv.py --all-shards
+    clean               clean_data.py (also builds the rollup cube)
+    clean_out_of_core   clean_data.py --out-of-core
+    check_merged, check_cleaned
+    analyze, extract_insights, advanced_insights, visualize
+
+Wall time, input rows, rows/sec and the peak RSS of the stage process are
+appended as one JSON line per stage to the results file, together with the
+commit, library versions and CPU count, so runs can be compared over time.
+
+Usage: python -m aadhaar.benchmark --rows 1000000 --workdir bench_data
+"""
+import argparse
+import datetime
+import glob
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from aadhaar import columnar, cube, figures, ingest, join, metrics, partitioned, profiler, synthetic
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS = os.path.join(ROOT, 'merge_folder')
+RESULTS_FILE = 'benchmark_results.jsonl'
+MERGED = 'merged_aadhar_data.csv'
+CLEANED = 'cleaned_aadhar_data.csv'
+
+# (stage, command, input) where the command is either a merge_folder script
+# with its arguments or None for a stage run by this module, and the input
+# is a dataset name, 'shards' for every shard, or a CSV in the work directory
+STAGES = [
+    ('profile_enrolment', None, 'enrolment'),
+    ('profile_demographic', None, 'demographic'),
+    ('profile_biometric', None, 'biometric'),
+    ('ingest', None, 'shards'),
+    ('merge', ['merge_csv.py', '--all-shards'], 'shards'),
+    ('clean', ['clean_data.py'], MERGED),
+    ('clean_out_of_core', ['clean_data.py', '--out-of-core'], MERGED),
+    ('check_merged', ['check_merged.py'], MERGED),
+    ('check_cleaned', ['check_cleaned.py'], CLEANED),
+    ('analyze', ['analyze_merged_data.py'], CLEANED),
+    ('extract_insights', ['extract_insights.py'], CLEANED),
+    ('advanced_insights', ['advanced_insights.py'], CLEANED),
+    ('visualize', ['visualize_data.py', '--force'], CLEANED),
+]
+STAGE_NAMES = [name for name, _, _ in STAGES]
+
+
+def count_rows(path):
+    # Data rows in a CSV, i.e. newlines minus the header
+    lines = 0
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 24), b''):
+            lines += block.count(b'\n')
+    return max(lines - 1, 0)
+
+
+def ensure_data(workdir, rows, seed=0, shard_rows=synthetic.SHARD_ROWS):
+    meta_path = os.path.join(workdir, 'synthetic.json')
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if (meta['rows'], meta['seed'], meta['shard_rows']) == (rows, seed, shard_rows):
+            return meta
+        for path in glob.glob(os.path.join(workdir, 'api_data_aadhar_*.csv')):
+            os.remove(path)
+    return synthetic.generate(rows, workdir, seed, shard_rows)
+
+
+def reset(workdir):
+    # A full run starts cold: no columnar cache, cube, partitioned store,
+    # figures or other pipeline outputs
+    for name in [columnar.CACHE_DIR, partitioned.STORE_DIR, figures.STATE_DIR]:
+        shutil.rmtree(os.path.join(workdir, name), ignore_errors=True)
+    for name in [cube.CUBE_FILE, MERGED, CLEANED, figures.MANIFEST] + figures.FILES:
+        path = os.path.join(workdir, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def shards(workdir):
+    return join.discover_shards(workdir)
+
+
+def stage_rows(workdir, source):
+    if source == 'shards':
+        paths = [p for paths in shards(workdir).values() for p in paths]
+    elif source in join.DATASETS:
+        paths = shards(workdir)[source]
+    else:
+        paths = [os.path.join(workdir, source)]
+    return sum(count_rows(p) for p in paths if os.path.exists(p))
+
+
+def run_stage(name):
+    # Library stages, run inside the child process started by measure()
+    if name.startswith('profile_'):
+        dataset = name[len('profile_'):]
+        profiler.write_reports(shards('.')[dataset], dataset=f'api_data_aadhar_{dataset}')
+    elif name == 'ingest':
+        ingest.map_shards(columnar.ensure_cached, [path for paths in shards('.').values() for path in paths])
+    else:
+        raise ValueError(f"{name} is not a library stage")
+
+
+def measure(name, command, workdir, log, metrics_file=None):
+    if command is None:
+        argv = [sys.executable, '-m', 'aadhaar.benchmark', '--run-stage', name]
+    else:
+        argv = [sys.executable, os.path.join(SCRIPTS, command[0])] + command[1:]
+    env = dict(os.environ, MPLBACKEND='Agg',
+               PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])))
+    if metrics_file:
+        env[metrics.METRICS_ENV] = os.path.abspath(metrics_file)
+    start = time.perf_counter()
+    process = subprocess.Popen(argv, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    # wait4 gives the rusage of this one child; ru_maxrss is in KiB on Linux
+    _, status, usage = os.wait4(process.pid, 0)
+    seconds = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return process.returncode, seconds, usage.ru_maxrss / 1024
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'cpus': os.cpu_count(),
+        'machine': platform.machine(),
+    }
+
+
+def previous_results(results_file, rows):
+    # Latest earlier result per stage at the same data size
+    latest = {}
+    if os.path.exists(results_file):
+        with open(results_file) as f:
+            for line in f:
+                record = json.loads(line)
+                if record['dataset_rows'] == rows and record['returncode'] == 0:
+                    latest[record['stage']] = record
+    return latest
+
+
+def benchmark(rows, workdir, stages=None, results_file=RESULTS_FILE, seed=0, shard_rows=synthetic.SHARD_ROWS,
+              metrics_file=None):
+    ensure_data(workdir, rows, seed, shard_rows)
+    if not stages:
+        reset(workdir)
+    os.makedirs(os.path.join(workdir, 'logs'), exist_ok=True)
+    previous = previous_results(results_file, rows)
+    run = {'run': datetime.datetime.now().isoformat(timespec='seconds'), 'dataset_rows': rows, **environment()}
+
+    print(f"{'stage':<20}{'rows':>12}{'seconds':>10}{'rows/sec':>12}{'peak MB':>10}{'vs last':>9}")
+    records = []
+    for name, command, source in STAGES:
+        if stages and name not in stages:
+            continue
+        n = stage_rows(workdir, source)
+        with open(os.path.join(workdir, 'logs', f'{name}.log'), 'w') as log:
+            returncode, seconds, peak_mb = measure(name, command, workdir, log, metrics_file)
+        record = {**run, 'stage': name, 'rows': n, 'seconds': round(seconds, 3),
+                  'rows_per_sec': round(n / seconds) if seconds else None,
+                  'peak_rss_mb': round(peak_mb, 1), 'returncode': returncode}
+        records.append(record)
+        with open(results_file, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+        last = previous.get(name)
+        change = f"{seconds / last['seconds'] - 1:+.0%}" if last and last['seconds'] else ''
+        status = '' if returncode == 0 else f'  FAILED ({returncode}), see logs/{name}.log'
+        print(f"{name:<20}{n:>12}{seconds:>10.2f}{record['rows_per_sec'] or 0:>12}{peak_mb:>10.1f}{change:>9}{status}")
+    return records
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark every pipeline stage on synthetic shards.')
+    parser.add_argument('--rows', type=int, default=1000000, help='rows per dataset (e.g. 1000000, 10000000, 100000000)')
+    parser.add_argument('--workdir', default='bench_data')
+    parser.add_argument('--stages', nargs='+', choices=STAGE_NAMES, help='run only these stages (default: all)')
+    parser.add_argument('--results', default=RESULTS_FILE, help='JSON lines file the results are appended to')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--shard-rows', type=int, default=synthetic.SHARD_ROWS)
+    parser.add_argument('--metrics', help='also collect per-span metrics (aadhaar/metrics.py) into this file')
+    parser.add_argument('--run-stage', choices=STAGE_NAMES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run_stage:
+        metrics.begin(args.run_stage)
+        run_stage(args.run_stage)
+    else:
+        benchmark(args.rows, args.workdir, args.stages, args.results, args.seed, args.shard_rows, args.metrics)
@@ -0,0 +1,23 @@
+"""Row filters shared by clean_data.py, the pipeline runner and the incremental merged store."""
+from aadhaar import keys
+
+# state, district or pincode equal to '100000' marks placeholder data
+PLACEHOLDER = '100000'
+
+
+def placeholder_mask(df):
+    state = df['state'].astype(object)
+    district = df['district'].astype(object)
+    return (state == PLACEHOLDER) | (district == PLACEHOLDER) | (df['pincode'] == int(PLACEHOLDER))
+
+
+def drop_placeholders(df):
+    return df[~placeholder_mask(df)]
+
+
+def clean(df):
+    # The clean_data.py recipe: strip the column names, keep the first row per
+    # (date, state, district, pincode) and drop placeholder rows
+    df = df.rename(columns=str.strip)
+    key = keys.KeyEncoder.fit([df]).encode(df)
+    return drop_placeholders(df[keys.first_occurrence(key)])
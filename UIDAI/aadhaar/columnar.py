@@ -0,0 +1,211 @@
+"""Columnar binary cache of the api_data_aadhar_*_*.csv shards.
+
+Each shard is parsed once into a directory of .npy column files next to the
+CSV (.columnar_cache/<shard>/):
+
+- state/district are dictionary-encoded (sorted dictionary, int16 codes,
+  -1 for missing) and load back as pandas categoricals,
+- pincode and the age count columns use the narrowest integer type that
+  holds their values,
+- date is pre-parsed from dd-mm-yyyy into int32 day numbers (aadhaar/dates.py).
+
+meta.json records the source size, mtime and BLAKE2 hash. A size change
+rebuilds the cache; an mtime change with the same size rebuilds only if the
+hash differs too.
+
+Usage: python -m aadhaar.columnar <csv> [<csv> ...]
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from aadhaar import dates, ingest, metrics, schema
+
+CACHE_DIR = '.columnar_cache'
+CACHE_VERSION = 2
+CHUNK_SIZE = 250000
+DICTIONARY_COLUMNS = schema.CATEGORY_COLUMNS
+INT_TYPES = [np.uint8, np.uint16, np.uint32, np.int8, np.int16, np.int32, np.int64]
+
+
+def cache_path(csv_path):
+    directory, name = os.path.split(os.path.abspath(csv_path))
+    return os.path.join(directory, CACHE_DIR, os.path.splitext(name)[0])
+
+
+def file_hash(path, block_size=1 << 20):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _narrow_int(values):
+    if len(values) == 0:
+        return values.astype(np.uint8)
+    lo, hi = values.min(), values.max()
+    for dtype in INT_TYPES:
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return values.astype(dtype)
+    return values
+
+
+def _read_meta(path):
+    meta_file = os.path.join(path, 'meta.json')
+    if not os.path.exists(meta_file):
+        return None
+    with open(meta_file) as f:
+        return json.load(f)
+
+
+def _write_meta(path, meta):
+    tmp = os.path.join(path, 'meta.json.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(meta, f, indent=1)
+    os.replace(tmp, os.path.join(path, 'meta.json'))
+
+
+def fingerprint(path):
+    st = os.stat(path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'hash': file_hash(path)}
+
+
+def source_unchanged(path, size, mtime_ns, digest):
+    st = os.stat(path)
+    if size != st.st_size:
+        return False
+    # Touched but possibly unchanged: fall back to the content hash
+    return mtime_ns == st.st_mtime_ns or file_hash(path) == digest
+
+
+def is_fresh(csv_path, meta):
+    if meta is None or meta.get('version') != CACHE_VERSION:
+        return False
+    if not source_unchanged(csv_path, meta['source_size'], meta['source_mtime_ns'], meta['source_hash']):
+        return False
+    mtime_ns = os.stat(csv_path).st_mtime_ns
+    if meta['source_mtime_ns'] != mtime_ns:
+        meta['source_mtime_ns'] = mtime_ns
+        _write_meta(cache_path(csv_path), meta)
+    return True
+
+
+def _encode_dictionary(series, lookup):
+    codes, uniques = pd.factorize(series)
+    local = np.array([lookup.setdefault(value, len(lookup)) for value in uniques], dtype=np.int32)
+    return np.where(codes >= 0, local[codes] if len(local) else codes, -1)
+
+
+def ingest(csv_path, chunksize=CHUNK_SIZE):
+    path = cache_path(csv_path)
+    st = os.stat(csv_path)
+    parts = {}
+    lookups = {}
+    columns = None
+    rows = 0
+    # Declared columns only, dates as day numbers; unparseable dates are
+    # cached as missing and counted in the metadata
+    invalid = Counter()
+    for chunk in schema.read_chunks(csv_path, chunksize=chunksize, invalid=invalid):
+        columns = columns or list(chunk.columns)
+        rows += len(chunk)
+        for col in columns:
+            values = chunk[col]
+            if col in DICTIONARY_COLUMNS:
+                part = _encode_dictionary(values, lookups.setdefault(col, {}))
+            else:
+                part = values.to_numpy()
+            parts.setdefault(col, []).append(part)
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+    meta = {
+        'version': CACHE_VERSION,
+        'source': os.path.basename(csv_path),
+        'source_size': st.st_size,
+        'source_mtime_ns': st.st_mtime_ns,
+        'source_hash': file_hash(csv_path),
+        'rows': rows,
+        'invalid_dates': sum(invalid.values()),
+        'columns': {},
+    }
+    for col in columns or []:
+        values = np.concatenate(parts[col])
+        info = {}
+        if col == 'date':
+            info['kind'] = 'date'
+        elif col in lookups:
+            # Re-number so that code order matches sorted string order
+            dictionary = sorted(lookups[col])
+            remap = np.empty(len(dictionary), dtype=np.int32)
+            for new, value in enumerate(dictionary):
+                remap[lookups[col][value]] = new
+            values = np.where(values >= 0, remap[values] if len(remap) else values, -1)
+            values = values.astype(np.int16 if len(dictionary) < np.iinfo(np.int16).max else np.int32)
+            info['kind'] = 'dictionary'
+            info['dictionary'] = dictionary
+        elif pd.api.types.is_integer_dtype(values.dtype):
+            values = _narrow_int(values)
+            info['kind'] = 'int'
+        else:
+            # Counts with gaps stay floating point, but 32 bits is plenty
+            values = values.astype(np.float32)
+            info['kind'] = 'float'
+        info['dtype'] = values.dtype.str
+        np.save(os.path.join(path, f'{col}.npy'), values)
+        meta['columns'][col] = info
+    meta['column_order'] = columns or []
+    _write_meta(path, meta)
+    return meta
+
+
+def ensure_cached(csv_path):
+    meta = _read_meta(cache_path(csv_path))
+    if not is_fresh(csv_path, meta):
+        with metrics.span('read_csv') as s:
+            meta = ingest(csv_path)
+            s.rows_out = meta['rows']
+    return meta
+
+
+def load_shard(csv_path, columns=None, mmap=True):
+    meta = ensure_cached(csv_path)
+    path = cache_path(csv_path)
+    data = {}
+    for col in columns or meta['column_order']:
+        info = meta['columns'][col]
+        values = np.load(os.path.join(path, f'{col}.npy'), mmap_mode='r' if mmap else None)
+        if info['kind'] == 'date':
+            data[col] = dates.decode_days(np.asarray(values))
+        elif info['kind'] == 'dictionary':
+            data[col] = pd.Categorical.from_codes(np.asarray(values), categories=info['dictionary'])
+        else:
+            data[col] = values
+    return pd.DataFrame(data)
+
+
+def load_dataset(csv_paths, columns=None):
+    frames = schema.align_categories(ingest.map_shards(lambda path: load_shard(path, columns), csv_paths))
+    return pd.concat(frames, ignore_index=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the columnar cache for api_data_aadhar_* CSV shards.')
+    parser.add_argument('files', nargs='+')
+    args = parser.parse_args()
+    for file in args.files:
+        meta = _read_meta(cache_path(file))
+        if is_fresh(file, meta):
+            print(f"{file}: cache up to date")
+        else:
+            meta = ingest(file)
+            print(f"{file}: cached {meta['rows']} rows in {cache_path(file)}")
@@ -0,0 +1,135 @@
+"""Streaming, mergeable Pearson correlation for the count columns.
+
+CorrelationAccumulator keeps the row count, the mean vector and the centred
+co-moment matrix sum((x - mean)(x - mean)^T). Each chunk is centred on its
+own mean and folded in with the pairwise update of Chan et al. This avoids
+the cancellation of the raw sum-of-products formula, and accumulators from
+different chunks, shards or worker processes merge exactly. subtract()
+inverts merge(), so rows that were folded in can be taken back out when
+they are replaced (aadhaar/incremental.py).
+
+GroupedCorrelation keeps one accumulator per key (e.g. state). It updates
+all of them from a chunk with vectorized bincounts, so per-state matrices
+come from the same pass as the national one.
+
+Rows with a missing value in any column are skipped (listwise deletion);
+the scripts fill NaN with 0 before correlating anyway.
+"""
+import numpy as np
+import pandas as pd
+
+
+def _as_matrix(values):
+    matrix = np.asarray(values, dtype='float64')
+    return matrix[~np.isnan(matrix).any(axis=1)] if matrix.size else matrix.reshape(0, matrix.shape[-1])
+
+
+class CorrelationAccumulator:
+    def __init__(self, columns):
+        self.columns = list(columns)
+        k = len(self.columns)
+        self.n = 0
+        self.mean = np.zeros(k)
+        self.comoment = np.zeros((k, k))
+
+    @classmethod
+    def from_moments(cls, columns, n, mean, comoment):
+        acc = cls(columns)
+        acc.n, acc.mean, acc.comoment = n, mean, comoment
+        return acc
+
+    def update(self, values):
+        matrix = _as_matrix(values)
+        if len(matrix) == 0:
+            return self
+        mean = matrix.mean(axis=0)
+        centred = matrix - mean
+        return self.merge(CorrelationAccumulator.from_moments(self.columns, len(matrix), mean, centred.T @ centred))
+
+    def merge(self, other):
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            self.n, self.mean, self.comoment = other.n, other.mean.copy(), other.comoment.copy()
+            return self
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.comoment = self.comoment + other.comoment + np.outer(delta, delta) * (self.n * other.n / n)
+        self.mean = self.mean + delta * (other.n / n)
+        self.n = n
+        return self
+
+    def subtract(self, other):
+        # Remove rows that were merged in, given their own accumulator
+        if other.n == 0:
+            return self
+        n = self.n - other.n
+        if n == 0:
+            self.n, self.mean, self.comoment = 0, np.zeros_like(self.mean), np.zeros_like(self.comoment)
+            return self
+        mean = (self.mean * self.n - other.mean * other.n) / n
+        delta = other.mean - mean
+        self.comoment = self.comoment - other.comoment - np.outer(delta, delta) * (n * other.n / self.n)
+        self.mean = mean
+        self.n = n
+        return self
+
+    def covariance(self):
+        cov = self.comoment / (self.n - 1) if self.n > 1 else np.full_like(self.comoment, np.nan)
+        return pd.DataFrame(cov, index=self.columns, columns=self.columns)
+
+    def correlation(self):
+        std = np.sqrt(np.diag(self.comoment))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = self.comoment / np.outer(std, std)
+        # Like DataFrame.corr(), the diagonal is exactly 1 wherever a variance exists
+        np.fill_diagonal(corr, np.where(std > 0, 1.0, np.nan))
+        return pd.DataFrame(corr, index=self.columns, columns=self.columns)
+
+
+class GroupedCorrelation:
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.groups = {}
+
+    def update(self, keys, values):
+        matrix = np.asarray(values, dtype='float64')
+        codes, uniques = pd.factorize(np.asarray(keys))
+        keep = (codes >= 0) & ~np.isnan(matrix).any(axis=1)
+        codes, matrix = codes[keep], matrix[keep]
+        if len(codes) == 0:
+            return self
+
+        n_groups, k = len(uniques), len(self.columns)
+        counts = np.bincount(codes, minlength=n_groups)
+        means = np.column_stack([np.bincount(codes, weights=matrix[:, i], minlength=n_groups)
+                                 for i in range(k)]) / np.maximum(counts, 1)[:, None]
+        centred = matrix - means[codes]
+        comoments = np.zeros((n_groups, k, k))
+        for i in range(k):
+            for j in range(i, k):
+                comoments[:, i, j] = comoments[:, j, i] = np.bincount(
+                    codes, weights=centred[:, i] * centred[:, j], minlength=n_groups)
+
+        for g, key in enumerate(uniques):
+            if counts[g]:
+                chunk = CorrelationAccumulator.from_moments(self.columns, int(counts[g]), means[g], comoments[g])
+                self.groups.setdefault(key, CorrelationAccumulator(self.columns)).merge(chunk)
+        return self
+
+    def merge(self, other):
+        for key, acc in other.groups.items():
+            self.groups.setdefault(key, CorrelationAccumulator(self.columns)).merge(acc)
+        return self
+
+    def subtract(self, other):
+        for key, acc in other.groups.items():
+            if self.groups[key].subtract(acc).n == 0:
+                del self.groups[key]
+        return self
+
+    def correlation(self, key):
+        return self.groups[key].correlation()
+
+    def matrices(self):
+        return {key: acc.correlation() for key, acc in sorted(self.groups.items())}
@@ -0,0 +1,179 @@
+"""Materialized rollup cube over cleaned_aadhar_data.csv.
+
+analyze_merged_data.py, extract_insights.py, advanced_insights.py and
+visualize_data.py used to reload the whole cleaned CSV and run overlapping
+groupbys. clean_data.py now builds this cube once, streaming the CSV in
+chunks. It holds the seven count measures and the row count summed per
+state x district x day. State, district, month and date rollups are derived
+from those cells.
+
+The cube also keeps mergeable row-level correlation accumulators for the
+measures, nationally and per state (aadhaar/correlation.py), so the Pearson
+matrices are available without the rows.
+
+replace() swaps the rows of some states on some days in place: their
+cells are recomputed from the new rows and the old rows' moments are
+subtracted, so aadhaar/incremental.py keeps a cube current at the cost of
+the rows it changes.
+"""
+import os
+import pickle
+
+import pandas as pd
+
+from aadhaar import columnar, dates, grouping, metrics, schema
+from aadhaar.correlation import CorrelationAccumulator, GroupedCorrelation
+
+CUBE_FILE = 'aadhar_cube.pkl'
+CUBE_VERSION = 2
+CHUNK_SIZE = 500000
+CELL_KEYS = ['state', 'district', 'date']
+ENROLMENT = ['age_0_5', 'age_5_17', 'age_18_greater']
+DEMOGRAPHIC = ['demo_age_5_17', 'demo_age_17_']
+BIOMETRIC = ['bio_age_5_17', 'bio_age_17_']
+MEASURES = ENROLMENT + DEMOGRAPHIC + BIOMETRIC
+
+
+def add_totals(df):
+    df['total_enrolment'] = df[ENROLMENT].sum(axis=1)
+    df['total_demo_population'] = df[DEMOGRAPHIC].sum(axis=1)
+    df['total_bio_updates'] = df[BIOMETRIC].sum(axis=1)
+    return df
+
+
+class Cube:
+    def __init__(self, cells, moments, state_moments, source=None):
+        self.cells = cells
+        self.moments = moments
+        self.state_moments = state_moments
+        self.source = source
+
+    @classmethod
+    def build(cls, csv_path, chunksize=CHUNK_SIZE):
+        chunks = schema.read_chunks(csv_path, schema.CLEANED, usecols=CELL_KEYS + MEASURES, chunksize=chunksize)
+        return cls._from_chunks(chunks, csv_path)
+
+    @classmethod
+    def from_frame(cls, df, csv_path, chunksize=CHUNK_SIZE):
+        # The same cube from rows already in memory; csv_path is the CSV they
+        # were written to, which the cube is checked against on load
+        return cls._from_chunks((df.iloc[i:i + chunksize] for i in range(0, len(df), chunksize)), csv_path)
+
+    @classmethod
+    def empty(cls):
+        return cls._fold([], None)
+
+    @classmethod
+    def _from_chunks(cls, chunks, csv_path):
+        with metrics.span('groupby') as s:
+            cube = cls._fold(chunks, csv_path)
+            s.rows_in, s.rows_out = cube.record_count, len(cube.cells)
+        return cube
+
+    @classmethod
+    def _fold(cls, chunks, csv_path):
+        parts = []
+        moments = CorrelationAccumulator(MEASURES)
+        state_moments = GroupedCorrelation(MEASURES)
+        for chunk in chunks:
+            chunk.columns = chunk.columns.str.strip()
+            values = chunk[MEASURES].fillna(0).astype('float64')
+            moments.update(values.to_numpy())
+            state_moments.update(chunk['state'], values.to_numpy())
+            values['rows'] = 1
+            values['state'] = chunk['state'].astype(object)
+            values['district'] = chunk['district'].astype(object)
+            if pd.api.types.is_datetime64_any_dtype(chunk['date'].dtype):
+                values['date'] = chunk['date']
+            elif pd.api.types.is_integer_dtype(chunk['date'].dtype):
+                values['date'] = dates.decode_days(chunk['date'].to_numpy())
+            else:
+                values['date'] = dates.decode_days(dates.parse_days(chunk['date']))
+            parts.append(values.groupby(CELL_KEYS, dropna=False, sort=False).sum())
+        if parts:
+            cells = pd.concat(parts).groupby(level=CELL_KEYS, dropna=False).sum().reset_index()
+        else:
+            cells = pd.DataFrame(columns=CELL_KEYS + MEASURES + ['rows'])
+        return cls(cells, moments, state_moments, source=columnar.fingerprint(csv_path) if csv_path else None)
+
+    def replace(self, old, new):
+        # Replace the rows of the (state, date) pairs in old and new: old are
+        # the rows the cube holds for them and new their replacement
+        removed, added = self._fold([old], None), self._fold([new], None)
+        pairs = pd.MultiIndex.from_frame(pd.concat([old, new])[['state', 'date']].astype({'state': object}))
+        stale = pd.MultiIndex.from_frame(self.cells[['state', 'date']].astype({'state': object})).isin(pairs)
+        self.cells = pd.concat([self.cells[~stale], added.cells], ignore_index=True)
+        self.moments.subtract(removed.moments).merge(added.moments)
+        self.state_moments.subtract(removed.state_moments).merge(added.state_moments)
+        self.source = None
+        return self
+
+    def save(self, path=CUBE_FILE):
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump({'version': CUBE_VERSION, 'cells': self.cells, 'moments': self.moments,
+                         'state_moments': self.state_moments, 'source': self.source},
+                        f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=CUBE_FILE):
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+        if data.get('version') != CUBE_VERSION:
+            return None
+        return cls(data['cells'], data['moments'], data['state_moments'], data['source'])
+
+    @classmethod
+    def load_or_build(cls, csv_path, path=CUBE_FILE):
+        # Rebuild only when the cleaned CSV has changed since the cube was built
+        with metrics.span('load_cube'):
+            cube = cls.load(path) if os.path.exists(path) else None
+        if cube is not None and os.path.exists(csv_path) and not cube.is_current(csv_path):
+            cube = None
+        if cube is None:
+            cube = cls.build(csv_path)
+            cube.save(path)
+        return cube
+
+    def is_current(self, csv_path):
+        return self.source is not None and columnar.source_unchanged(
+            csv_path, self.source['size'], self.source['mtime_ns'], self.source['hash'])
+
+    def grouping_sets(self, sets):
+        # One pass over the cells for several levels, each drawn from
+        # 'state', 'district', 'date' and 'month'; () gives the grand totals
+        cells = self.cells
+        if any('month' in levels for levels in sets):
+            cells = cells.assign(month=cells['date'].dt.to_period('M'))
+        with metrics.span('groupby', rows_in=len(cells)):
+            results = grouping.grouping_sets(cells, sets, MEASURES + ['rows'])
+        return {levels: add_totals(result) if levels else result for levels, result in results.items()}
+
+    def by(self, levels):
+        return self.grouping_sets([tuple(levels)])[tuple(levels)]
+
+    def totals(self):
+        return self.cells[MEASURES + ['rows']].sum()
+
+    @property
+    def record_count(self):
+        return self.moments.n
+
+    def date_range(self):
+        return self.cells['date'].min(), self.cells['date'].max()
+
+    def has_dates(self):
+        return self.cells['date'].notna().any()
+
+    def nunique(self, level):
+        return self.cells[level].nunique()
+
+    def correlation(self, state=None):
+        if state is None:
+            return self.moments.correlation()
+        return self.state_moments.correlation(state)
+
+    def state_correlations(self):
+        return self.state_moments.matrices()
+
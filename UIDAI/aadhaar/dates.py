@@ -0,0 +1,64 @@
+"""Shared decoder for the dd-mm-yyyy date column.
+
+Every shard spells its dates as dd-mm-yyyy, and a few hundred distinct
+strings cover millions of rows. parse_days factorizes a column, looks each
+distinct string up in a process-wide cache, parses only the strings it has
+not seen with the explicit format (no inference, so 03-04-2025 is always
+3 April), and broadcasts the int32 day numbers (days since 1970-01-01)
+back through the codes.
+
+Missing and unparseable values both become MISSING_DAY. Pass a Counter as
+`invalid` to also count the rows of each unparseable string.
+"""
+import numpy as np
+import pandas as pd
+
+DATE_FORMAT = '%d-%m-%Y'
+MISSING_DAY = np.iinfo(np.int32).min
+# Dates are few; the cache is only cleared if garbage strings pile up
+MAX_CACHED = 100000
+
+_cache = {}
+
+
+def _lookup(uniques):
+    # Safe to call from several reader threads: a concurrent clear() only
+    # means some strings are parsed again
+    found = [_cache.get(value) for value in uniques]
+    unseen = [value for value, day in zip(uniques, found) if day is None]
+    if unseen:
+        parsed = pd.to_datetime(pd.Series(unseen, dtype=object), format=DATE_FORMAT, errors='coerce')
+        days = parsed.to_numpy(dtype='datetime64[D]').astype(np.int64)
+        fresh = dict(zip(unseen, np.where(parsed.isna().to_numpy(), MISSING_DAY, days).tolist()))
+        if len(_cache) + len(fresh) > MAX_CACHED:
+            _cache.clear()
+        _cache.update(fresh)
+        found = [fresh[value] if day is None else day for value, day in zip(uniques, found)]
+    return np.array(found, dtype=np.int32)
+
+
+def parse_days(series, invalid=None):
+    # Parse each distinct date string once, then broadcast through the codes
+    codes, uniques = pd.factorize(pd.Series(series))
+    if not len(uniques):
+        return np.full(len(codes), MISSING_DAY, dtype=np.int32)
+    days = _lookup(uniques.tolist())
+    bad = np.flatnonzero(days == MISSING_DAY)
+    if invalid is not None and len(bad):
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        invalid.update({str(uniques[i]): int(counts[i]) for i in bad})
+    return np.where(codes >= 0, days[codes], MISSING_DAY).astype(np.int32)
+
+
+def decode_days(days):
+    # int32 day numbers to datetime64[ns], NaT where missing
+    days = np.asarray(days)
+    out = days.astype('datetime64[D]').astype('datetime64[ns]')
+    out[days == MISSING_DAY] = np.datetime64('NaT')
+    return out
+
+
+def invalid_summary(invalid, limit=10):
+    examples = ', '.join(f"{value!r} ({n} row{'s' if n != 1 else ''})" for value, n in invalid.most_common(limit))
+    rows = sum(invalid.values())
+    return f"{rows} row{'s' if rows != 1 else ''} in {len(invalid)} value{'s' if len(invalid) != 1 else ''}: {examples}"
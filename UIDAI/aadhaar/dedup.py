@@ -0,0 +1,152 @@
+"""Out-of-core clean of merged_aadhar_data.csv.
+
+clean_data.py reads the whole merged CSV, keeps the first row per
+(date, state, district, pincode) and drops placeholder rows. This module
+gives the same output for a file that does not fit in memory, in two
+streaming passes:
+
+1. spill: read the CSV in chunks, drop placeholder rows (placeholders are a
+   property of the key, so filtering before dedup changes nothing), and
+   append each remaining row's key and row offset to one of `n_buckets`
+   on-disk buckets chosen by a hash of the key,
+2. dedup: every key lives in exactly one bucket, so buckets are deduplicated
+   independently and in parallel. Rows were spilled in file order, so the
+   first row per key in a bucket is the first occurrence in the file. Each
+   bucket returns the offsets of its later duplicates,
+3. write: stream the CSV again and write every row that is neither a
+   placeholder nor a duplicate, in the original order.
+
+Only key columns are spilled. Memory is bounded by one bucket plus the
+offsets of the duplicate rows. Count columns that pandas reads as floats
+in any chunk are read as floats throughout the second pass, as a
+whole-file read would, so the output is byte-identical to clean_data.py's.
+"""
+import math
+import os
+import pickle
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from aadhaar import cleaning, dates, ingest, join, keys, metrics
+
+CHUNK_SIZE = 250000
+MEMORY_MB = 512
+# Rough size of one merged CSV line, and of one spilled key row once loaded
+CSV_ROW_BYTES = 80
+KEY_ROW_BYTES = 250
+
+
+def plan_buckets(csv_path, memory_mb=MEMORY_MB):
+    rows = os.path.getsize(csv_path) / CSV_ROW_BYTES
+    return max(1, math.ceil(rows * KEY_ROW_BYTES / (memory_mb * 1024 * 1024)))
+
+
+def _bucket_file(spill_dir, bucket):
+    return os.path.join(spill_dir, f'bucket_{bucket:06d}.pkl')
+
+
+def _read_chunks(csv_path, chunksize, dtype=None):
+    dtype = {**(dtype or {}), 'state': str, 'district': str}
+
+    def read():
+        for chunk in pd.read_csv(csv_path, chunksize=chunksize, dtype=dtype):
+            chunk.columns = chunk.columns.str.strip()
+            yield chunk
+    return ingest.prefetch(read())
+
+
+def _bucket_ids(chunk, n_buckets):
+    # Hash the key as KeyEncoder sees it: parsed day, strings, numeric pincode
+    normalized = pd.DataFrame({
+        'day': dates.parse_days(chunk['date']),
+        'state': chunk['state'].to_numpy(dtype=object),
+        'district': chunk['district'].to_numpy(dtype=object),
+        'pincode': pd.to_numeric(chunk['pincode'], errors='coerce').to_numpy(dtype='float64'),
+    })
+    return pd.util.hash_pandas_object(normalized, index=False).to_numpy() % np.uint64(n_buckets)
+
+
+def spill_keys(csv_path, n_buckets, spill_dir, chunksize=CHUNK_SIZE):
+    # Returns (rows, placeholder rows, columns, float columns)
+    rows, placeholders = 0, 0
+    columns, float_columns = None, set()
+    for chunk in _read_chunks(csv_path, chunksize):
+        offsets = np.arange(rows, rows + len(chunk), dtype=np.int64)
+        rows += len(chunk)
+        columns = columns or list(chunk.columns)
+        float_columns.update(col for col in chunk.columns if pd.api.types.is_float_dtype(chunk[col].dtype))
+
+        valid = ~cleaning.placeholder_mask(chunk).to_numpy()
+        placeholders += int((~valid).sum())
+        keyed = chunk.loc[valid, join.KEY_COLUMNS]
+        keyed.insert(0, '_offset', offsets[valid])
+        for bucket, piece in keyed.groupby(_bucket_ids(keyed, n_buckets), sort=False):
+            with open(_bucket_file(spill_dir, int(bucket)), 'ab') as f:
+                pickle.dump(piece, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return rows, placeholders, columns or [], sorted(float_columns)
+
+
+def _read_bucket(bucket_file):
+    pieces = []
+    with open(bucket_file, 'rb') as f:
+        while True:
+            try:
+                pieces.append(pickle.load(f))
+            except EOFError:
+                break
+    return pd.concat(pieces, ignore_index=True)
+
+
+def bucket_duplicates(bucket_file):
+    # Offsets of every row after the first for each key in one bucket
+    if not os.path.exists(bucket_file):
+        return np.empty(0, dtype=np.int64)
+    df = _read_bucket(bucket_file)
+    key = keys.KeyEncoder.fit([df]).encode(df)
+    return df['_offset'].to_numpy()[~keys.first_occurrence(key)]
+
+
+def clean_csv(csv_path, output, memory_mb=MEMORY_MB, workers=None, spill_dir=None, chunksize=CHUNK_SIZE):
+    # clean_data.py out of core; returns (rows in, columns, rows out)
+    n_buckets = plan_buckets(csv_path, memory_mb)
+    work_dir = tempfile.mkdtemp(prefix='aadhaar_clean_', dir=spill_dir)
+    try:
+        with metrics.span('spill') as s:
+            rows, placeholders, columns, float_columns = spill_keys(csv_path, n_buckets, work_dir, chunksize)
+            s.rows_in = rows
+
+        bucket_files = [_bucket_file(work_dir, bucket) for bucket in range(n_buckets)]
+        with metrics.span('drop_duplicates', rows_in=rows - placeholders) as s:
+            if workers == 1 or n_buckets == 1:
+                dropped = [bucket_duplicates(path) for path in bucket_files]
+            else:
+                with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, n_buckets)) as pool:
+                    dropped = list(pool.map(bucket_duplicates, bucket_files))
+            dropped = np.sort(np.concatenate(dropped)) if dropped else np.empty(0, dtype=np.int64)
+            s.rows_out = rows - placeholders - len(dropped)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    written = 0
+    offset = 0
+    with metrics.span('to_csv', rows_in=rows) as s:
+        header = True
+        for chunk in _read_chunks(csv_path, chunksize, dtype={col: 'float64' for col in float_columns}):
+            if chunk.empty:
+                continue
+            offsets = np.arange(offset, offset + len(chunk), dtype=np.int64)
+            offset += len(chunk)
+            keep = ~cleaning.placeholder_mask(chunk).to_numpy()
+            keep &= ~np.isin(offsets, dropped[np.searchsorted(dropped, offsets[0]):
+                                               np.searchsorted(dropped, offsets[-1], side='right')])
+            chunk[keep].to_csv(output, mode='w' if header else 'a', header=header, index=False)
+            header = False
+            written += int(keep.sum())
+        if header:
+            pd.DataFrame(columns=columns).to_csv(output, index=False)
+        s.rows_out = written
+    return rows, columns, written
@@ -0,0 +1,191 @@
+"""Duplicate rows across all shards of a dataset.
+
+The per-shard profiler reports only count duplicates inside one shard. This
+module fingerprints every row (a 64-bit hash of its CSV fields, read as
+text so "5" in one shard and "5" in another always agree) and finds the
+rows whose full content appeared earlier in any shard:
+
+- sorted (default): one pass keeps the fingerprint, shard index and row
+  offset of every row (14 bytes per row). A stable argsort groups equal
+  fingerprints in file order.
+- bloom: a first pass inserts fingerprints into a Bloom filter and keeps
+  only the fingerprints that may have been seen before (about 1.2 bytes
+  per row at a 1% false-positive rate). A second pass collects the
+  locations of just those rows, originals included. False positives drop
+  out in the grouping because they have only one row.
+
+Both modes give the same counts and pairs. Each pair is
+(duplicate shard, row) -> (first shard, row) with 0-based row offsets.
+Counts are exact up to 64-bit hash collisions (about 1 in 4,000 at 100M
+rows).
+
+Usage: python -m aadhaar.duplicates <csv> [<csv> ...] [--bloom]
+"""
+import argparse
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from aadhaar import ingest, metrics
+
+CHUNK_SIZE = 250000
+MAX_PAIRS = 20
+FALSE_POSITIVE_RATE = 0.01
+# Rough size of one shard CSV line, to size the Bloom filter from file sizes
+CSV_ROW_BYTES = 50
+
+
+def _chunks(path, chunksize):
+    def read():
+        for chunk in pd.read_csv(path, chunksize=chunksize, dtype=str):
+            chunk.columns = chunk.columns.str.strip()
+            yield chunk
+    return ingest.prefetch(read())
+
+
+def fingerprints(chunk):
+    return pd.util.hash_pandas_object(chunk, index=False).to_numpy()
+
+
+class BloomFilter:
+    def __init__(self, capacity, false_positive_rate=FALSE_POSITIVE_RATE):
+        capacity = max(int(capacity), 1)
+        self.size = max(64, int(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = np.zeros((self.size + 63) // 64, dtype=np.uint64)
+
+    def _positions(self, values):
+        # Double hashing: position i is h1 + i * h2 (mod size)
+        values = np.asarray(values, dtype=np.uint64)
+        h1 = values % np.uint64(self.size)
+        h2 = ((values >> np.uint64(32)) | np.uint64(1)) % np.uint64(self.size)
+        steps = np.arange(self.hashes, dtype=np.uint64)
+        return (h1[:, None] + steps * h2[:, None]) % np.uint64(self.size)
+
+    def contains(self, values):
+        positions = self._positions(values)
+        words = self.bits[positions >> np.uint64(6)]
+        return ((words >> (positions & np.uint64(63))) & np.uint64(1)).astype(bool).all(axis=1)
+
+    def add(self, values):
+        positions = self._positions(values).ravel()
+        np.bitwise_or.at(self.bits, positions >> np.uint64(6), np.uint64(1) << (positions & np.uint64(63)))
+
+    @property
+    def nbytes(self):
+        return self.bits.nbytes
+
+
+class DuplicateReport:
+    def __init__(self, files, rows, fp, shard, offset, memory_bytes, mode):
+        self.files = list(files)
+        self.rows = rows
+        self.mode = mode
+        self.memory_bytes = memory_bytes
+        # Group equal fingerprints; the stable sort keeps file order within a group
+        order = np.argsort(fp, kind='stable')
+        fp, shard, offset = fp[order], shard[order], offset[order]
+        first = np.ones(len(fp), dtype=bool)
+        first[1:] = fp[1:] != fp[:-1]
+        group_start = np.flatnonzero(first)[np.cumsum(first) - 1]
+        dup = ~first
+        self.duplicate_shard, self.duplicate_offset = shard[dup], offset[dup]
+        self.original_shard, self.original_offset = shard[group_start[dup]], offset[group_start[dup]]
+
+    @property
+    def duplicates(self):
+        return len(self.duplicate_shard)
+
+    @property
+    def cross_shard(self):
+        return int((self.duplicate_shard != self.original_shard).sum())
+
+    def per_shard(self):
+        return np.bincount(self.duplicate_shard, minlength=len(self.files))
+
+    def pairs(self, limit=MAX_PAIRS):
+        # Offending pairs in file order of the duplicate
+        order = np.lexsort((self.duplicate_offset, self.duplicate_shard))[:limit]
+        return [((self.files[self.duplicate_shard[i]], int(self.duplicate_offset[i])),
+                 (self.files[self.original_shard[i]], int(self.original_offset[i]))) for i in order]
+
+    def report(self, limit=MAX_PAIRS):
+        report = f"Global duplicate rows across {len(self.files)} shards ({self.mode} mode):\n"
+        report += f"Rows: {self.rows}\n"
+        report += f"Duplicate Rows: {self.duplicates}\n"
+        report += f"  within one shard: {self.duplicates - self.cross_shard}\n"
+        report += f"  across shards: {self.cross_shard}\n"
+        report += f"Fingerprint memory: {self.memory_bytes / 1024 / 1024:.1f} MB\n\n"
+        for file, count in zip(self.files, self.per_shard()):
+            report += f"{os.path.basename(file)}: {count} duplicate rows\n"
+        if self.duplicates:
+            report += f"\nFirst {min(limit, self.duplicates)} duplicate rows (duplicate -> first occurrence):\n"
+            for (dup_file, dup_row), (orig_file, orig_row) in self.pairs(limit):
+                report += f"  {os.path.basename(dup_file)} row {dup_row} -> {os.path.basename(orig_file)} row {orig_row}\n"
+        return report
+
+
+def _collect(files, chunksize, keep=None):
+    # (fingerprints, shard indexes, row offsets, rows) of every row, or only
+    # of the rows whose fingerprint is in `keep`
+    fps, shards, offsets = [], [], []
+    rows = 0
+    for index, path in enumerate(files):
+        offset = 0
+        for chunk in _chunks(path, chunksize):
+            fp = fingerprints(chunk)
+            positions = np.arange(offset, offset + len(chunk), dtype=np.uint32)
+            if keep is not None:
+                mask = np.isin(fp, keep)
+                fp, positions = fp[mask], positions[mask]
+            fps.append(fp)
+            shards.append(np.full(len(fp), index, dtype=np.uint16))
+            offsets.append(positions)
+            offset += len(chunk)
+        rows += offset
+    if not fps:
+        return np.empty(0, np.uint64), np.empty(0, np.uint16), np.empty(0, np.uint32), rows
+    return np.concatenate(fps), np.concatenate(shards), np.concatenate(offsets), rows
+
+
+def _bloom_candidates(files, chunksize, false_positive_rate):
+    capacity = sum(os.path.getsize(path) for path in files) / CSV_ROW_BYTES
+    bloom = BloomFilter(capacity, false_positive_rate)
+    candidates = []
+    for path in files:
+        for chunk in _chunks(path, chunksize):
+            fp = fingerprints(chunk)
+            # Seen in an earlier chunk, or more than once in this one
+            unique, counts = np.unique(fp, return_counts=True)
+            candidates.append(unique[bloom.contains(unique) | (counts > 1)])
+            bloom.add(unique)
+    candidates = np.unique(np.concatenate(candidates)) if candidates else np.empty(0, np.uint64)
+    return candidates, bloom.nbytes + candidates.nbytes
+
+
+def find_duplicates(files, bloom=False, chunksize=CHUNK_SIZE, false_positive_rate=FALSE_POSITIVE_RATE):
+    files = [path for path in files if os.path.exists(path)]
+    if len(files) > np.iinfo(np.uint16).max:
+        raise ValueError(f"{len(files)} shards do not fit the shard index")
+    with metrics.span('duplicates') as s:
+        if bloom:
+            candidates, memory = _bloom_candidates(files, chunksize, false_positive_rate)
+            fp, shard, offset, rows = _collect(files, chunksize, keep=candidates)
+            memory += fp.nbytes + shard.nbytes + offset.nbytes
+        else:
+            fp, shard, offset, rows = _collect(files, chunksize)
+            memory = fp.nbytes + shard.nbytes + offset.nbytes
+        s.rows_in = rows
+    return DuplicateReport(files, rows, fp, shard, offset, memory, 'bloom' if bloom else 'sorted')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Count duplicate rows across CSV shards of one dataset.')
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--bloom', action='store_true',
+                        help='Bloom-filter pre-check: two passes, far less memory when duplicates are rare')
+    parser.add_argument('--pairs', type=int, default=MAX_PAIRS, help='how many offending pairs to list')
+    args = parser.parse_args()
+    print(find_duplicates(args.files, bloom=args.bloom).report(args.pairs), end='')
@@ -0,0 +1,187 @@
+"""Figures of visualize_data.py: inputs from one pass, headless parallel rendering.
+
+visualize_data.py drew its four figures one after another from separate
+groupbys, blocked on plt.show() after each, and imported seaborn up front.
+Here:
+
+- plot_inputs() takes every figure's data from one grouping-sets pass over
+  the rollup cube, including the per-state variants (top districts and
+  daily trend of each state, and its correlation matrix from the cube's
+  per-state accumulators). Asking for all 36 states adds two grouping sets
+  to that pass, not 36 passes,
+- render_all() draws the figures in a process pool on the Agg backend, with
+  seaborn imported only by workers that draw a heatmap,
+- a figure is skipped when its PNG exists and the digest of its data,
+  labels and this module's code matches the one recorded in .figures.json
+  when the PNG was written.
+
+Per-state figures go to figures_by_state/<state>/.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import quote
+
+from aadhaar import columnar, metrics, ranking
+
+MANIFEST = '.figures.json'
+STATE_DIR = 'figures_by_state'
+# The whole-country figures, also written per state except the first
+FILES = ['enrolment_per_state.png', 'enrolment_per_district.png', 'enrolment_trends_over_time.png',
+         'correlation_heatmap.png']
+TOP_K = 10
+CORRELATION_COLUMNS = ['age_0_5', 'age_5_17', 'age_18_greater', 'demo_age_5_17', 'demo_age_17_', 'bio_age_5_17',
+                       'bio_age_17_']
+# Drawing code changes re-render every figure
+CODE_HASH = columnar.file_hash(os.path.abspath(__file__))
+
+
+class Figure:
+    def __init__(self, path, kind, data, title, xlabel=None, ylabel=None, figsize=(10, 6)):
+        self.path = path
+        self.kind = kind
+        self.data = data
+        self.title = title
+        self.xlabel = xlabel
+        self.ylabel = ylabel
+        self.figsize = figsize
+
+    def digest(self):
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(json.dumps([CODE_HASH, self.kind, self.title, self.xlabel, self.ylabel,
+                                  list(self.figsize)]).encode())
+        digest.update(self.data.to_json(orient='split', date_format='iso', double_precision=15).encode())
+        return digest.hexdigest()
+
+
+def _top(frame, level, k=TOP_K):
+    # The k largest total_enrolment rows (ties in key order), as a Series
+    # indexed by `level`
+    top = frame.iloc[ranking.select(frame['total_enrolment'].to_numpy(), k)]
+    return top.set_index(level)['total_enrolment']
+
+
+def state_dir(state):
+    return os.path.join(STATE_DIR, quote(state, safe=' '))
+
+
+def plot_inputs(cube, states=None):
+    # Figures for the whole country, and for each of `states`
+    sets = [('state',), ('district',), ('date',)]
+    if states:
+        sets += [('state', 'district'), ('state', 'date')]
+    with metrics.span('plot_inputs'):
+        grouped = cube.grouping_sets(sets)
+    figures = [
+        Figure(FILES[0], 'bar', _top(grouped[('state',)], 'state'),
+               'Top 10 States by Total Enrolment', 'State', 'Total Enrolment'),
+        Figure(FILES[1], 'bar', _top(grouped[('district',)], 'district'),
+               'Top 10 Districts by Total Enrolment', 'District', 'Total Enrolment'),
+        Figure(FILES[2], 'line', grouped[('date',)][['date', 'total_enrolment']],
+               'Enrolment Trends Over Time', 'Date', 'Total Enrolment', figsize=(12, 6)),
+        Figure(FILES[3], 'heatmap',
+               cube.correlation().loc[CORRELATION_COLUMNS, CORRELATION_COLUMNS],
+               'Correlation Heatmap: Demographic vs Enrolment/Biometric Updates', figsize=(10, 8)),
+    ]
+    if not states:
+        return figures
+    districts = dict(tuple(grouped[('state', 'district')].groupby('state', sort=False)))
+    trends = dict(tuple(grouped[('state', 'date')].groupby('state', sort=False)))
+    correlations = cube.state_correlations()
+    for state in states:
+        if state not in districts:
+            continue
+        directory = state_dir(state)
+        figures.append(Figure(os.path.join(directory, FILES[1]), 'bar',
+                              _top(districts[state].reset_index(drop=True), 'district'),
+                              f'Top 10 Districts in {state} by Total Enrolment', 'District', 'Total Enrolment'))
+        figures.append(Figure(os.path.join(directory, FILES[2]), 'line',
+                              trends[state][['date', 'total_enrolment']].reset_index(drop=True),
+                              f'Enrolment Trends Over Time: {state}', 'Date', 'Total Enrolment', figsize=(12, 6)))
+        matrix = correlations.get(state)
+        # No heatmap for a state whose counts never vary (every correlation NaN)
+        if matrix is not None and matrix.loc[CORRELATION_COLUMNS, CORRELATION_COLUMNS].notna().any(axis=None):
+            figures.append(Figure(os.path.join(directory, FILES[3]), 'heatmap',
+                                  matrix.loc[CORRELATION_COLUMNS, CORRELATION_COLUMNS],
+                                  f'Correlation Heatmap: {state}', figsize=(10, 8)))
+    return figures
+
+
+def draw(figure):
+    import matplotlib.pyplot as plt
+    plt.figure(figsize=figure.figsize)
+    if figure.kind == 'bar':
+        figure.data.plot(kind='bar')
+    elif figure.kind == 'line':
+        plt.plot(figure.data['date'], figure.data['total_enrolment'])
+    else:
+        import seaborn as sns
+        sns.heatmap(figure.data, annot=True, cmap='coolwarm', fmt='.2f')
+    plt.title(figure.title)
+    if figure.xlabel is not None:
+        plt.xlabel(figure.xlabel)
+        plt.ylabel(figure.ylabel)
+        plt.xticks(rotation=45)
+    plt.tight_layout()
+
+
+def save(figure):
+    import matplotlib.pyplot as plt
+    directory = os.path.dirname(figure.path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # In a render_all() worker this is recorded under the worker's pid
+    with metrics.span('savefig'):
+        plt.savefig(figure.path)
+
+
+def render(figure):
+    import matplotlib.pyplot as plt
+    draw(figure)
+    save(figure)
+    plt.close()
+    return figure.path
+
+
+def _use_agg():
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def _load_manifest():
+    if not os.path.exists(MANIFEST):
+        return {}
+    with open(MANIFEST) as f:
+        return json.load(f)
+
+
+def _save_manifest(manifest):
+    tmp = MANIFEST + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, MANIFEST)
+
+
+def render_all(figures, workers=None, force=False):
+    # path -> 'rendered' or 'unchanged'
+    manifest = _load_manifest()
+    digests = {figure.path: figure.digest() for figure in figures}
+    todo = [figure for figure in figures
+            if force or not os.path.exists(figure.path) or manifest.get(figure.path) != digests[figure.path]]
+    workers = min(workers or os.cpu_count() or 1, len(todo))
+    with metrics.span('render', rows_in=len(figures)) as s:
+        # Pool workers (e.g. run_pipeline.py's) cannot start processes of their own
+        if workers > 1 and not multiprocessing.current_process().daemon:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_use_agg) as pool:
+                list(pool.map(render, todo))
+        else:
+            _use_agg()
+            for figure in todo:
+                render(figure)
+        s.rows_out = len(todo)
+    manifest.update({figure.path: digests[figure.path] for figure in todo})
+    _save_manifest(manifest)
+    rendered = {figure.path for figure in todo}
+    return {figure.path: 'rendered' if figure.path in rendered else 'unchanged' for figure in figures}
@@ -0,0 +1,284 @@
+"""Manifest-driven incremental merged store.
+
+Instead of re-running merge_csv.py and clean_data.py over every shard, new
+shards are folded into a store that is partitioned by date:
+
+    <store>/manifest.json        shards already merged, with size, hash and date range
+    <store>/merged/<date>.pkl    merged rows for one day
+    <store>/cleaned/<date>.pkl   the same rows without placeholder entries
+    <store>/cube.pkl             rollup cube of the cleaned rows (aadhaar/cube.py)
+    <store>/partitions/          month x state store of the cleaned rows (aadhaar/partitioned.py)
+
+Each new shard is reduced to one row per (date, state, district, pincode)
+(the --aggregate semantics of merge_csv.py). Only the day partitions that
+the shard touches are loaded, and the shard's sums are added into them.
+The cube swaps the old rows of the states those sums touch on those days
+for the new ones, and only the month x state partitions holding them are
+rewritten, so a refresh costs time proportional to the new shards rather
+than the history.
+
+An update is committed atomically with its manifest. The new day
+partitions, cube, month x state partitions and manifest are written under
+<store>/.staging/, which is renamed to <store>/.commit/ once complete; its
+files are then moved into place, the manifest last. recover() rolls an
+interrupted .commit/ forward and drops an unfinished .staging/, so a crash
+never adds a shard's sums twice. merge_csv.py --export writes the CSVs
+from the store and publishes the cube and partitioned store for them with
+publish().
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from aadhaar import cleaning, columnar, dates, join, keys
+from aadhaar.cube import CUBE_FILE, MEASURES, Cube
+from aadhaar.partitioned import STORE_DIR, PartitionedStore
+
+MANIFEST = 'manifest.json'
+STORE_VERSION = 1
+UNKNOWN_DATE = 'unknown'
+KINDS = ['merged', 'cleaned']
+STAGING_DIR = '.staging'
+COMMIT_DIR = '.commit'
+CUBE = 'cube.pkl'
+PARTITIONS = 'partitions'
+
+
+class ShardChangedError(Exception):
+    pass
+
+
+def load_manifest(store_dir):
+    path = os.path.join(store_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {'version': STORE_VERSION, 'value_columns': [], 'shards': {}, 'dates': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(store_dir, manifest):
+    tmp = os.path.join(store_dir, MANIFEST + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, os.path.join(store_dir, MANIFEST))
+
+
+def _partition_name(date):
+    return UNKNOWN_DATE if pd.isna(date) else pd.Timestamp(date).strftime('%Y-%m-%d')
+
+
+def _partition_path(store_dir, kind, name):
+    return os.path.join(store_dir, kind, f'{name}.pkl')
+
+
+def _write_pickle(df, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    df.to_pickle(tmp)
+    os.replace(tmp, path)
+
+
+def pending_shards(store_dir, shards_by_dataset):
+    # Shards not yet in the manifest. A merged shard whose content changed
+    # cannot be subtracted back out, so that needs a rebuild of the store.
+    manifest = load_manifest(store_dir)
+    pending = []
+    for dataset, paths in shards_by_dataset.items():
+        for path in paths:
+            name = os.path.basename(path)
+            entry = manifest['shards'].get(name)
+            if entry is None:
+                pending.append((dataset, path))
+                continue
+            st = os.stat(path)
+            if entry['size'] == st.st_size and entry['mtime_ns'] == st.st_mtime_ns:
+                continue
+            if entry['size'] != st.st_size or columnar.file_hash(path) != entry['hash']:
+                raise ShardChangedError(f"{name} changed since it was merged; rebuild the store")
+    return pending
+
+
+def _string_keys(df):
+    for col in columnar.DICTIONARY_COLUMNS:
+        df[col] = df[col].astype(object)
+    return df
+
+
+def _conform(df, value_columns):
+    for col in value_columns:
+        if col not in df.columns:
+            df[col] = 0
+    return df[join.KEY_COLUMNS + value_columns]
+
+
+def _measures(df):
+    # The cleaned rows as the cube and partitioned store take them
+    return _conform(df.copy(), MEASURES)
+
+
+def _load_aggregates(store_dir):
+    # None when the store has none yet, or they are from an older version
+    cube_path = os.path.join(store_dir, CUBE)
+    cube = Cube.load(cube_path) if os.path.exists(cube_path) else None
+    store = PartitionedStore.open(os.path.join(store_dir, PARTITIONS))
+    return (cube, store) if cube is not None and store is not None else None
+
+
+def _stage_aggregates(staging, aggregates, old, new):
+    # Replace the cleaned rows old with new, by (state, date)
+    cube, store = aggregates
+    old, new = _measures(old), _measures(new)
+    cube.replace(old, new)
+    os.makedirs(staging, exist_ok=True)
+    cube.save(os.path.join(staging, CUBE))
+    store.replace(old, new, os.path.join(staging, PARTITIONS))
+
+
+def _commit(store_dir, staging):
+    # The commit point: from here on the update is applied, if need be by
+    # the next run's recover()
+    commit_dir = os.path.join(store_dir, COMMIT_DIR)
+    os.replace(staging, commit_dir)
+    _apply(store_dir, commit_dir)
+
+
+def _apply(store_dir, commit_dir):
+    # Move a committed update's files into place, deepest first so that
+    # meta.json follows its partitions, and the manifest last; safe to
+    # repeat after a crash part way through
+    for directory, _, names in os.walk(commit_dir, topdown=False):
+        target = os.path.join(store_dir, os.path.relpath(directory, commit_dir))
+        os.makedirs(target, exist_ok=True)
+        for name in names:
+            if directory != commit_dir or name != MANIFEST:
+                os.replace(os.path.join(directory, name), os.path.join(target, name))
+    manifest = os.path.join(commit_dir, MANIFEST)
+    if os.path.exists(manifest):
+        os.replace(manifest, os.path.join(store_dir, MANIFEST))
+    shutil.rmtree(commit_dir)
+
+
+def recover(store_dir):
+    # Finish an update that was committed but not fully applied, and drop
+    # one that never reached its commit
+    shutil.rmtree(os.path.join(store_dir, STAGING_DIR), ignore_errors=True)
+    commit_dir = os.path.join(store_dir, COMMIT_DIR)
+    if os.path.exists(commit_dir):
+        _apply(store_dir, commit_dir)
+
+
+def _backfill(store_dir):
+    # A store written before it kept the cube and partitioned store gets
+    # them once, from all of its cleaned rows
+    staging = os.path.join(store_dir, STAGING_DIR)
+    history = load_store(store_dir, 'cleaned')
+    aggregates = Cube.empty(), PartitionedStore.empty(os.path.join(store_dir, PARTITIONS))
+    _stage_aggregates(staging, aggregates, history.iloc[:0], history)
+    _commit(store_dir, staging)
+
+
+def update_store(store_dir, shards_by_dataset):
+    os.makedirs(store_dir, exist_ok=True)
+    recover(store_dir)
+    pending = pending_shards(store_dir, shards_by_dataset)
+    manifest = load_manifest(store_dir)
+    aggregates = _load_aggregates(store_dir)
+    if aggregates is None and manifest['dates']:
+        _backfill(store_dir)
+        aggregates = _load_aggregates(store_dir)
+    if not pending:
+        return manifest, []
+    if aggregates is None:
+        aggregates = Cube.empty(), PartitionedStore.empty(os.path.join(store_dir, PARTITIONS))
+
+    # Sum every new shard down to one row per key
+    deltas = []
+    for dataset, path in pending:
+        df = join.aggregate_by_key(columnar.load_shard(path))
+        st = os.stat(path)
+        manifest['shards'][os.path.basename(path)] = {
+            'dataset': dataset,
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+            'hash': columnar.file_hash(path),
+            'rows': len(df),
+            'first_date': _partition_name(df['date'].min()),
+            'last_date': _partition_name(df['date'].max()),
+        }
+        deltas.append(_string_keys(df))
+
+    value_columns = list(manifest['value_columns'])
+    for df in deltas:
+        value_columns += [col for col in df.columns if col not in join.KEY_COLUMNS and col not in value_columns]
+    delta = pd.concat([_conform(df, value_columns) for df in deltas], ignore_index=True)
+    delta[value_columns] = delta[value_columns].fillna(0)
+
+    # Upsert into the affected day partitions only, writing the new
+    # versions to the staging directory
+    staging = os.path.join(store_dir, STAGING_DIR)
+    old, new = [], []
+    for date, rows in delta.groupby(delta['date'].map(_partition_name), sort=False):
+        merged_path = _partition_path(store_dir, 'merged', date)
+        touched = rows['state'].unique()
+        parts = [rows]
+        if os.path.exists(merged_path):
+            parts.insert(0, _conform(pd.read_pickle(merged_path), value_columns))
+            old.append(cleaning.drop_placeholders(parts[0][parts[0]['state'].isin(touched)]))
+        merged = pd.concat(parts, ignore_index=True)
+        merged[value_columns] = merged[value_columns].fillna(0)
+        encoder = keys.KeyEncoder.fit([merged])
+        # Grouping on the packed key also leaves the rows in key order
+        summed = join.with_key(merged, encoder).groupby('_key').sum().reset_index()
+        merged = _string_keys(join.restore_keys(summed, encoder))
+        cleaned = cleaning.drop_placeholders(merged)
+        _write_pickle(merged, _partition_path(staging, 'merged', date))
+        _write_pickle(cleaned, _partition_path(staging, 'cleaned', date))
+        manifest['dates'][date] = len(merged)
+        new.append(cleaned[cleaned['state'].isin(touched)])
+
+    # Fold the same states and days into the cube and partitioned store
+    old = pd.concat(old, ignore_index=True) if old else new[0].iloc[:0]
+    _stage_aggregates(staging, aggregates, old, pd.concat(new, ignore_index=True))
+    manifest['value_columns'] = value_columns
+    save_manifest(staging, manifest)
+    _commit(store_dir, staging)
+    return manifest, pending
+
+
+def load_store(store_dir, kind='cleaned', dates=None):
+    recover(store_dir)
+    manifest = load_manifest(store_dir)
+    names = sorted(manifest['dates']) if dates is None else [_partition_name(d) for d in dates]
+    frames = [pd.read_pickle(_partition_path(store_dir, kind, name)) for name in names
+              if os.path.exists(_partition_path(store_dir, kind, name))]
+    if not frames:
+        return pd.DataFrame(columns=join.KEY_COLUMNS + manifest['value_columns'])
+    df = pd.concat([_conform(df, manifest['value_columns']) for df in frames], ignore_index=True)
+    order = np.argsort(keys.KeyEncoder.fit([df]).encode(df), kind='stable')
+    return df.iloc[order].reset_index(drop=True)
+
+
+def export_csv(store_dir, kind, output):
+    # Returns the exported rows
+    df = load_store(store_dir, kind)
+    # Same float counts as the merge_csv.py output
+    value_columns = [col for col in df.columns if col not in join.KEY_COLUMNS]
+    df[value_columns] = df[value_columns].astype('float64')
+    df.to_csv(output, index=False, date_format=dates.DATE_FORMAT)
+    return df
+
+
+def publish(store_dir, csv_path, cube_path=CUBE_FILE, store_path=STORE_DIR):
+    # Install the store's cube and partitioned store for the insight
+    # scripts, as built from csv_path (the cleaned CSV export_csv() wrote)
+    recover(store_dir)
+    aggregates = _load_aggregates(store_dir)
+    if aggregates is None:
+        aggregates = Cube.empty(), PartitionedStore.empty(os.path.join(store_dir, PARTITIONS))
+    cube, store = aggregates
+    cube.source = columnar.fingerprint(csv_path)
+    cube.save(cube_path)
+    return cube, store.link(store_path, csv_path)
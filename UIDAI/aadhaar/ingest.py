@@ -0,0 +1,144 @@
+"""Concurrent, overlapped CSV ingestion.
+
+Shards used to be parsed one after another by pandas' C parser, with the
+caller idle while a chunk was parsed and the parser idle while the caller
+worked. This module provides three pieces:
+
+- csv_chunks() parses with pyarrow's multithreaded streaming CSV reader when
+  pyarrow is installed, and with pandas' C parser otherwise,
+- prefetch() runs a chunk generator in a background thread, `depth` chunks
+  ahead, so parsing the next chunk overlaps with computing on the current
+  one (both parsers release the GIL while they tokenize). It is off on a
+  single core, where the hand-off only costs time,
+- map_shards() loads several shards at once in a thread pool of at most
+  `readers` threads and returns the results in input order.
+
+The concurrency limit comes from AADHAAR_READERS (default: min(4, CPUs)) and
+the parser from AADHAAR_CSV_ENGINE ('pyarrow' or 'c'). The scripts' --readers
+flags override the limit.
+"""
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+except ImportError:  # pandas' C parser only
+    pa = pa_csv = None
+
+READERS_ENV = 'AADHAAR_READERS'
+ENGINE_ENV = 'AADHAAR_CSV_ENGINE'
+# Chunks parsed ahead of the consumer; on a single core the hand-off only
+# costs time
+PREFETCH = 2 if (os.cpu_count() or 1) > 1 else 0
+# Rough size of one CSV line, to turn a chunk size in rows into pyarrow's
+# block size in bytes
+ROW_BYTES = 64
+
+
+def default_readers():
+    return int(os.environ.get(READERS_ENV) or min(4, os.cpu_count() or 1))
+
+
+def default_engine():
+    engine = os.environ.get(ENGINE_ENV) or ('pyarrow' if pa_csv is not None else 'c')
+    if engine == 'pyarrow' and pa_csv is None:
+        raise ValueError(f"{ENGINE_ENV}=pyarrow but pyarrow is not installed")
+    return engine
+
+
+def _pyarrow_chunks(path, usecols, categories, text, chunksize):
+    # Text columns stay strings (categories dictionary-encoded); the rest are
+    # read as float64 and narrowed by the caller
+    column_types = {col: pa.dictionary(pa.int32(), pa.string()) if col in categories
+                    else pa.string() if col in text else pa.float64() for col in usecols}
+    reader = pa_csv.open_csv(
+        path,
+        read_options=pa_csv.ReadOptions(use_threads=True, block_size=max(chunksize * ROW_BYTES, 1 << 20)),
+        convert_options=pa_csv.ConvertOptions(include_columns=usecols, column_types=column_types,
+                                              strings_can_be_null=True))
+    batches = 0
+    for batch in reader:
+        batches += 1
+        yield batch.to_pandas()
+    if not batches:
+        # A header-only file has no batches; yield one empty chunk with the
+        # columns, as pandas' reader does
+        yield reader.schema.empty_table().to_pandas()
+
+
+def _pandas_chunks(path, usecols, categories, text, chunksize):
+    dtype = {col: 'category' if col in categories else str for col in list(categories) + list(text)}
+    yield from pd.read_csv(path, usecols=usecols, dtype=dtype, chunksize=chunksize)
+
+
+def csv_chunks(path, usecols, categories=(), text=(), chunksize=250000, engine=None):
+    # Chunks of the raw `usecols` columns (names as written in the file)
+    engine = engine or default_engine()
+    read = _pyarrow_chunks if engine == 'pyarrow' else _pandas_chunks
+    return read(path, list(usecols), set(categories), set(text), chunksize)
+
+
+class _Failed:
+    def __init__(self, error):
+        self.error = error
+
+
+_DONE = object()
+
+
+def prefetch(chunks, depth=PREFETCH):
+    # Iterate `chunks` in a background thread, at most `depth` items ahead.
+    # Errors are re-raised in the consumer.
+    if depth <= 0:
+        yield from chunks
+        return
+    items = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for chunk in chunks:
+                if not put(chunk):
+                    return
+        except BaseException as error:
+            put(_Failed(error))
+        else:
+            put(_DONE)
+
+    thread = threading.Thread(target=produce, name='aadhaar-prefetch', daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failed):
+                raise item.error
+            yield item
+    finally:
+        # The consumer may stop early; let the producer finish its chunk and exit
+        stop.set()
+        thread.join()
+
+
+def map_shards(fn, paths, readers=None):
+    paths = list(paths)
+    readers = readers or default_readers()
+    if readers <= 1 or len(paths) <= 1:
+        return [fn(path) for path in paths]
+    with ThreadPoolExecutor(max_workers=min(readers, len(paths)), thread_name_prefix='aadhaar-reader') as pool:
+        return list(pool.map(fn, paths))
@@ -0,0 +1,317 @@
+"""Out-of-core join of every enrolment, demographic and biometric shard.
+
+merge_csv.py's default mode outer-joins one hand-picked shard of each dataset
+in memory. This module joins all of them within a memory budget:
+
+1. plan: count rows per (state, district, pincode) location key (see
+   aadhaar/keys.py) across all shards and cut
+   the sorted key space into contiguous ranges of at most `budget_rows` rows,
+2. spill: stream each shard once and append its rows to the on-disk spill
+   file of their range partition,
+3. join: load one partition at a time, apply merge_csv.py's outer join,
+   dedup, sort and zero-fill, and append it to the output CSV.
+
+Every (date, state, district, pincode) key lives in exactly one partition and
+the partitions are range-ordered, so concatenating them gives the same
+sorted output as the in-memory merge.
+
+With aggregate=True each input is first reduced to one row per key by
+summing its count columns, so the outer join is 1:1 and no counts are lost
+to drop_duplicates. plan_join() measures duplicate keys and the expected
+join size from key multiplicities before any join is allocated; callers
+print that report first and JoinDiagnostics.check() raises JoinTooLarge
+when many-to-many matches would grow the join past both its inputs and
+the memory budget. In sort_merge_join() every partition is planned and
+checked this way before it is joined.
+"""
+import glob
+import os
+import pickle
+import re
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from aadhaar import columnar, dates, ingest, keys, metrics
+
+DATASETS = ['enrolment', 'demographic', 'biometric']
+KEY_COLUMNS = ['date', 'state', 'district', 'pincode']
+SORT_COLUMNS = ['state', 'district', 'pincode']
+# Rough footprint of one row during the partition join (three inputs, the
+# merged frame and its sorted copy)
+ROW_BYTES = 400
+MEMORY_MB = 512
+
+# Shards joined by the default in-memory mode of merge_csv.py
+SELECTED_SHARDS = [
+    'api_data_aadhar_enrolment_500000_1000000.csv',
+    'api_data_aadhar_demographic_500000_1000000.csv',
+    'api_data_aadhar_biometric_1000000_1500000.csv'
+]
+
+
+class JoinTooLarge(ValueError):
+    pass
+
+
+def budget_rows(memory_mb=MEMORY_MB):
+    return memory_mb * 1024 * 1024 // ROW_BYTES
+
+
+def _shard_start(path):
+    match = re.search(r'_(\d+)_(\d+)\.csv$', path)
+    return int(match.group(1)) if match else 0
+
+
+def discover_shards(data_dir='.', datasets=DATASETS):
+    shards = {}
+    for dataset in datasets:
+        paths = glob.glob(os.path.join(data_dir, f'api_data_aadhar_{dataset}_*_*.csv'))
+        shards[dataset] = sorted(paths, key=_shard_start)
+    return shards
+
+
+def global_dictionaries(shards_by_dataset):
+    dictionaries = {col: set() for col in columnar.DICTIONARY_COLUMNS}
+    # Builds any missing caches, several shards at a time
+    paths = [path for paths in shards_by_dataset.values() for path in paths]
+    for meta in ingest.map_shards(columnar.ensure_cached, paths):
+        for col in dictionaries:
+            dictionaries[col].update(meta['columns'][col]['dictionary'])
+    return {col: sorted(values) for col, values in dictionaries.items()}
+
+
+def load_aligned(path, dictionaries):
+    df = columnar.load_shard(path)
+    for col, categories in dictionaries.items():
+        df[col] = df[col].cat.set_categories(categories)
+    return df
+
+
+def _location_counts(location):
+    values, counts = np.unique(location, return_counts=True)
+    return pd.Series(counts, index=values)
+
+
+def plan_partitions(shards_by_dataset, encoder, dictionaries, budget_rows):
+    # Returns the partition of every (state, district, pincode) location key
+    counts = None
+    for paths in shards_by_dataset.values():
+        for path in paths:
+            shard_counts = _location_counts(keys.location_key(encoder.encode(load_aligned(path, dictionaries))))
+            counts = shard_counts if counts is None else counts.add(shard_counts, fill_value=0)
+    if counts is None:
+        return pd.Series([], dtype='int64')
+    counts = counts.sort_index()
+    return ((counts.cumsum() - counts) // max(budget_rows, 1)).astype('int64')
+
+
+def _partition_ids(location, partitions):
+    return partitions.to_numpy()[partitions.index.get_indexer(location)]
+
+
+def _spill_file(spill_dir, partition, dataset):
+    return os.path.join(spill_dir, f'part_{partition:06d}', f'{dataset}.pkl')
+
+
+def spill(shards_by_dataset, encoder, dictionaries, partitions, spill_dir):
+    for dataset, paths in shards_by_dataset.items():
+        for path in paths:
+            df = load_aligned(path, dictionaries)
+            ids = _partition_ids(keys.location_key(encoder.encode(df)), partitions)
+            for partition, piece in df.groupby(ids, sort=False):
+                spill_file = _spill_file(spill_dir, int(partition), dataset)
+                os.makedirs(os.path.dirname(spill_file), exist_ok=True)
+                with open(spill_file, 'ab') as f:
+                    pickle.dump(piece, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _read_spill(spill_file, empty):
+    if not os.path.exists(spill_file):
+        return empty
+    pieces = []
+    with open(spill_file, 'rb') as f:
+        while True:
+            try:
+                pieces.append(pickle.load(f))
+            except EOFError:
+                break
+    return pd.concat(pieces, ignore_index=True)
+
+
+def with_key(df, encoder):
+    # Replace the four key columns with the packed _key column
+    keyed = df.drop(columns=KEY_COLUMNS)
+    keyed.insert(0, '_key', encoder.encode(df))
+    return keyed
+
+
+def restore_keys(keyed, encoder):
+    restored = encoder.decode(keyed['_key'].to_numpy())
+    restored.index = keyed.index
+    return pd.concat([restored, keyed.drop(columns='_key')], axis=1)
+
+
+def _sum_by_key(keyed):
+    return keyed.groupby('_key', sort=False).sum().reset_index()
+
+
+def aggregate_by_key(df, encoder=None):
+    # One row per key; count columns are summed rather than deduplicated away
+    encoder = encoder or keys.KeyEncoder.fit([df])
+    return restore_keys(_sum_by_key(with_key(df, encoder)), encoder)
+
+
+class JoinDiagnostics:
+    """Key cardinalities of the join inputs and the expected vs actual output size."""
+
+    def __init__(self, names):
+        self.inputs = {name: {'rows': 0, 'keys': 0, 'duplicate_keys': 0, 'max_multiplicity': 0}
+                       for name in names}
+        # Outer join size as given (many-to-many matches multiply) and after
+        # pre-aggregation (one row per distinct key)
+        self.expected_rows = 0
+        self.distinct_keys = 0
+        self.actual_rows = 0
+
+    def measure(self, key_arrays):
+        counts = []
+        for name, packed in zip(self.inputs, key_arrays):
+            values, multiplicity = np.unique(packed, return_counts=True)
+            per_key = pd.Series(multiplicity, index=values)
+            stats = self.inputs[name]
+            stats['rows'] += len(packed)
+            stats['keys'] += len(per_key)
+            stats['duplicate_keys'] += int((per_key > 1).sum())
+            stats['max_multiplicity'] = max(stats['max_multiplicity'], int(per_key.max()) if len(per_key) else 0)
+            counts.append(per_key)
+        if counts:
+            # A key missing from one input contributes a single NaN-filled row
+            combined = pd.concat(counts, axis=1)
+            self.expected_rows += int(combined.fillna(1).prod(axis=1).sum())
+            self.distinct_keys += len(combined)
+        return self
+
+    def merge(self, other):
+        for name, stats in other.inputs.items():
+            mine = self.inputs.setdefault(name, dict.fromkeys(stats, 0))
+            for field, value in stats.items():
+                mine[field] = max(mine[field], value) if field == 'max_multiplicity' else mine[field] + value
+        self.expected_rows += other.expected_rows
+        self.distinct_keys += other.distinct_keys
+        self.actual_rows += other.actual_rows
+        return self
+
+    def check(self, max_rows, aggregate=False):
+        # A 1:1 outer join never outgrows its inputs; many-to-many matches
+        # may not grow it past both the inputs and max_rows. Aggregated
+        # inputs are 1:1 by construction.
+        inputs = sum(stats['rows'] for stats in self.inputs.values())
+        if not aggregate and max_rows is not None and self.expected_rows > max(max_rows, inputs):
+            raise JoinTooLarge(f"the outer join would produce {self.expected_rows} rows from {inputs} input rows, "
+                               f"over the budget of {max_rows}; duplicate keys match many-to-many, so sum them "
+                               f"with --aggregate or raise --memory-mb")
+        return self
+
+    def plan_report(self):
+        report = "Join Diagnostics:\n"
+        for name, stats in self.inputs.items():
+            report += (f"  {name}: {stats['rows']} rows, {stats['keys']} distinct keys, "
+                       f"{stats['duplicate_keys']} duplicate keys (max {stats['max_multiplicity']} rows per key)\n")
+        if any(stats['duplicate_keys'] for stats in self.inputs.values()):
+            report += "  Warning: the inputs are not 1:1 on (date, state, district, pincode)\n"
+        report += f"  Expected outer join rows: {self.expected_rows}\n"
+        report += f"  Distinct keys (rows after aggregation): {self.distinct_keys}\n"
+        return report
+
+    def actual_report(self):
+        return f"  Actual join rows: {self.actual_rows}\n"
+
+    def report(self):
+        return self.plan_report() + self.actual_report()
+
+
+def plan_join(frames, names=DATASETS, encoder=None):
+    # Diagnostics of joining `frames`, from their key multiplicities alone
+    encoder = encoder or keys.KeyEncoder.fit(frames)
+    return JoinDiagnostics(names).measure([encoder.encode(df) for df in frames])
+
+
+def merge_frames(frames, aggregate=False, diagnostics=None, encoder=None):
+    # The merge_csv.py recipe: outer join, keep the first row per key, sort
+    # by state/district/pincode and zero-fill the value columns. All of it
+    # runs on the packed int64 key. `diagnostics` (from plan_join) gets the
+    # actual join size.
+    encoder = encoder or keys.KeyEncoder.fit(frames)
+    keyed = [with_key(df, encoder) for df in frames]
+    if aggregate:
+        with metrics.span('groupby', rows_in=sum(len(df) for df in keyed)) as s:
+            keyed = [_sum_by_key(df) for df in keyed]
+            s.rows_out = sum(len(df) for df in keyed)
+    with metrics.span('merge', rows_in=sum(len(df) for df in keyed)) as s:
+        merged = keyed[0]
+        for df in keyed[1:]:
+            merged = pd.merge(merged, df, on='_key', how='outer',
+                              validate='one_to_one' if aggregate else None)
+        s.rows_out = len(merged)
+    if diagnostics is not None:
+        diagnostics.actual_rows += len(merged)
+    merged.columns = merged.columns.str.strip()
+    with metrics.span('drop_duplicates', rows_in=len(merged)) as s:
+        merged = merged[keys.first_occurrence(merged['_key'].to_numpy())]
+        s.rows_out = len(merged)
+    with metrics.span('sort_values', rows_in=len(merged)):
+        merged = merged.sort_values(by='_key', kind='stable')
+    merged = restore_keys(merged, encoder)
+    value_columns = [col for col in merged.columns if col not in KEY_COLUMNS]
+    merged[value_columns] = merged[value_columns].fillna(0).astype('float64')
+    return merged
+
+
+def sort_merge_join(shards_by_dataset, output, memory_mb=MEMORY_MB, spill_dir=None,
+                    aggregate=False, diagnostics=None):
+    shards_by_dataset = {dataset: paths for dataset, paths in shards_by_dataset.items() if paths}
+    dictionaries = global_dictionaries(shards_by_dataset)
+    encoder = keys.KeyEncoder(dictionaries['state'], dictionaries['district'])
+    max_rows = budget_rows(memory_mb)
+    with metrics.span('plan'):
+        partitions = plan_partitions(shards_by_dataset, encoder, dictionaries, max_rows)
+
+    # Empty frames with the right columns stand in for datasets that have no
+    # rows in a partition
+    empties = {dataset: load_aligned(paths[0], dictionaries).iloc[:0]
+               for dataset, paths in shards_by_dataset.items()}
+
+    work_dir = tempfile.mkdtemp(prefix='aadhaar_join_', dir=spill_dir)
+    rows = 0
+    try:
+        with metrics.span('spill'):
+            spill(shards_by_dataset, encoder, dictionaries, partitions, work_dir)
+        n_partitions = int(partitions.max()) + 1 if len(partitions) else 0
+        header = True
+        for partition in range(n_partitions):
+            frames = [_read_spill(_spill_file(work_dir, partition, dataset), empty)
+                      for dataset, empty in empties.items()]
+            plan = plan_join(frames, list(empties), encoder)
+            try:
+                plan.check(max_rows, aggregate)
+            except JoinTooLarge as error:
+                if diagnostics is not None:
+                    diagnostics.merge(plan)
+                raise JoinTooLarge(f"partition {partition} of {n_partitions}: {error}") from error
+            # merge_frames adds the partition's join size, before dedup, to the plan
+            merged = merge_frames(frames, aggregate, plan, encoder)
+            if diagnostics is not None:
+                diagnostics.merge(plan)
+            with metrics.span('to_csv', rows_in=len(merged)):
+                merged.to_csv(output, mode='w' if header else 'a', header=header, index=False,
+                              date_format=dates.DATE_FORMAT)
+            header = False
+            rows += len(merged)
+        if header:
+            merge_frames(list(empties.values()), encoder=encoder).to_csv(output, index=False)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return rows
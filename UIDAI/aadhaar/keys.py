@@ -0,0 +1,128 @@
+"""Packed int64 key for (date, state, district, pincode).
+
+Dedup, joins, sorts and sortedness checks used to hash or compare four
+columns, two of them Python strings. KeyEncoder packs them into one int64
+instead. From the most significant bits down:
+
+    state code (8) | district code (14) | pincode (20) | day number (17)
+
+State and district codes index sorted dictionaries. Sorting the packed key
+therefore orders rows by state, district, pincode and then date, the order
+merge_csv.py writes. location_key() drops the date field. A missing
+component takes the all-ones value of its field and sorts last, as NaN does
+in sort_values.
+"""
+import numpy as np
+import pandas as pd
+
+from aadhaar import dates
+
+DAY_BITS = 17
+PINCODE_BITS = 20
+DISTRICT_BITS = 14
+STATE_BITS = 8
+
+PINCODE_SHIFT = DAY_BITS
+DISTRICT_SHIFT = PINCODE_SHIFT + PINCODE_BITS
+STATE_SHIFT = DISTRICT_SHIFT + DISTRICT_BITS
+
+
+def _missing(bits):
+    return (1 << bits) - 1
+
+
+def _dictionary_values(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.categories.tolist()
+    return series.dropna().unique().tolist()
+
+
+class KeyEncoder:
+    def __init__(self, states=(), districts=()):
+        self.states = sorted(states)
+        self.districts = sorted(districts)
+        if len(self.states) >= _missing(STATE_BITS) or len(self.districts) >= _missing(DISTRICT_BITS):
+            raise ValueError(f"{len(self.states)} states / {len(self.districts)} districts do not fit the key")
+
+    @classmethod
+    def fit(cls, frames):
+        states, districts = set(), set()
+        for df in frames:
+            states.update(_dictionary_values(df['state']))
+            districts.update(_dictionary_values(df['district']))
+        return cls(states, districts)
+
+    def _codes(self, series, dictionary, bits):
+        codes = pd.Categorical(series, categories=dictionary).codes.astype(np.int64)
+        codes[codes < 0] = _missing(bits)
+        return codes
+
+    def _days(self, series):
+        if pd.api.types.is_datetime64_any_dtype(series.dtype):
+            values = series.to_numpy(dtype='datetime64[D]')
+            days = values.astype(np.int64)
+            days[np.isnat(values)] = _missing(DAY_BITS)
+        elif pd.api.types.is_integer_dtype(series.dtype):
+            # Day numbers as loaded by aadhaar/schema.py
+            days = series.to_numpy().astype(np.int64)
+            days[days == dates.MISSING_DAY] = _missing(DAY_BITS)
+        else:
+            days = dates.parse_days(series).astype(np.int64)
+            days[days == dates.MISSING_DAY] = _missing(DAY_BITS)
+        if len(days) and (days.min() < 0 or days.max() > _missing(DAY_BITS)):
+            raise ValueError("dates before 1970 or after 2328 do not fit the key")
+        return days
+
+    def _pincodes(self, series):
+        values = pd.to_numeric(series, errors='coerce').to_numpy(dtype='float64')
+        missing = np.isnan(values)
+        pincodes = np.where(missing, _missing(PINCODE_BITS), values).astype(np.int64)
+        if len(pincodes) and (pincodes.min() < 0 or pincodes[~missing].max(initial=0) >= _missing(PINCODE_BITS)):
+            raise ValueError("pincodes must be in [0, 2**20 - 1)")
+        return pincodes
+
+    def encode(self, df):
+        return ((self._codes(df['state'], self.states, STATE_BITS) << STATE_SHIFT)
+                | (self._codes(df['district'], self.districts, DISTRICT_BITS) << DISTRICT_SHIFT)
+                | (self._pincodes(df['pincode']) << PINCODE_SHIFT)
+                | self._days(df['date']))
+
+    def decode(self, keys):
+        keys = np.asarray(keys, dtype=np.int64)
+        state = (keys >> STATE_SHIFT) & _missing(STATE_BITS)
+        district = (keys >> DISTRICT_SHIFT) & _missing(DISTRICT_BITS)
+        pincode = ((keys >> PINCODE_SHIFT) & _missing(PINCODE_BITS)).astype('float64')
+        day = keys & _missing(DAY_BITS)
+        date = day.astype('datetime64[D]').astype('datetime64[ns]')
+        date[day == _missing(DAY_BITS)] = np.datetime64('NaT')
+        pincode[pincode == _missing(PINCODE_BITS)] = np.nan
+        return pd.DataFrame({
+            'date': date,
+            'state': pd.Categorical.from_codes(np.where(state == _missing(STATE_BITS), -1, state),
+                                               categories=self.states),
+            'district': pd.Categorical.from_codes(np.where(district == _missing(DISTRICT_BITS), -1, district),
+                                                  categories=self.districts),
+            'pincode': pincode if np.isnan(pincode).any() else pincode.astype(np.int64),
+        })
+
+
+def location_key(keys):
+    # (state, district, pincode) part of the key
+    return np.asarray(keys) >> PINCODE_SHIFT
+
+
+def first_occurrence(keys):
+    # True for the first row of every key, like ~duplicated(keep='first')
+    keys = np.asarray(keys)
+    keep = np.zeros(len(keys), dtype=bool)
+    keep[np.unique(keys, return_index=True)[1]] = True
+    return keep
+
+
+def duplicate_count(keys):
+    return len(keys) - len(np.unique(keys))
+
+
+def is_sorted(keys):
+    keys = np.asarray(keys)
+    return bool(np.all(keys[1:] >= keys[:-1]))
@@ -0,0 +1,163 @@
+"""Lightweight instrumentation for the profilers and merge_folder scripts.
+
+Off unless the AADHAAR_METRICS environment variable names a JSON lines file.
+Each script is a stage (metrics.begin('clean_data')) and its expensive steps
+are named spans:
+
+    with metrics.span('read_csv') as s:
+        df = pd.read_csv('merged_aadhar_data.csv')
+        s.rows_out = len(df)
+
+Every span, and every stage when it ends, appends one line with the wall
+seconds, rows in/out, current and peak RSS of the process and, when
+AADHAAR_TRACEMALLOC=1, the tracemalloc peak inside it. With
+AADHAAR_PROFILE_DIR=<dir> each stage also dumps a cProfile to
+<dir>/<stage>.prof (read it with pstats or snakeviz).
+
+Spans from worker processes (the profiler pool, the pipeline leaves) go to
+the same file, tagged with their pid and the stage that started them.
+"""
+import atexit
+import contextlib
+import cProfile
+import datetime
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+METRICS_ENV = 'AADHAAR_METRICS'
+TRACEMALLOC_ENV = 'AADHAAR_TRACEMALLOC'
+PROFILE_ENV = 'AADHAAR_PROFILE_DIR'
+STAGE_ENV = 'AADHAAR_STAGE'
+
+# Open spans, innermost last, per thread (the ingest readers open their own)
+_local = threading.local()
+
+
+def _active():
+    if not hasattr(_local, 'spans'):
+        _local.spans = []
+    return _local.spans
+
+
+def enabled():
+    return bool(os.environ.get(METRICS_ENV))
+
+
+def rss_mb():
+    # Current resident set size, from /proc where it exists
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1 << 20)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def emit(record):
+    path = os.environ.get(METRICS_ENV)
+    if not path:
+        return
+    record = {'time': datetime.datetime.now().isoformat(timespec='milliseconds'), 'pid': os.getpid(),
+              'stage': os.environ.get(STAGE_ENV), **record}
+    # One short append per record, so concurrent writers do not interleave lines
+    with open(path, 'a') as f:
+        f.write(json.dumps(record, default=str) + '\n')
+
+
+def _round(value):
+    return None if value is None else round(value, 3)
+
+
+class Span:
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.seconds = None
+        self.traced_peak = 0
+
+
+@contextlib.contextmanager
+def span(name, rows_in=None, kind='span'):
+    s = Span(name, rows_in)
+    if not enabled():
+        yield s
+        return
+    active = _active()
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        # Fold the peak so far into the enclosing span before resetting it
+        if active:
+            active[-1].traced_peak = max(active[-1].traced_peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+    active.append(s)
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield s
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        s.seconds = time.perf_counter() - start
+        active.pop()
+        record = {'kind': kind, 'span': name, 'seconds': _round(s.seconds),
+                  'rows_in': s.rows_in, 'rows_out': s.rows_out,
+                  'rss_mb': _round(rss_mb()), 'peak_rss_mb': _round(peak_rss_mb())}
+        if tracing:
+            s.traced_peak = max(s.traced_peak, tracemalloc.get_traced_memory()[1])
+            if active:
+                active[-1].traced_peak = max(active[-1].traced_peak, s.traced_peak)
+            record['tracemalloc_peak_mb'] = _round(s.traced_peak / (1 << 20))
+        if failed:
+            record['failed'] = True
+        emit(record)
+
+
+@contextlib.contextmanager
+def stage(name):
+    # A whole script or pipeline stage: its own record plus an optional
+    # cProfile dump. Nested stages (a script run by the pipeline) are folded
+    # into the outer one.
+    if not enabled() or os.environ.get(STAGE_ENV):
+        yield
+        return
+    os.environ[STAGE_ENV] = name
+    if os.environ.get(TRACEMALLOC_ENV) == '1' and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    profile_dir = os.environ.get(PROFILE_ENV)
+    profiler = cProfile.Profile() if profile_dir else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        with span(name, kind='stage'):
+            yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(profile_dir, exist_ok=True)
+            profiler.dump_stats(os.path.join(profile_dir, f'{name}.prof'))
+        del os.environ[STAGE_ENV]
+
+
+def begin(name):
+    # stage() for a script's top-level code, closed when the interpreter exits
+    if not enabled() or os.environ.get(STAGE_ENV):
+        return
+    context = stage(name)
+    context.__enter__()
+    atexit.register(context.__exit__, None, None, None)
@@ -0,0 +1,484 @@
+"""Month x state partitioned, memory-mapped copy of cleaned_aadhar_data.csv.
+
+A question such as "enrolments in Bihar in November 2025" used to mean
+scanning the whole cleaned CSV. build() writes its rows once into one
+directory per month and state:
+
+    aadhar_store/meta.json
+    aadhar_store/2025-11/Bihar/date.npy, district.npy, pincode.npy, age_0_5.npy, ...
+
+Every column is a fixed-width .npy file: int32 day numbers (aadhaar/dates.py),
+int16 codes into the store's district dictionary, uint32 pincodes and
+float32 counts. The state and month are the directory. Within a partition,
+rows are sorted by district, pincode and date. meta.json lists every
+partition with its row count, its first and last day and the row range of
+each of its districts.
+
+A query takes a date range and states and/or districts. It opens only the
+partitions whose state matches and whose days overlap the range, with
+np.load(mmap_mode='r'), so nothing else is read. A district filter is a
+slice of the partition. The date range is applied row by row only in the
+partitions it cuts through. Rows whose date did not parse are kept under
+month 'unknown', which only queries without a date range read.
+
+meta.json records the fingerprint of the CSV the store was built from, and
+open_or_build() rebuilds a stale store. A new store is written next to the
+old one and swapped in by renames, the old store going to <store>.old
+first, so there is always a complete store to open.
+
+Usage: python -m aadhaar.partitioned build [--csv cleaned_aadhar_data.csv] [--store aadhar_store]
+       python -m aadhaar.partitioned query [--start dd-mm-yyyy] [--end dd-mm-yyyy]
+                                           [--state S ...] [--district D ...] [--by state|district|month]
+"""
+import argparse
+import json
+import os
+import shutil
+from collections import Counter
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from aadhaar import columnar, dates, metrics, schema
+
+STORE_DIR = 'aadhar_store'
+STORE_VERSION = 1
+CHUNK_SIZE = 500000
+UNKNOWN_MONTH = 'unknown'
+# Directory of rows without a state
+MISSING_STATE = '_'
+MEASURES = list(schema.CLEANED.counts)
+COLUMNS = ['date', 'district', 'pincode'] + MEASURES
+DTYPES = {'date': np.int32, 'district': np.int16, 'pincode': np.uint32, **{col: np.float32 for col in MEASURES}}
+GROUP_LEVELS = ['state', 'district', 'month', 'date']
+MAX_DISTRICTS = int(np.iinfo(DTYPES['district']).max) + 1
+
+
+def parse_day(value):
+    # dd-mm-yyyy or a day number to a day number; None stays None
+    if value is None or isinstance(value, (int, np.integer)):
+        return value
+    day = int(dates.parse_days(pd.Series([str(value)]))[0])
+    if day == dates.MISSING_DAY:
+        raise ValueError(f"{value!r} is not a dd-mm-yyyy date")
+    return day
+
+
+def _months(days):
+    months = days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    months[days == dates.MISSING_DAY] = -1
+    return months
+
+
+def _month_name(month):
+    return UNKNOWN_MONTH if month < 0 else str(np.datetime64(month, 'M'))
+
+
+def _month_number(name):
+    return -1 if name == UNKNOWN_MONTH else int(np.datetime64(name, 'M').astype(np.int64))
+
+
+def _days(values):
+    # The date column as int32 day numbers, whatever it was read as
+    if pd.api.types.is_integer_dtype(values.dtype):
+        return values.to_numpy(dtype=np.int32)
+    if not pd.api.types.is_datetime64_any_dtype(values.dtype):
+        return dates.parse_days(values)
+    days = values.to_numpy(dtype='datetime64[D]')
+    return np.where(np.isnat(days), dates.MISSING_DAY, days.astype(np.int64)).astype(np.int32)
+
+
+def _codes(values, lookup):
+    codes, uniques = pd.factorize(values)
+    local = np.array([lookup.setdefault(value, len(lookup)) for value in uniques], dtype=np.int32)
+    return np.where(codes >= 0, local[codes] if len(local) else codes, -1)
+
+
+def _read_meta(path):
+    meta_file = os.path.join(path, 'meta.json')
+    if not os.path.exists(meta_file):
+        return None
+    with open(meta_file) as f:
+        return json.load(f)
+
+
+def _write_meta(path, meta):
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=1)
+
+
+def _link(source, target):
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def _swap_in(tmp, path):
+    # Swap a finished store in. The old one is renamed aside before the new
+    # one takes its place and only then deleted; readers of it keep their maps.
+    old = path + '.old'
+    if os.path.exists(path):
+        if os.path.exists(old):
+            shutil.rmtree(old)
+        os.replace(path, old)
+    os.replace(tmp, path)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+class _Writer:
+    """Appends chunks to per-partition staging files, then sorts each partition into .npy columns."""
+
+    def __init__(self, path, states=(), districts=()):
+        # states and districts: an existing store's dictionaries, kept so its
+        # untouched partitions stay valid
+        self.path = path
+        self.states = {name: code for code, name in enumerate(states)}
+        self.districts = {name: code for code, name in enumerate(districts)}
+        self.rows = Counter()
+
+    def _dir(self, month, state):
+        state = MISSING_STATE if state < 0 else quote(self.state_names[state], safe=' ')
+        return os.path.join(_month_name(month), state)
+
+    @property
+    def state_names(self):
+        return list(self.states)
+
+    def append(self, chunk):
+        districts = _codes(chunk['district'], self.districts)
+        if len(self.districts) > MAX_DISTRICTS:
+            raise ValueError(f"{len(self.districts)} distinct districts do not fit the store's "
+                             f"{np.dtype(DTYPES['district'])} district codes (at most {MAX_DISTRICTS})")
+        columns = {'date': _days(chunk['date']),
+                   'district': districts.astype(DTYPES['district']),
+                   'pincode': chunk['pincode'].to_numpy(dtype=np.uint32),
+                   **{col: chunk[col].fillna(0).to_numpy(dtype=np.float32) for col in MEASURES}}
+        self.append_columns(columns, _codes(chunk['state'], self.states))
+
+    def append_columns(self, columns, states):
+        # Rows already coded against this writer's dictionaries
+        months = _months(columns['date'])
+        order = np.lexsort((states, months))
+        months, states = months[order], states[order]
+        bounds = np.flatnonzero((np.diff(months) != 0) | (np.diff(states) != 0)) + 1
+        for start, end in zip(np.r_[0, bounds], np.r_[bounds, len(order)]):
+            if start == end:
+                continue
+            key = (int(months[start]), int(states[start]))
+            directory = os.path.join(self.path, self._dir(*key))
+            os.makedirs(directory, exist_ok=True)
+            rows = order[start:end]
+            for col, values in columns.items():
+                with open(os.path.join(directory, f'{col}.bin'), 'ab') as f:
+                    values[rows].tofile(f)
+            self.rows[key] += len(rows)
+
+    def _finish(self, month, state):
+        directory = os.path.join(self.path, self._dir(month, state))
+        data = {}
+        for col in COLUMNS:
+            staging = os.path.join(directory, f'{col}.bin')
+            data[col] = np.fromfile(staging, dtype=DTYPES[col])
+            os.remove(staging)
+        order = np.lexsort((data['date'], data['pincode'], data['district']))
+        for col, values in data.items():
+            np.save(os.path.join(directory, f'{col}.npy'), values[order])
+        district = data['district'][order]
+        codes, starts = np.unique(district, return_index=True)
+        ends = np.r_[starts[1:], len(district)]
+        known = data['date'][data['date'] != dates.MISSING_DAY]
+        return {
+            'month': _month_name(month),
+            'state': self.state_names[state] if state >= 0 else None,
+            'path': self._dir(month, state),
+            'rows': len(district),
+            'first_day': int(known.min()) if len(known) else None,
+            'last_day': int(known.max()) if len(known) else None,
+            'districts': {str(code): [int(start), int(end)] for code, start, end in zip(codes.tolist(), starts, ends)},
+        }
+
+    def finish(self):
+        return [self._finish(month, state) for month, state in sorted(self.rows)]
+
+
+class PartitionedStore:
+    def __init__(self, path, meta):
+        self.path = path
+        self.meta = meta
+        self.states = meta['states']
+        self.districts = meta['districts']
+        self._state_codes = {name: code for code, name in enumerate(self.states)}
+        self._district_codes = {}
+        for code, name in enumerate(self.districts):
+            self._district_codes.setdefault(name, []).append(code)
+
+    @classmethod
+    def build(cls, csv_path, path=STORE_DIR, chunksize=CHUNK_SIZE):
+        # Unparseable dates go to the 'unknown' month instead of failing
+        invalid = Counter()
+        chunks = schema.read_chunks(csv_path, schema.CLEANED, chunksize=chunksize, invalid=invalid)
+        return cls._from_chunks(chunks, csv_path, path, invalid)
+
+    @classmethod
+    def from_frame(cls, df, csv_path, path=STORE_DIR, chunksize=CHUNK_SIZE):
+        # The same store from rows already in memory; csv_path is the CSV they
+        # were written to, which the store is checked against on open
+        df = df.rename(columns=str.strip)
+        return cls._from_chunks((df.iloc[i:i + chunksize] for i in range(0, len(df), chunksize)), csv_path, path)
+
+    @classmethod
+    def _from_chunks(cls, chunks, csv_path, path, invalid=None):
+        tmp = path + '.tmp'
+        if os.path.exists(tmp):
+            shutil.rmtree(tmp)
+        os.makedirs(tmp)
+        writer = _Writer(tmp)
+        with metrics.span('partition') as s:
+            for chunk in chunks:
+                writer.append(chunk)
+            partitions = writer.finish()
+            s.rows_in = s.rows_out = sum(writer.rows.values())
+        meta = {
+            'version': STORE_VERSION,
+            'source': columnar.fingerprint(csv_path),
+            'rows': sum(writer.rows.values()),
+            'invalid_dates': sum(invalid.values()) if invalid else 0,
+            'columns': {col: np.dtype(DTYPES[col]).str for col in COLUMNS},
+            'states': writer.state_names,
+            'districts': list(writer.districts),
+            'partitions': partitions,
+        }
+        _write_meta(tmp, meta)
+        _swap_in(tmp, path)
+        return cls(path, meta)
+
+    @classmethod
+    def empty(cls, path):
+        # A store without rows, for replace_days() to fill
+        return cls(path, {'version': STORE_VERSION, 'source': None, 'rows': 0, 'invalid_dates': 0,
+                          'columns': {col: np.dtype(DTYPES[col]).str for col in COLUMNS},
+                          'states': [], 'districts': [], 'partitions': []})
+
+    def replace(self, old, new, staging):
+        # Replace the rows of the (state, date) pairs in old and new: old are
+        # the rows the store holds for them and new their replacement. Only
+        # the partitions of those states and months are rewritten, to the
+        # same paths under staging, with the new meta.json. Returns the new meta.
+        writer = _Writer(staging, self.states, self.districts)
+        writer.append(new.rename(columns=str.strip))
+        both = pd.concat([old, new]).rename(columns=str.strip)
+        replaced = pd.DataFrame({'state': _codes(both['state'], writer.states), 'day': _days(both['date'])})
+        days = {state: group['day'].unique() for state, group in replaced.groupby('state')}
+        months = {(int(month), state) for state, values in days.items() for month in np.unique(_months(values))}
+        for part in self.meta['partitions']:
+            key = (_month_number(part['month']), writer.states.get(part['state'], -1))
+            if key not in months:
+                continue
+            arrays = self._open(part, COLUMNS)
+            kept = ~np.isin(arrays['date'], days[key[1]])
+            if key in writer.rows or not kept.all():
+                writer.append_columns({col: values[kept] for col, values in arrays.items()},
+                                      np.full(int(kept.sum()), key[1]))
+        finished = writer.finish()
+        paths = {part['path'] for part in finished}
+        partitions = [part for part in self.meta['partitions'] if part['path'] not in paths] + finished
+        partitions.sort(key=lambda part: (_month_number(part['month']), writer.states.get(part['state'], -1)))
+        meta = dict(self.meta, source=None, rows=sum(part['rows'] for part in partitions),
+                    states=writer.state_names, districts=list(writer.districts), partitions=partitions)
+        os.makedirs(staging, exist_ok=True)
+        _write_meta(staging, meta)
+        return meta
+
+    def link(self, path, csv_path):
+        # A copy of this store at path, marked as built from csv_path. The
+        # column files are hard links where the filesystem allows, since the
+        # incremental store replaces its files rather than rewriting them.
+        tmp = path + '.tmp'
+        if os.path.exists(tmp):
+            shutil.rmtree(tmp)
+        os.makedirs(tmp)
+        for part in self.meta['partitions']:
+            source, target = os.path.join(self.path, part['path']), os.path.join(tmp, part['path'])
+            os.makedirs(target)
+            for col in COLUMNS:
+                _link(os.path.join(source, f'{col}.npy'), os.path.join(target, f'{col}.npy'))
+        meta = dict(self.meta, source=columnar.fingerprint(csv_path))
+        _write_meta(tmp, meta)
+        _swap_in(tmp, path)
+        return type(self)(path, meta)
+
+    @classmethod
+    def open(cls, path=STORE_DIR):
+        if not os.path.exists(path) and os.path.exists(path + '.old'):
+            # Caught between the two renames of a swap
+            path += '.old'
+        meta = _read_meta(path)
+        if meta is None or meta.get('version') != STORE_VERSION:
+            return None
+        return cls(path, meta)
+
+    @classmethod
+    def open_or_build(cls, csv_path, path=STORE_DIR):
+        # Rebuild only when the cleaned CSV has changed since the store was built
+        store = cls.open(path)
+        if store is not None and os.path.exists(csv_path) and not store.is_current(csv_path):
+            store = None
+        if store is None:
+            store = cls.build(csv_path, path)
+        return store
+
+    def is_current(self, csv_path):
+        source = self.meta['source']
+        return source is not None and columnar.source_unchanged(
+            csv_path, source['size'], source['mtime_ns'], source['hash'])
+
+    @property
+    def rows(self):
+        return self.meta['rows']
+
+    def district_codes(self, districts):
+        return sorted(code for name in districts for code in self._district_codes.get(name, []))
+
+    def partitions(self, start=None, end=None, states=None, districts=None):
+        # Partitions that can hold matching rows, from meta.json alone
+        start, end = parse_day(start), parse_day(end)
+        states = None if states is None else set(states)
+        codes = None if districts is None else {str(code) for code in self.district_codes(districts)}
+        matched = []
+        for part in self.meta['partitions']:
+            if states is not None and part['state'] not in states:
+                continue
+            if codes is not None and not codes.intersection(part['districts']):
+                continue
+            if start is not None or end is not None:
+                if part['first_day'] is None:
+                    continue
+                if (start is not None and part['last_day'] < start) or (end is not None and part['first_day'] > end):
+                    continue
+            matched.append(part)
+        return matched
+
+    def _open(self, part, columns):
+        directory = os.path.join(self.path, part['path'])
+        return {col: np.load(os.path.join(directory, f'{col}.npy'), mmap_mode='r') for col in columns}
+
+    def scan(self, columns=None, start=None, end=None, states=None, districts=None):
+        # (partition, {column: array}) for each run of matching rows. Whole
+        # partitions and district runs are views of the memory maps; only
+        # the partitions that a date bound cuts through are copied.
+        columns = list(columns or COLUMNS)
+        start, end = parse_day(start), parse_day(end)
+        codes = None if districts is None else self.district_codes(districts)
+        for part in self.partitions(start, end, states, districts):
+            clipped = ((start is not None and part['first_day'] < start)
+                       or (end is not None and part['last_day'] > end))
+            arrays = self._open(part, set(columns) | ({'date'} if clipped else set()))
+            if codes is None:
+                runs = [(0, part['rows'])]
+            else:
+                runs = [part['districts'][str(code)] for code in codes if str(code) in part['districts']]
+            for first, last in runs:
+                run = {col: values[first:last] for col, values in arrays.items()}
+                if clipped:
+                    day = run['date']
+                    mask = np.ones(len(day), dtype=bool)
+                    if start is not None:
+                        mask &= day >= start
+                    if end is not None:
+                        mask &= day <= end
+                    run = {col: values[mask] for col, values in run.items()}
+                yield part, {col: run[col] for col in columns}
+
+    def query(self, columns=None, start=None, end=None, states=None, districts=None):
+        # Matching rows as a frame with the key columns of the cleaned CSV
+        columns = list(columns or schema.CLEANED.columns)
+        stored = [col for col in columns if col in COLUMNS]
+        frames = []
+        with metrics.span('query') as s:
+            for part, run in self.scan(stored, start, end, states, districts):
+                rows = len(next(iter(run.values()))) if run else 0
+                data = {}
+                for col in columns:
+                    if col == 'state':
+                        data[col] = pd.Categorical.from_codes(
+                            np.full(rows, self._state_codes.get(part['state'], -1)),
+                            categories=self.states)
+                    elif col == 'month':
+                        data[col] = np.full(rows, part['month'], dtype=object)
+                    elif col == 'district':
+                        data[col] = pd.Categorical.from_codes(np.asarray(run[col]), categories=self.districts)
+                    elif col == 'date':
+                        data[col] = dates.decode_days(np.asarray(run[col]))
+                    else:
+                        data[col] = np.asarray(run[col])
+                frames.append(pd.DataFrame(data))
+            df = pd.concat(frames, ignore_index=True) if frames else self._empty(columns)
+            s.rows_out = len(df)
+        return df
+
+    def _empty(self, columns):
+        data = {}
+        for col in columns:
+            if col in ('state', 'district'):
+                data[col] = pd.Categorical([], categories=self.states if col == 'state' else self.districts)
+            elif col == 'month':
+                data[col] = pd.Series([], dtype=object)
+            elif col == 'date':
+                data[col] = pd.Series([], dtype='datetime64[ns]')
+            else:
+                data[col] = pd.Series([], dtype=DTYPES[col])
+        return pd.DataFrame(data)
+
+    def totals(self, measures=None, by=None, start=None, end=None, states=None, districts=None):
+        # Summed measures (float64) over the matching rows, optionally per
+        # state, district, month and/or date
+        measures = list(measures or MEASURES)
+        if not by:
+            sums = np.zeros(len(measures))
+            with metrics.span('query') as s:
+                rows = 0
+                for _, run in self.scan(measures, start, end, states, districts):
+                    sums += [run[col].sum(dtype=np.float64) for col in measures]
+                    rows += len(run[measures[0]])
+                s.rows_in = rows
+            return pd.Series(sums, index=measures)
+        by = [by] if isinstance(by, str) else list(by)
+        unknown = [level for level in by if level not in GROUP_LEVELS]
+        if unknown:
+            raise ValueError(f"cannot group by {', '.join(unknown)}; choose from {', '.join(GROUP_LEVELS)}")
+        df = self.query(by + measures, start, end, states, districts)
+        return df.groupby(by, observed=True)[measures].sum().astype(np.float64).reset_index()
+
+
+def build(csv_path='cleaned_aadhar_data.csv', path=STORE_DIR):
+    return PartitionedStore.build(csv_path, path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build or query the month x state partitioned store.')
+    parser.add_argument('command', choices=['build', 'query'])
+    parser.add_argument('--csv', default='cleaned_aadhar_data.csv')
+    parser.add_argument('--store', default=STORE_DIR)
+    parser.add_argument('--start', help='first date (dd-mm-yyyy), inclusive')
+    parser.add_argument('--end', help='last date (dd-mm-yyyy), inclusive')
+    parser.add_argument('--state', nargs='+', default=None)
+    parser.add_argument('--district', nargs='+', default=None)
+    parser.add_argument('--by', nargs='+', choices=GROUP_LEVELS, default=None)
+    args = parser.parse_args()
+    if args.command == 'build':
+        store = build(args.csv, args.store)
+        print(f"Partitioned {store.rows} rows into {len(store.meta['partitions'])} partitions in {args.store}")
+    else:
+        store = PartitionedStore.open_or_build(args.csv, args.store)
+        try:
+            parts = store.partitions(args.start, args.end, args.state, args.district)
+            result = store.totals(by=args.by, start=args.start, end=args.end,
+                                  states=args.state, districts=args.district)
+        except ValueError as error:
+            parser.error(str(error))
+        touched = sum(part['rows'] for part in parts)
+        print(f"Opened {len(parts)} of {len(store.meta['partitions'])} partitions "
+              f"({touched} of {store.rows} rows, {touched / max(store.rows, 1):.1%})")
+        print(result.to_string())
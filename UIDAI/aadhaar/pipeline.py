@@ -0,0 +1,341 @@
+"""DAG runner for the merge_folder scripts.
+
+Each stage declares the files it reads and writes, and a stage depends on
+the stages that write its inputs:
+
+    merge -> clean -> check_cleaned, analyze_merged_data, extract_insights,
+      |               advanced_insights, visualize_data
+      +----> check_merged
+
+A stage is skipped when the content hash of its inputs, its code and its
+parameters matches its last successful run and its outputs are still the
+files that run wrote. A stage's code is its script (or this module) plus
+every aadhaar module it imports, directly or through other modules, as
+found by code_files(). Hashes are cached by size and mtime in
+.pipeline/state.json, so unchanged files are not re-read.
+
+merge and clean run in this process. clean takes the merged frame in memory
+when merge ran in the same invocation, and builds the rollup cube and the
+partitioned store (aadhaar/partitioned.py) from the cleaned frame instead of
+re-reading the CSV. Otherwise (--all-shards, or merge skipped) it streams the
+merged CSV through aadhaar/dedup.py. The leaf stages only read the
+cube or the cleaned CSV, so they run concurrently in a process pool, each
+script with its output captured and printed in DAG order.
+"""
+import ast
+import contextlib
+import hashlib
+import io
+import json
+import os
+import runpy
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+from aadhaar import cleaning, columnar, dates, dedup, figures, ingest, join, metrics, schema
+from aadhaar.cube import CUBE_FILE, Cube
+from aadhaar.partitioned import STORE_DIR, PartitionedStore
+
+STATE_DIR = '.pipeline'
+PACKAGE = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS = os.path.join(os.path.dirname(PACKAGE), 'merge_folder')
+MERGED = 'merged_aadhar_data.csv'
+CLEANED = 'cleaned_aadhar_data.csv'
+STORE_META = os.path.join(STORE_DIR, 'meta.json')
+
+# Modules merge() and clean() call; the modules they import are followed
+MERGE_CODE = ['join.py', 'schema.py']
+CLEAN_CODE = ['cleaning.py', 'dedup.py', 'cube.py', 'partitioned.py']
+
+# (script, inputs, outputs) for the stages run in the process pool. The cube
+# is a function of the cleaned CSV, so the scripts that read it list the CSV.
+LEAVES = [
+    ('check_merged.py', [MERGED], []),
+    ('check_cleaned.py', [CLEANED], []),
+    ('analyze_merged_data.py', [CLEANED], []),
+    ('extract_insights.py', [CLEANED], ['insights.txt']),
+    ('advanced_insights.py', [CLEANED], ['detailed_insights_report.txt']),
+    ('visualize_data.py', [CLEANED], figures.FILES),
+]
+
+
+def imported_modules(path):
+    # Files of the aadhaar modules that `path` imports anywhere in its body
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.module == 'aadhaar':
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and node.module.startswith('aadhaar.'):
+            names.add(node.module.split('.')[1])
+        elif isinstance(node, ast.Import):
+            names.update(alias.name.split('.')[1] for alias in node.names if alias.name.startswith('aadhaar.'))
+    paths = (os.path.join(PACKAGE, f'{name}.py') for name in names)
+    return [path for path in paths if os.path.exists(path)]
+
+
+def code_files(paths):
+    # `paths` and every aadhaar module they import, directly or not
+    seen = set()
+    pending = list(paths)
+    while pending:
+        path = pending.pop()
+        if path not in seen:
+            seen.add(path)
+            pending.extend(imported_modules(path))
+    return sorted(seen)
+
+
+class Stage:
+    def __init__(self, name, run, inputs=(), outputs=(), code=(), params=None, parallel=False):
+        # run is a callable taking the shared context dict, or for a
+        # parallel stage the path of the script to execute
+        self.name = name
+        self.run = run
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.code = list(code)
+        self.params = params or {}
+        self.parallel = parallel
+
+
+def run_script(path):
+    # Executes a merge_folder script in a pool worker and returns its exit
+    # status and everything it printed
+    out = io.StringIO()
+    status = 0
+    # The scripts parse their own arguments; give them none
+    sys.argv = [path]
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(out):
+        try:
+            with metrics.stage(os.path.splitext(os.path.basename(path))[0]):
+                runpy.run_path(path, run_name='__main__')
+        except SystemExit as e:
+            status = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except Exception:
+            traceback.print_exc()
+            status = 1
+    return status, out.getvalue()
+
+
+class Pipeline:
+    def __init__(self, stages, state_dir=STATE_DIR):
+        self.stages = {stage.name: stage for stage in stages}
+        self.state_dir = state_dir
+        self.state = self._load_state()
+        self.context = {}
+        for stage in stages:
+            if stage.parallel and any(self.stages[dep].parallel for dep in self.dependencies(stage)):
+                raise ValueError(f"parallel stage {stage.name} can only depend on in-process stages")
+
+    def _state_file(self):
+        return os.path.join(self.state_dir, 'state.json')
+
+    def _load_state(self):
+        if not os.path.exists(self._state_file()):
+            return {'files': {}, 'stages': {}}
+        with open(self._state_file()) as f:
+            return json.load(f)
+
+    def _save_state(self):
+        os.makedirs(self.state_dir, exist_ok=True)
+        tmp = self._state_file() + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.state, f, indent=1, sort_keys=True)
+        os.replace(tmp, self._state_file())
+
+    def dependencies(self, stage):
+        producers = {output: s.name for s in self.stages.values() for output in s.outputs}
+        return sorted({producers[path] for path in stage.inputs if path in producers})
+
+    def order(self):
+        done, visiting, order = set(), set(), []
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"stage {name} is part of a cycle")
+            visiting.add(name)
+            for dep in self.dependencies(self.stages[name]):
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    def content_hash(self, path):
+        # Re-hash a file only when its size or mtime moved since last time
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        entry = self.state['files'].get(path)
+        if entry and entry['size'] == st.st_size and entry['mtime_ns'] == st.st_mtime_ns:
+            return entry['hash']
+        digest = columnar.file_hash(path)
+        self.state['files'][path] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'hash': digest}
+        return digest
+
+    def stage_key(self, stage):
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(json.dumps([stage.name, stage.params], sort_keys=True).encode())
+        for path in stage.code + stage.inputs:
+            digest.update(os.path.abspath(path).encode())
+            digest.update((self.content_hash(path) if os.path.exists(path) else 'missing').encode())
+        return digest.hexdigest()
+
+    def up_to_date(self, stage, key):
+        recorded = self.state['stages'].get(stage.name)
+        if recorded is None or recorded['key'] != key:
+            return False
+        return all(os.path.exists(path) and self.content_hash(path) == recorded['outputs'].get(path)
+                   for path in stage.outputs)
+
+    def _record(self, stage, key, seconds):
+        self.state['stages'][stage.name] = {
+            'key': key,
+            'outputs': {path: self.content_hash(path) for path in stage.outputs if os.path.exists(path)},
+            'seconds': round(seconds, 3),
+        }
+        self._save_state()
+
+    def _log(self, stage, text):
+        os.makedirs(self.state_dir, exist_ok=True)
+        with open(os.path.join(self.state_dir, f'{stage.name}.log'), 'w') as f:
+            f.write(text)
+
+    def run(self, force=(), workers=None):
+        # Returns {stage: 'ran', 'skipped', 'failed' or 'blocked'}
+        status = {}
+        order = self.order()
+
+        def blocked(stage):
+            return any(status.get(dep) in ('failed', 'blocked') for dep in self.dependencies(stage))
+
+        def pending(stage):
+            if blocked(stage):
+                status[stage.name] = 'blocked'
+                print(f"[{stage.name}] blocked by a failed dependency")
+                return None
+            key = self.stage_key(stage)
+            if stage.name not in force and self.up_to_date(stage, key):
+                status[stage.name] = 'skipped'
+                print(f"[{stage.name}] unchanged, skipped")
+                return None
+            return key
+
+        for stage in (self.stages[name] for name in order if not self.stages[name].parallel):
+            key = pending(stage)
+            if key is None:
+                continue
+            print(f"[{stage.name}] running")
+            start = time.perf_counter()
+            try:
+                with metrics.stage(stage.name):
+                    stage.run(self.context)
+            except Exception:
+                traceback.print_exc()
+                status[stage.name] = 'failed'
+                continue
+            self._record(stage, key, time.perf_counter() - start)
+            status[stage.name] = 'ran'
+
+        leaves = [(self.stages[name], pending(self.stages[name])) for name in order if self.stages[name].parallel]
+        leaves = [(stage, key) for stage, key in leaves if key is not None]
+        if not leaves:
+            return status
+        # The leaf scripts save figures; never open a display from a worker
+        os.environ.setdefault('MPLBACKEND', 'Agg')
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(leaves))) as pool:
+            futures = [pool.submit(run_script, stage.run) for stage, _ in leaves]
+            for (stage, key), future in zip(leaves, futures):
+                code, output = future.result()
+                self._log(stage, output)
+                print(f"[{stage.name}] {'done' if code == 0 else f'failed ({code})'}")
+                print(output, end='')
+                if code == 0:
+                    self._record(stage, key, time.perf_counter() - start)
+                status[stage.name] = 'ran' if code == 0 else 'failed'
+        return status
+
+
+def merge(context, shards, all_shards=False, aggregate=False, memory_mb=join.MEMORY_MB, spill_dir=None):
+    # merge_csv.py without --incremental; shards is {dataset: [paths]} with
+    # all_shards, otherwise the list of shards to join in memory
+    context.pop('merged', None)
+    if all_shards:
+        diagnostics = join.JoinDiagnostics(join.DATASETS)
+        rows = join.sort_merge_join(shards, MERGED, memory_mb=memory_mb, spill_dir=spill_dir,
+                                    aggregate=aggregate, diagnostics=diagnostics)
+        print(f"Joined {sum(len(paths) for paths in shards.values())} shards into {rows} rows")
+        print(diagnostics.report())
+    else:
+        with metrics.span('read_csv') as s:
+            frames = schema.align_categories(ingest.map_shards(columnar.load_shard, shards))
+            s.rows_out = sum(len(df) for df in frames)
+        # Report the expected size, and stop on a blow-up, before joining
+        diagnostics = join.plan_join(frames)
+        print(diagnostics.plan_report(), end='', flush=True)
+        diagnostics.check(join.budget_rows(memory_mb), aggregate)
+        merged = join.merge_frames(frames, aggregate=aggregate, diagnostics=diagnostics)
+        with metrics.span('to_csv', rows_in=len(merged)):
+            merged.to_csv(MERGED, index=False, date_format=dates.DATE_FORMAT)
+        context['merged'] = merged
+        print(diagnostics.actual_report())
+    print(f"Merged CSV created: {MERGED}")
+
+
+def clean(context):
+    # clean_data.py, starting from the merged frame when it is still in memory
+    # and streaming the merged CSV out of core otherwise
+    df = context.pop('merged', None)
+    if df is None:
+        rows, columns, cleaned_rows = dedup.clean_csv(MERGED, CLEANED)
+        print(f"Original data shape: {(rows, len(columns))}")
+        print(f"Cleaned data shape: {(cleaned_rows, len(columns))}")
+        print(f"Removed {rows - cleaned_rows} duplicate rows and invalid entries")
+        Cube.build(CLEANED).save()
+        PartitionedStore.build(CLEANED)
+        print(f"Cleaned CSV, rollup cube and partitioned store created: {CLEANED}, {CUBE_FILE}, {STORE_DIR}")
+        return
+    with metrics.span('drop_duplicates', rows_in=len(df)) as s:
+        cleaned = cleaning.clean(df)
+        s.rows_out = len(cleaned)
+    print(f"Original data shape: {df.shape}")
+    print(f"Cleaned data shape: {cleaned.shape}")
+    print(f"Removed {df.shape[0] - cleaned.shape[0]} duplicate rows and invalid entries")
+    with metrics.span('to_csv', rows_in=len(cleaned)):
+        cleaned.to_csv(CLEANED, index=False, date_format=dates.DATE_FORMAT)
+    Cube.from_frame(cleaned, CLEANED).save()
+    PartitionedStore.from_frame(cleaned, CLEANED)
+    print(f"Cleaned CSV, rollup cube and partitioned store created: {CLEANED}, {CUBE_FILE}, {STORE_DIR}")
+
+
+def build_stages(shards, all_shards=False, aggregate=False, memory_mb=join.MEMORY_MB, spill_dir=None):
+    shard_paths = [p for paths in shards.values() for p in paths] if all_shards else list(shards)
+
+    def run_merge(context):
+        merge(context, shards, all_shards, aggregate, memory_mb, spill_dir)
+
+    def in_process(names):
+        # This module holds merge() and clean() but imports every stage's
+        # modules, so only the named ones are followed
+        return [os.path.abspath(__file__)] + code_files([os.path.join(PACKAGE, name) for name in names])
+
+    stages = [
+        Stage('merge', run_merge, inputs=shard_paths, outputs=[MERGED], code=in_process(MERGE_CODE),
+              params={'all_shards': all_shards, 'aggregate': aggregate}),
+        Stage('clean', clean, inputs=[MERGED], outputs=[CLEANED, CUBE_FILE, STORE_META],
+              code=in_process(CLEAN_CODE)),
+    ]
+    for script, inputs, outputs in LEAVES:
+        path = os.path.join(SCRIPTS, script)
+        stages.append(Stage(os.path.splitext(script)[0], path, inputs=inputs, outputs=outputs,
+                            code=code_files([path]), parallel=True))
+    return stages
@@ -0,0 +1,427 @@
+"""Single-pass, chunked profiler for the api_data_aadhar_* CSV shards.
+
+The per-dataset scripts used to load each shard with one pd.read_csv call and
+then make a dozen passes over it. Here every chunk, read with the narrow
+dtypes of aadhaar/schema.py, updates a set of mergeable statistics once, so
+peak memory is set by the chunk size rather than the file. Shards are
+profiled in a process pool and their ShardProfile objects merged into a
+dataset-wide report.
+
+Duplicate rows are counted from a hash sample of the distinct rows
+(RowSample), capped at SAMPLE_CAPACITY entries so memory does not grow with
+the file. The count is exact while a shard (or merged dataset) has at most
+that many distinct rows and an estimate, labelled as such in the report,
+beyond it. exact_duplicates=True keeps every row hash instead, an exact
+count at O(rows) memory (12 bytes per distinct row).
+"""
+import math
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from aadhaar import dates, duplicates, ingest, metrics, schema, sketch
+
+CHUNK_SIZE = 100000
+HEAD_ROWS = 10
+UNIQUE_COLUMNS = [('state', 'Unique States'), ('district', 'Unique Districts'), ('pincode', 'Unique Pincodes')]
+DESCRIBE_INDEX = ['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max']
+# Distinct row hashes kept for the duplicate count (12 bytes each)
+SAMPLE_CAPACITY = 1 << 20
+
+
+def _is_numeric(dtype):
+    return pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+
+
+def _common_dtype(a, b):
+    if a == b:
+        return a
+    try:
+        return np.promote_types(a, b)
+    except TypeError:
+        return np.dtype(object)
+
+
+class NumericStats:
+    """Count, sum, min/max, Welford mean/variance and a value histogram for one column."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self.mean = 0.0
+        self.m2 = 0.0
+        # Exact quantiles come from the value histogram; the count columns and
+        # pincodes only take a few thousand distinct values.
+        self.values = Counter()
+
+    def update(self, series):
+        values = series.dropna()
+        if values.empty:
+            return
+        other = NumericStats()
+        other.count = len(values)
+        total = values.sum()
+        other.total = int(total) if pd.api.types.is_integer_dtype(values.dtype) else float(total)
+        other.min = values.min()
+        other.max = values.max()
+        as_float = values.to_numpy(dtype='float64')
+        other.mean = float(as_float.mean())
+        other.m2 = float(((as_float - other.mean) ** 2).sum())
+        other.values = Counter(values.value_counts(sort=False).to_dict())
+        self.merge(other)
+
+    def merge(self, other):
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.total = other.count, other.total
+            self.min, self.max = other.min, other.max
+            self.mean, self.m2 = other.mean, other.m2
+            self.values = Counter(other.values)
+            return self
+        # Chan et al. pairwise combination of the Welford accumulators
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.values.update(other.values)
+        return self
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else float('nan')
+
+    def quantile(self, q):
+        # Same linear interpolation as pandas' describe()
+        if self.count == 0:
+            return float('nan')
+        position = q * (self.count - 1)
+        lower, upper = math.floor(position), math.ceil(position)
+        lower_value = upper_value = None
+        seen = 0
+        for value, n in sorted(self.values.items()):
+            seen += n
+            if lower_value is None and seen > lower:
+                lower_value = value
+            if seen > upper:
+                upper_value = value
+                break
+        return float(lower_value) + (float(upper_value) - float(lower_value)) * (position - lower)
+
+    def describe(self):
+        if self.count == 0:
+            return [0.0] + [float('nan')] * 7
+        return [float(self.count), self.mean, self.std, float(self.min),
+                self.quantile(0.25), self.quantile(0.5), self.quantile(0.75), float(self.max)]
+
+
+class RowSample:
+    """Distinct row hashes below a threshold, with their row counts.
+
+    While at most `capacity` distinct rows have been added the threshold is
+    the whole hash range and the duplicate count is exact. Past that it
+    halves until the sample fits again, and duplicates are estimated from
+    the sampled rows scaled by the sampling rate. Every copy of a row has
+    the same hash, so a row's duplicates are kept or dropped together.
+    capacity=None keeps every hash.
+    """
+
+    def __init__(self, capacity=SAMPLE_CAPACITY):
+        self.capacity = capacity
+        # Hashes whose top `level` bits are zero are kept: a 2**-level sample
+        self.level = 0
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.pending = []
+
+    def _kept(self, hashes):
+        if self.level == 0:
+            return np.ones(len(hashes), dtype=bool)
+        return (hashes >> np.uint64(64 - self.level)) == 0
+
+    def add(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        values, counts = np.unique(hashes[self._kept(hashes)], return_counts=True)
+        self.pending.append((values, counts))
+        # Compact once the pending arrays outgrow the sample, so the total
+        # sorting work stays proportional to the number of rows
+        if sum(len(v) for v, _ in self.pending) > max(len(self.hashes), CHUNK_SIZE):
+            self._compact()
+        return self
+
+    def _compact(self):
+        if not self.pending:
+            return
+        values = np.concatenate([self.hashes] + [v for v, _ in self.pending])
+        counts = np.concatenate([self.counts] + [c for _, c in self.pending])
+        self.pending = []
+        keep = self._kept(values)
+        self.hashes, inverse = np.unique(values[keep], return_inverse=True)
+        self.counts = np.bincount(inverse, weights=counts[keep], minlength=len(self.hashes)).astype(np.int64)
+        while self.capacity is not None and len(self.hashes) > self.capacity:
+            self.level += 1
+            keep = self._kept(self.hashes)
+            self.hashes, self.counts = self.hashes[keep], self.counts[keep]
+
+    def merge(self, other):
+        other._compact()
+        if other.capacity is not None:
+            self.capacity = other.capacity if self.capacity is None else min(self.capacity, other.capacity)
+        self.level = max(self.level, other.level)
+        self.pending.append((other.hashes, other.counts))
+        self._compact()
+        return self
+
+    @property
+    def exact(self):
+        self._compact()
+        return self.level == 0
+
+    @property
+    def duplicates(self):
+        self._compact()
+        return int(self.counts.sum() - len(self.hashes)) << self.level
+
+
+class ShardProfile:
+    """Mergeable statistics for one CSV shard, or for several merged together."""
+
+    def __init__(self, name, precision=sketch.PRECISION, exact_duplicates=False):
+        self.name = name
+        self.rows = 0
+        self.columns = []
+        self.dtypes = {}
+        self.head = None
+        self.nulls = Counter()
+        self.uniques = {}
+        self.numeric = {}
+        self.rows_seen = RowSample(None if exact_duplicates else SAMPLE_CAPACITY)
+        # Distinct day numbers, and rows per unparseable date string
+        self.days = set()
+        self.invalid_dates = Counter()
+        # Per-day distinct counts that still add up across shards
+        self.distinct = sketch.ShardSketch(precision)
+
+    def update(self, chunk):
+        if self.head is None:
+            self.columns = list(chunk.columns)
+            self.head = chunk.head(HEAD_ROWS).copy()
+            self.uniques = {col: set() for col, _ in UNIQUE_COLUMNS if col in chunk.columns}
+        elif len(self.head) < HEAD_ROWS:
+            self.head = pd.concat([self.head, chunk.head(HEAD_ROWS - len(self.head))])
+
+        self.rows += len(chunk)
+        for col in chunk.columns:
+            dtype = chunk[col].dtype
+            if isinstance(dtype, pd.CategoricalDtype):
+                # Each chunk has its own categories
+                dtype = pd.CategoricalDtype()
+            self.dtypes[col] = _common_dtype(self.dtypes[col], dtype) if col in self.dtypes else dtype
+        self.nulls.update(chunk.isnull().sum().to_dict())
+
+        for col, seen in self.uniques.items():
+            seen.update(chunk[col].dropna().unique().tolist())
+        for col in chunk.columns:
+            if _is_numeric(chunk[col].dtype):
+                self.numeric.setdefault(col, NumericStats()).update(chunk[col])
+
+        # Duplicate detection samples the 64-bit row hashes
+        self.rows_seen.add(pd.util.hash_pandas_object(chunk, index=False).to_numpy())
+
+        days = None
+        if 'date' in chunk.columns:
+            days = dates.parse_days(chunk['date'], self.invalid_dates)
+            self.days.update(np.unique(days[days != dates.MISSING_DAY]).tolist())
+        self.distinct.update(chunk, days)
+        return self
+
+    def merge(self, other):
+        if other.head is None:
+            return self
+        if self.head is None:
+            self.columns = list(other.columns)
+            self.head = other.head.copy()
+            self.distinct = sketch.ShardSketch(other.distinct.precision)
+            self.rows_seen = RowSample(other.rows_seen.capacity)
+        elif len(self.head) < HEAD_ROWS:
+            self.head = pd.concat([self.head, other.head.head(HEAD_ROWS - len(self.head))])
+        self.rows += other.rows
+        for col, dtype in other.dtypes.items():
+            self.dtypes[col] = _common_dtype(self.dtypes[col], dtype) if col in self.dtypes else dtype
+        self.nulls.update(other.nulls)
+        for col, seen in other.uniques.items():
+            self.uniques.setdefault(col, set()).update(seen)
+        for col, stats in other.numeric.items():
+            self.numeric.setdefault(col, NumericStats()).merge(stats)
+        self.rows_seen.merge(other.rows_seen)
+        self.days.update(other.days)
+        self.invalid_dates.update(other.invalid_dates)
+        self.distinct.merge(other.distinct)
+        return self
+
+    @property
+    def duplicates(self):
+        return self.rows_seen.duplicates
+
+    def numeric_columns(self):
+        return [col for col in self.columns if _is_numeric(self.dtypes[col])]
+
+    def parsed_dates(self):
+        return pd.Series(dates.decode_days(np.array(sorted(self.days), dtype=np.int32)), dtype='datetime64[ns]')
+
+    def report(self, totals=()):
+        report = f"Dataset Analysis Report for {self.name}\n"
+        report += "=" * 60 + "\n\n"
+
+        # Dataset Shape
+        report += f"Dataset Shape: {(self.rows, len(self.columns))}\n\n"
+
+        # First 10 Rows
+        report += "First 10 Rows:\n"
+        report += str(self.head) + "\n\n"
+
+        # Data Types
+        report += "Data Types:\n"
+        report += str(pd.Series({col: self.dtypes[col] for col in self.columns})) + "\n\n"
+
+        # Missing Values
+        report += "Missing Values per Column:\n"
+        report += str(pd.Series({col: self.nulls[col] for col in self.columns}, dtype='int64')) + "\n\n"
+
+        # Unique values for categorical columns
+        for i, (col, label) in enumerate(UNIQUE_COLUMNS):
+            if col in self.uniques:
+                report += f"{label}: {len(self.uniques[col])}\n" + ("\n" if i == len(UNIQUE_COLUMNS) - 1 else "")
+
+        # Totals for the dataset's age columns
+        for i, (col, label) in enumerate(totals):
+            if col in self.numeric:
+                report += f"{label}: {self.numeric[col].total}\n" + ("\n" if i == len(totals) - 1 else "")
+
+        numeric_cols = self.numeric_columns()
+
+        # Summary Statistics for Numeric Columns
+        report += "Summary Statistics for Numeric Columns:\n"
+        summary = pd.DataFrame({col: self.numeric.get(col, NumericStats()).describe() for col in numeric_cols},
+                               index=DESCRIBE_INDEX)
+        report += str(summary) + "\n\n"
+
+        # Additional insights
+        if len(numeric_cols) > 0:
+            report += "Additional Insights:\n"
+            for col in numeric_cols:
+                stats = self.numeric.get(col, NumericStats())
+                report += f"{col} - Min: {stats.min}, Max: {stats.max}, Mean: {stats.mean:.2f}\n"
+            report += "\n"
+
+        # Check for duplicates
+        if self.rows_seen.exact:
+            report += f"Number of Duplicate Rows: {self.duplicates}\n\n"
+        else:
+            report += (f"Number of Duplicate Rows: ~{self.duplicates} (estimated from 1/{1 << self.rows_seen.level} "
+                       f"of the distinct rows; exact with --exact-duplicates)\n\n")
+
+        # Date column analysis if exists
+        if 'date' in self.columns:
+            parsed = self.parsed_dates()
+            report += "Date Range:\n"
+            report += f"Earliest Date: {parsed.min()}\n"
+            report += f"Latest Date: {parsed.max()}\n"
+            report += f"Number of Unique Dates: {parsed.nunique()}\n"
+            if self.invalid_dates:
+                report += f"Unparseable Dates: {dates.invalid_summary(self.invalid_dates)}\n"
+            report += "\n"
+
+        return report
+
+
+def profile_file(file_path, chunksize=CHUNK_SIZE, precision=sketch.PRECISION, exact_duplicates=False):
+    profile = ShardProfile(file_path, precision, exact_duplicates)
+    with metrics.span('read_csv') as s:
+        # Narrow schema dtypes; dates stay text so the profile can report
+        # missing and unparseable ones
+        for chunk in schema.read_chunks(file_path, chunksize=chunksize, parse_dates=False):
+            profile.update(chunk)
+        s.rows_out = profile.rows
+    return profile
+
+
+def analyze_file(file_path, totals=(), chunksize=CHUNK_SIZE):
+    if not os.path.exists(file_path):
+        return f"File {file_path} not found."
+    return profile_file(file_path, chunksize).report(totals)
+
+
+def _profile_if_exists(file_path, chunksize=CHUNK_SIZE, precision=sketch.PRECISION, exact_duplicates=False):
+    if not os.path.exists(file_path):
+        return None
+    return profile_file(file_path, chunksize, precision, exact_duplicates)
+
+
+def profile_files(files, workers=None, chunksize=CHUNK_SIZE, precision=sketch.PRECISION, readers=None,
+                  exact_duplicates=False):
+    # Returns {file: ShardProfile or None} in the order of `files`.
+    # workers=1 profiles in this process, up to `readers` shards at a time;
+    # otherwise one shard per worker process.
+    if workers == 1 or len(files) <= 1:
+        profiles = ingest.map_shards(lambda file: _profile_if_exists(file, chunksize, precision, exact_duplicates),
+                                     files, readers)
+    else:
+        max_workers = min(workers or os.cpu_count() or 1, len(files))
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            n = len(files)
+            profiles = list(pool.map(_profile_if_exists, files, [chunksize] * n, [precision] * n,
+                                     [exact_duplicates] * n))
+    return dict(zip(files, profiles))
+
+
+def merge_profiles(profiles, name):
+    combined = ShardProfile(name)
+    for profile in profiles:
+        if profile is not None:
+            combined.merge(profile)
+    return combined
+
+
+def report_filename(file_path):
+    return f"analysis_report_{os.path.basename(file_path).replace('.csv', '')}.txt"
+
+
+def write_reports(files, totals=(), dataset=None, workers=None, chunksize=CHUNK_SIZE, duplicate_mode=None,
+                  sketch_error=None, readers=None, exact_duplicates=False):
+    precision = sketch.precision_for(sketch_error) if sketch_error else sketch.PRECISION
+    profiles = profile_files(files, workers, chunksize, precision, readers, exact_duplicates)
+    for file, profile in profiles.items():
+        report_content = profile.report(totals) if profile is not None else f"File {file} not found."
+        filename = report_filename(file)
+        with open(filename, 'w') as f:
+            f.write(report_content)
+        if profile is not None:
+            profile.distinct.save(sketch.sketch_filename(file))
+        print(f"Analysis for {file} completed. Results saved to '{filename}'")
+
+    found = [profile for profile in profiles.values() if profile is not None]
+    if dataset and found:
+        combined = merge_profiles(found, f"{dataset} (all {len(found)} shards)")
+        filename = f"analysis_report_{dataset}_all.txt"
+        with open(filename, 'w') as f:
+            f.write(combined.report(totals))
+        combined.distinct.save(sketch.sketch_filename(f"{dataset}_all"))
+        print(f"Combined analysis of {len(found)} shards completed. Results saved to '{filename}'")
+
+    # The profiles count duplicates per shard; this locates them across shards
+    if dataset and found and duplicate_mode:
+        filename = f"duplicates_report_{dataset}.txt"
+        with open(filename, 'w') as f:
+            f.write(duplicates.find_duplicates(files, bloom=duplicate_mode == 'bloom').report())
+        print(f"Cross-shard duplicate check completed. Results saved to '{filename}'")
+    return profiles
@@ -0,0 +1,210 @@
+"""Streaming top-k and bottom-k rankings by measure or ratio.
+
+The scripts built the full district groupby and then called nlargest,
+nsmallest or sort_values().head(10) on it. A Ranking instead keeps one row
+of partial sums per key while chunks stream through update(): shard chunks,
+cleaned CSV chunks or rollup cube cells. Rankings of different shards
+combine with merge(). top() and bottom() then compute the metric for every
+key, in the order the keys were first seen, and pass them through a
+bounded heap of k entries instead of sorting them by the metric or by key.
+Each block of keys is first cut down, vectorized, to those that can beat
+the heap's current worst entry, so only a handful reach heapq. Only the k
+winners become DataFrame rows.
+
+Metrics are the count columns, rows, total_enrolment, total_demo_population,
+total_bio_updates, coverage_rate (enrolment per demographic population, %)
+and bio_update_rate (biometric updates per enrolment, %). A rate is 0 where
+its denominator is 0. `nonzero` drops keys whose metric is 0 before ranking,
+like the scripts' `> 0` filters. It can also name another metric, e.g. rank
+by coverage_rate among keys with a demographic population.
+
+Ties keep the key that sorts first, as nlargest/nsmallest do on a groupby
+result; the heap compares the keys of tied entries. The returned frame is
+indexed by rank, from 0.
+
+Usage: python -m aadhaar.ranking <csv> [<csv> ...] [--level district] [--metric total_enrolment]
+                                 [--k 10] [--bottom] [--nonzero [METRIC]]
+"""
+import argparse
+import heapq
+
+import numpy as np
+import pandas as pd
+
+from aadhaar import ingest, metrics, schema
+from aadhaar.cube import BIOMETRIC, DEMOGRAPHIC, ENROLMENT, MEASURES
+
+TOTALS = {'total_enrolment': ENROLMENT, 'total_demo_population': DEMOGRAPHIC, 'total_bio_updates': BIOMETRIC}
+RATES = {'coverage_rate': ('total_enrolment', 'total_demo_population'),
+         'bio_update_rate': ('total_bio_updates', 'total_enrolment')}
+METRICS = MEASURES + ['rows'] + list(TOTALS) + list(RATES)
+LEVELS = {'state': ['state'], 'district': ['state', 'district'], 'pincode': ['state', 'district', 'pincode']}
+TOP_K = 10
+# Keys offered to the heap per vectorized pre-filter
+BLOCK = 4096
+
+
+def derive(sums):
+    # Totals and rates from summed measures (scalars or arrays)
+    for total, columns in TOTALS.items():
+        sums[total] = sum(sums[col] for col in columns)
+    for rate, (numerator, denominator) in RATES.items():
+        num = np.asarray(sums[numerator], dtype=np.float64)
+        den = np.asarray(sums[denominator], dtype=np.float64)
+        sums[rate] = np.divide(num, den, out=np.zeros_like(num), where=den > 0) * 100
+    return sums
+
+
+class _Label:
+    # Heap tie-break: of two equal values, the smaller label is the better
+    __slots__ = ('label',)
+
+    def __init__(self, label):
+        self.label = label
+
+    def __lt__(self, other):
+        return other.label < self.label
+
+    def __gt__(self, other):
+        return self.label < other.label
+
+
+def select(values, k, largest=True, labels=None):
+    # Positions of the k largest (or smallest) values, best first; ties go
+    # to the smaller label when labels (one per value) are given, else to
+    # the lower position. A min-heap holds the k best so far, its root the
+    # worst of them.
+    values = np.asarray(values, dtype=np.float64)
+    sign = 1.0 if largest else -1.0
+    heap = []
+    for start in range(0, len(values), BLOCK):
+        block = sign * values[start:start + BLOCK]
+        positions = np.arange(start, start + len(block))
+        if len(heap) == k:
+            # Only better values can displace an entry; an equal value can
+            # only win on its label, never on a later position
+            keep = block > heap[0][0] if labels is None else block >= heap[0][0]
+            block, positions = block[keep], positions[keep]
+        if len(block) > k:
+            # At most k of the block (and ties with its k-th) can make it
+            keep = block >= np.partition(block, len(block) - k)[len(block) - k]
+            block, positions = block[keep], positions[keep]
+        for value, position in zip(block.tolist(), positions.tolist()):
+            entry = (value, -position if labels is None else _Label(labels[position]), position)
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+    return [position for _, _, position in sorted(heap, reverse=True)]
+
+
+class Ranking:
+    def __init__(self, keys=LEVELS['district']):
+        self.keys = list(keys)
+        self.slots = {}
+        self.sums = np.zeros((0, len(MEASURES) + 1))
+
+    def update(self, chunk):
+        # Add a chunk of rows (or pre-summed cells with a 'rows' column);
+        # missing count columns count as 0 and rows with a missing key are
+        # left out, as in a groupby
+        chunk = chunk.rename(columns=str.strip)
+        values = pd.DataFrame({col: chunk[col] if col in chunk.columns else 0.0 for col in MEASURES},
+                              index=chunk.index).fillna(0).astype(np.float64)
+        values['rows'] = chunk['rows'] if 'rows' in chunk.columns else 1.0
+        for col in self.keys:
+            values[col] = chunk[col]
+        part = values.groupby(self.keys, observed=True, sort=False)[MEASURES + ['rows']].sum()
+        labels = part.index.tolist()
+        slots = np.fromiter((self.slots.setdefault(label, len(self.slots)) for label in labels),
+                            dtype=np.int64, count=len(labels))
+        if len(self.slots) > len(self.sums):
+            grown = np.zeros((max(len(self.slots), 2 * len(self.sums)), self.sums.shape[1]))
+            grown[:len(self.sums)] = self.sums
+            self.sums = grown
+        np.add.at(self.sums, slots, part.to_numpy(dtype=np.float64))
+        return self
+
+    def merge(self, other):
+        if other.keys != self.keys:
+            raise ValueError(f"cannot merge a ranking by {other.keys} into one by {self.keys}")
+        labels = list(other.slots)
+        chunk = pd.DataFrame(other.sums[:len(labels)], columns=MEASURES + ['rows'])
+        for i, col in enumerate(self.keys):
+            chunk[col] = [label[i] if len(self.keys) > 1 else label for label in labels]
+        return self.update(chunk)
+
+    def _derived(self):
+        # Sums, totals and rates per slot, in slot order
+        sums = self.sums[:len(self.slots)]
+        return derive({col: sums[:, j] for j, col in enumerate(MEASURES + ['rows'])})
+
+    def _frame(self, labels, slots, derived):
+        keys = [labels[i] for i in slots]
+        frame = pd.DataFrame(keys if len(self.keys) > 1 else {self.keys[0]: keys}, columns=self.keys)
+        for col in METRICS:
+            frame[col] = derived[col][slots]
+        return frame
+
+    def table(self):
+        # Every key in sorted order with its sums, totals and rates
+        labels = list(self.slots)
+        order = np.array(sorted(range(len(labels)), key=labels.__getitem__), dtype=np.int64)
+        return self._frame(labels, order, self._derived())
+
+    def rank(self, metric, k=TOP_K, largest=True, nonzero=False):
+        if metric not in METRICS:
+            raise ValueError(f"unknown metric {metric}; choose from {', '.join(METRICS)}")
+        with metrics.span('rank', rows_in=len(self.slots)) as s:
+            labels = list(self.slots)
+            derived = self._derived()
+            candidates = np.arange(len(labels))
+            if nonzero:
+                candidates = np.flatnonzero(derived[metric if nonzero is True else nonzero] != 0)
+            chosen = candidates[select(derived[metric][candidates], k, largest,
+                                       [labels[i] for i in candidates.tolist()] if nonzero else labels)]
+            ranked = self._frame(labels, chosen, derived)
+            s.rows_out = len(ranked)
+        return ranked
+
+    def top(self, metric='total_enrolment', k=TOP_K, nonzero=False):
+        return self.rank(metric, k, True, nonzero)
+
+    def bottom(self, metric='total_enrolment', k=TOP_K, nonzero=False):
+        return self.rank(metric, k, False, nonzero)
+
+
+def from_csv(paths, keys=LEVELS['district'], readers=None, chunksize=schema.CHUNK_SIZE):
+    # One Ranking per file, streamed and read concurrently, then merged
+    def rank_file(path):
+        table = schema.table_for(path)
+        usecols = list(keys) + list(table.counts)
+        ranking = Ranking(keys)
+        for chunk in schema.read_chunks(path, table, usecols=usecols, chunksize=chunksize, parse_dates=False):
+            ranking.update(chunk)
+        return ranking
+
+    rankings = ingest.map_shards(rank_file, paths, readers)
+    combined = Ranking(keys)
+    for ranking in rankings:
+        combined.merge(ranking)
+    return combined
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Top-k or bottom-k states, districts or pincodes of CSV shards.')
+    parser.add_argument('files', nargs='+', help='api_data_aadhar_* shards, merged or cleaned CSVs')
+    parser.add_argument('--level', choices=list(LEVELS), default='district')
+    parser.add_argument('--metric', choices=METRICS, default='total_enrolment')
+    parser.add_argument('--k', type=int, default=TOP_K)
+    parser.add_argument('--bottom', action='store_true', help='smallest values first')
+    parser.add_argument('--nonzero', nargs='?', const=True, default=False, choices=METRICS, metavar='METRIC',
+                        help='drop keys whose metric (or METRIC) is 0')
+    parser.add_argument('--readers', type=int, default=None, help='files read at once (default: AADHAAR_READERS)')
+    args = parser.parse_args()
+    ranking = from_csv(args.files, LEVELS[args.level], readers=args.readers)
+    result = ranking.rank(args.metric, args.k, largest=not args.bottom, nonzero=args.nonzero)
+    columns = LEVELS[args.level] + [args.metric]
+    if args.nonzero not in (False, True, args.metric):
+        columns.append(args.nonzero)
+    print(result[columns].to_string(index=False))
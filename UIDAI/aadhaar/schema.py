@@ -0,0 +1,196 @@
+"""Declared columns and dtypes of every CSV the scripts load.
+
+Bare pd.read_csv gives int64 counts and pincodes and one Python string per
+state and district cell. read_chunks() and load() read only the declared
+columns (usecols) and store them narrowly:
+
+    date             int32 day number (aadhaar/dates.py), MISSING_DAY if empty
+    state, district  category
+    pincode          uint32
+    counts           uint16 for the child age groups, uint32 for the adult ones;
+                     float32 in the merged and cleaned tables, which hold the
+                     0-filled join output written as 1.0, 2.0, ...
+
+Each chunk is validated as it is converted. Requested columns must exist.
+Counts and pincodes must be whole and non-negative and fit their dtype.
+Pincodes must be present, and so must the counts of the merged and cleaned
+tables. A shard may leave count cells empty: a chunk with gaps in a count
+column gets that column as float (float32 for uint16 counts, float64 for
+uint32 ones) with NaN in the gaps, as pd.read_csv would give, and the
+merge zero-fills them. Dates must be dd-mm-yyyy. Pass a Counter as `invalid` to collect bad
+dates instead of failing. Problems raise SchemaError, naming the file, the
+column and the first offending rows.
+"""
+import fnmatch
+import os
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from aadhaar import dates, ingest
+
+KEY_COLUMNS = ['date', 'state', 'district', 'pincode']
+CATEGORY_COLUMNS = ['state', 'district']
+PINCODE_DTYPE = 'uint32'
+CHUNK_SIZE = 250000
+MAX_EXAMPLES = 5
+# float32 holds every whole number up to 2**24 exactly
+FLOAT32_EXACT = 2 ** 24
+
+
+class SchemaError(ValueError):
+    pass
+
+
+class Table:
+    def __init__(self, name, pattern, counts, gaps=False):
+        self.name = name
+        self.pattern = pattern
+        self.counts = dict(counts)
+        # Whether count cells may be empty
+        self.gaps = gaps
+
+    @property
+    def columns(self):
+        return KEY_COLUMNS + list(self.counts)
+
+    def dtype(self, col):
+        if col == 'date':
+            return np.dtype(np.int32)
+        if col in CATEGORY_COLUMNS:
+            return 'category'
+        if col == 'pincode':
+            return np.dtype(PINCODE_DTYPE)
+        return np.dtype(self.counts[col])
+
+
+ENROLMENT = Table('enrolment', 'api_data_aadhar_enrolment_*.csv',
+                  {'age_0_5': 'uint16', 'age_5_17': 'uint16', 'age_18_greater': 'uint32'}, gaps=True)
+DEMOGRAPHIC = Table('demographic', 'api_data_aadhar_demographic_*.csv',
+                    {'demo_age_5_17': 'uint16', 'demo_age_17_': 'uint32'}, gaps=True)
+BIOMETRIC = Table('biometric', 'api_data_aadhar_biometric_*.csv',
+                  {'bio_age_5_17': 'uint16', 'bio_age_17_': 'uint32'}, gaps=True)
+# merge_csv.py output: every dataset's counts, in join order
+MERGED = Table('merged', 'merged_aadhar_data.csv',
+               {col: 'float32' for table in (ENROLMENT, DEMOGRAPHIC, BIOMETRIC) for col in table.counts})
+CLEANED = Table('cleaned', 'cleaned_aadhar_data.csv', MERGED.counts)
+TABLES = {table.name: table for table in (ENROLMENT, DEMOGRAPHIC, BIOMETRIC, MERGED, CLEANED)}
+
+
+def table_for(path):
+    name = os.path.basename(path)
+    for table in TABLES.values():
+        if fnmatch.fnmatch(name, table.pattern):
+            return table
+    raise SchemaError(f"{path}: no declared schema matches this file name")
+
+
+def align_categories(frames, columns=CATEGORY_COLUMNS):
+    # Give every frame the same sorted dictionary so joins and concats keep
+    # the categorical dtype and sort in string order.
+    for col in columns:
+        present = [df for df in frames if col in df.columns]
+        categories = sorted(set().union(*(df[col].cat.categories for df in present))) if present else []
+        for df in present:
+            df[col] = df[col].cat.set_categories(categories)
+    return frames
+
+
+def _examples(offsets, values):
+    shown = ', '.join(f"row {o}: {v!r}" for o, v in zip(offsets[:MAX_EXAMPLES], values[:MAX_EXAMPLES]))
+    return shown + (', ...' if len(offsets) > MAX_EXAMPLES else '')
+
+
+def _whole_numbers(series, dtype, where, offsets, gaps=False):
+    values = pd.to_numeric(series, errors='coerce').to_numpy(dtype='float64')
+    limit = FLOAT32_EXACT if dtype == np.float32 else np.iinfo(dtype).max
+    # Empty cells (not unparseable ones) are allowed where the table has gaps
+    missing = series.isna().to_numpy() if gaps else np.zeros(len(values), dtype=bool)
+    with np.errstate(invalid='ignore'):
+        bad = ~missing & (np.isnan(values) | (values < 0) | (values > limit) | (values % 1 != 0))
+    if bad.any():
+        raise SchemaError(f"{where}: {series.name} must be whole numbers in [0, {limit}] "
+                          f"({_examples(offsets[bad], series.to_numpy()[bad].tolist())})")
+    if missing.any():
+        return values.astype(np.float32 if limit <= FLOAT32_EXACT else np.float64)
+    return values.astype(dtype)
+
+
+def _coerce(chunk, table, path, offset, parse_dates, invalid):
+    offsets = np.arange(offset, offset + len(chunk))
+    for col in chunk.columns:
+        if col == 'date':
+            if not parse_dates:
+                continue
+            bad = Counter()
+            chunk[col] = dates.parse_days(chunk[col], bad)
+            if bad and invalid is None:
+                raise SchemaError(f"{path}: date is not dd-mm-yyyy ({dates.invalid_summary(bad, MAX_EXAMPLES)})")
+            if invalid is not None:
+                invalid.update(bad)
+        elif col not in CATEGORY_COLUMNS:
+            gaps = table.gaps and col != 'pincode'
+            chunk[col] = _whole_numbers(chunk[col], table.dtype(col), path, offsets, gaps)
+    return chunk
+
+
+def _header(path):
+    # Stripped column name -> name as written in the file
+    return {col.strip(): col for col in pd.read_csv(path, nrows=0).columns}
+
+
+def _columns(path, table, usecols):
+    wanted = table.columns if usecols is None else list(usecols)
+    unknown = [col for col in wanted if col not in table.columns]
+    if unknown:
+        raise SchemaError(f"{path}: {', '.join(unknown)} not in the {table.name} schema")
+    header = _header(path)
+    missing = [col for col in wanted if col not in header]
+    if missing:
+        raise SchemaError(f"{path}: missing column(s) {', '.join(missing)} of the {table.name} schema")
+    return wanted, header
+
+
+def empty(table, usecols=None, parse_dates=True):
+    columns = table.columns if usecols is None else list(usecols)
+    return pd.DataFrame({col: pd.Series([], dtype=object if col == 'date' and not parse_dates else table.dtype(col))
+                         for col in columns})
+
+
+def _convert(raw, wanted, table, path, parse_dates, invalid):
+    offset = 0
+    for chunk in raw:
+        chunk.columns = chunk.columns.str.strip()
+        yield _coerce(chunk[wanted], table, path, offset, parse_dates, invalid)
+        offset += len(chunk)
+
+
+def read_chunks(path, table=None, usecols=None, chunksize=CHUNK_SIZE, parse_dates=True, invalid=None,
+                engine=None, depth=ingest.PREFETCH):
+    # Chunks are parsed and converted `depth` chunks ahead of the caller; see
+    # aadhaar/ingest.py
+    table = table or table_for(path)
+    wanted, header = _columns(path, table, usecols)
+    raw = ingest.csv_chunks(path, [header[col] for col in wanted],
+                            categories=[header[col] for col in wanted if col in CATEGORY_COLUMNS],
+                            text=[header[col] for col in wanted if col == 'date'],
+                            chunksize=chunksize, engine=engine)
+    return ingest.prefetch(_convert(raw, wanted, table, path, parse_dates, invalid), depth)
+
+
+def load(path, table=None, usecols=None, chunksize=CHUNK_SIZE, parse_dates=True, invalid=None):
+    # The whole file, converted chunk by chunk so the int64 and string
+    # intermediates never exist for all rows at once
+    table = table or table_for(path)
+    chunks = list(read_chunks(path, table, usecols, chunksize, parse_dates, invalid))
+    if not chunks:
+        return empty(table, usecols, parse_dates)
+    return pd.concat(align_categories(chunks), ignore_index=True)
+
+
+def to_csv(df, path, **kwargs):
+    # Write int32 day numbers back as dd-mm-yyyy
+    if 'date' in df.columns and pd.api.types.is_integer_dtype(df['date'].dtype):
+        df = df.assign(date=dates.decode_days(df['date'].to_numpy()))
+    df.to_csv(path, index=False, date_format=dates.DATE_FORMAT, **kwargs)
@@ -0,0 +1,413 @@
+"""Local HTTP/JSON query service over cleaned_aadhar_data.csv.
+
+Answering one question about one district used to mean re-running a whole
+script, and every run loaded the whole CSV again. The service loads the
+cleaned rows once into an Index:
+
+- rows sorted by state, district, pincode and date, as int32 day numbers,
+  uint32 pincodes and float32 counts,
+- every (state, district) pair is an "area" holding a contiguous row range,
+  with its measures summed up front,
+- a pincode order, for looking rows up by pincode.
+
+Totals for states and districts without a date range come from the area
+sums. Everything else sums only the selected rows, and groups with
+np.bincount. Answers are cached in an LRU cache keyed by the normalised
+query. A watcher thread polls the CSV. Once a new version has stopped
+changing for one poll interval, it builds a new Index, swaps it in and
+clears the cache. Requests already running finish on the old Index.
+
+Endpoints (GET, parameters may repeat: state=Bihar&state=Kerala):
+
+    /totals      state, district, pincode, start, end (dd-mm-yyyy)
+    /top         metric, level (state|district|pincode), k, order (top|bottom),
+                 nonzero (1 drops groups whose metric is 0), plus the filters
+    /timeseries  metric, freq (day|month), plus the filters
+    /coverage    coverage and biometric update rates, plus the filters
+    /status      source, row count, load time and cache statistics
+
+Metrics are the seven count columns, rows, total_enrolment,
+total_demo_population, total_bio_updates, coverage_rate (enrolment per
+demographic population, %) and bio_update_rate (biometric updates per
+enrolment, %). A rate is 0 where its denominator is 0.
+
+Usage: python -m aadhaar.service [--csv cleaned_aadhar_data.csv] [--port 8765] [--cache-size 1024] [--poll 2]
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from aadhaar import columnar, dates, metrics, schema
+from aadhaar.cube import MEASURES
+from aadhaar.partitioned import parse_day
+from aadhaar.ranking import METRICS, RATES, TOTALS, derive, select
+
+HOST = '127.0.0.1'
+PORT = 8765
+CACHE_SIZE = 1024
+POLL_SECONDS = 2.0
+TOP_K = 10
+LEVELS = ['state', 'district', 'pincode']
+
+
+def _columns(metric):
+    # The summed columns a metric is computed from
+    if metric in TOTALS or metric in RATES:
+        return MEASURES + ['rows']
+    return [metric] if metric == 'rows' else [metric, 'rows']
+
+
+class Index:
+    def __init__(self, df, source):
+        self.source = source
+        self.loaded_at = time.time()
+        state = df['state'].cat.codes.to_numpy()
+        district = df['district'].cat.codes.to_numpy()
+        pincode = df['pincode'].to_numpy()
+        day = df['date'].to_numpy()
+        order = np.lexsort((day, pincode, district, state))
+        self.rows = len(order)
+        self.states = list(df['state'].cat.categories)
+        self.day = day[order]
+        self.pincode = pincode[order]
+        self.state = state[order]
+        self.values = {col: df[col].to_numpy()[order] for col in MEASURES}
+        # Areas: one contiguous row range per (state, district)
+        district = district[order]
+        new = np.ones(self.rows, dtype=bool)
+        new[1:] = (self.state[1:] != self.state[:-1]) | (district[1:] != district[:-1])
+        starts = np.flatnonzero(new)
+        self.area = np.cumsum(new) - 1
+        self.area_bounds = np.r_[starts, self.rows]
+        self.area_state = self.state[starts]
+        names = df['district'].cat.categories
+        self.area_names = [(self.states[s] if s >= 0 else None, names[d] if d >= 0 else None)
+                           for s, d in zip(self.area_state.tolist(), district[starts].tolist())]
+        self.area_sums = {col: np.add.reduceat(values.astype(np.float64), starts) if self.rows else np.zeros(0)
+                          for col, values in self.values.items()}
+        self.area_sums['rows'] = np.diff(self.area_bounds).astype(np.float64)
+        self._areas_by_state, self._areas_by_district = {}, {}
+        for area, (state_name, district_name) in enumerate(self.area_names):
+            self._areas_by_state.setdefault(state_name, []).append(area)
+            self._areas_by_district.setdefault(district_name, []).append(area)
+        self.pin_order = np.argsort(self.pincode, kind='stable')
+        self.pin_sorted = self.pincode[self.pin_order]
+        self.pincodes, self.pin_id = np.unique(self.pincode, return_inverse=True)
+
+    @classmethod
+    def load(cls, csv_path):
+        source = columnar.fingerprint(csv_path)
+        with metrics.span('load_index') as s:
+            index = cls(schema.load(csv_path, schema.CLEANED), source)
+            s.rows_out = index.rows
+        return index
+
+    def areas(self, states=None, districts=None):
+        # Area ids matching the state and district names; None means all
+        if not states and not districts:
+            return None
+        selected = set(range(len(self.area_names)))
+        if states:
+            selected &= {a for name in states for a in self._areas_by_state.get(name, [])}
+        if districts:
+            selected &= {a for name in districts for a in self._areas_by_district.get(name, [])}
+        return np.array(sorted(selected), dtype=np.int64)
+
+    def select(self, states=None, districts=None, pincodes=None, start=None, end=None):
+        # Row positions matching every filter, or None for all rows
+        areas = self.areas(states, districts)
+        rows = None
+        if areas is not None:
+            rows = np.concatenate([np.arange(self.area_bounds[a], self.area_bounds[a + 1]) for a in areas] or
+                                  [np.zeros(0, dtype=np.int64)])
+        if pincodes:
+            wanted = np.array([int(p) for p in pincodes], dtype=self.pincode.dtype)
+            lo = np.searchsorted(self.pin_sorted, wanted, side='left')
+            hi = np.searchsorted(self.pin_sorted, wanted, side='right')
+            by_pin = np.sort(np.concatenate([self.pin_order[a:b] for a, b in zip(lo, hi)]))
+            rows = by_pin if rows is None else np.intersect1d(rows, by_pin, assume_unique=True)
+        if start is not None or end is not None:
+            day = self.day if rows is None else self.day[rows]
+            mask = np.ones(len(day), dtype=bool)
+            if start is not None:
+                mask &= day >= start
+            if end is not None:
+                mask &= day <= end
+            rows = np.flatnonzero(mask) if rows is None else rows[mask]
+        return rows
+
+    def _column(self, col, rows):
+        if col == 'rows':
+            return np.ones(self.rows if rows is None else len(rows), dtype=np.float32)
+        return self.values[col] if rows is None else self.values[col][rows]
+
+    def totals(self, states=None, districts=None, pincodes=None, start=None, end=None):
+        if not pincodes and start is None and end is None:
+            areas = self.areas(states, districts)
+            sums = {col: float(values.sum() if areas is None else values[areas].sum())
+                    for col, values in self.area_sums.items()}
+        else:
+            rows = self.select(states, districts, pincodes, start, end)
+            sums = {col: float(self._column(col, rows).sum(dtype=np.float64)) for col in MEASURES + ['rows']}
+        return {name: float(value) for name, value in derive(sums).items()}
+
+    def _groups(self, level, rows):
+        # (group id per selected row, group labels)
+        if level == 'state':
+            return (self.state if rows is None else self.state[rows]), self.states
+        if level == 'district':
+            return (self.area if rows is None else self.area[rows]), self.area_names
+        return (self.pin_id if rows is None else self.pin_id[rows]), self.pincodes.tolist()
+
+    def top(self, metric, level='district', k=TOP_K, order='top', nonzero=False, **filters):
+        rows = self.select(**filters)
+        groups, labels = self._groups(level, rows)
+        valid = groups >= 0
+        groups = groups[valid]
+        sums = {col: np.bincount(groups, weights=self._column(col, rows)[valid], minlength=len(labels))
+                for col in _columns(metric)}
+        if metric in TOTALS or metric in RATES:
+            sums = derive(sums)
+        values = sums[metric]
+        candidates = np.flatnonzero(sums['rows'] > 0)
+        if nonzero:
+            candidates = candidates[values[candidates] != 0]
+        # Bounded-heap selection (aadhaar/ranking.py); ties rank in label order
+        ranked = candidates[select(values[candidates], k, largest=order == 'top')]
+        return [{level: _label(labels[g]), metric: float(values[g])} for g in ranked]
+
+    def timeseries(self, metric, freq='day', **filters):
+        rows = self.select(**filters)
+        day = self.day if rows is None else self.day[rows]
+        known = day != dates.MISSING_DAY
+        if freq == 'month':
+            periods = day[known].astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+        else:
+            periods = day[known].astype(np.int64)
+        keys, slot = np.unique(periods, return_inverse=True)
+        sums = {col: np.bincount(slot, weights=self._column(col, rows)[known], minlength=len(keys))
+                for col in _columns(metric)}
+        if metric in TOTALS or metric in RATES:
+            sums = derive(sums)
+        if freq == 'month':
+            names = [str(np.datetime64(key, 'M')) for key in keys.tolist()]
+        else:
+            names = pd.DatetimeIndex(dates.decode_days(keys.astype(np.int32))).strftime(dates.DATE_FORMAT).tolist()
+        return [{'period': name, metric: float(value)} for name, value in zip(names, sums[metric])]
+
+
+def _label(label):
+    if isinstance(label, tuple):
+        return {'state': label[0], 'district': label[1]}
+    return label
+
+
+class LRUCache:
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.items = OrderedDict()
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self.items:
+                self.items.move_to_end(key)
+                self.hits += 1
+                return self.items[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self.items.clear()
+
+
+class QueryError(ValueError):
+    pass
+
+
+def _one(params, name, default=None, choices=None, cast=str):
+    values = params.get(name)
+    if not values:
+        return default
+    try:
+        value = cast(values[-1])
+    except ValueError:
+        raise QueryError(f"{name}={values[-1]!r} is not valid")
+    if choices is not None and value not in choices:
+        raise QueryError(f"{name} must be one of {', '.join(choices)}")
+    return value
+
+
+def _filters(params):
+    try:
+        start, end = parse_day(_one(params, 'start')), parse_day(_one(params, 'end'))
+    except ValueError as error:
+        raise QueryError(str(error))
+    pincodes = params.get('pincode')
+    if pincodes and not all(p.isascii() and p.isdigit() for p in pincodes):
+        raise QueryError("pincode must be digits")
+    limit = np.iinfo(schema.PINCODE_DTYPE).max
+    if pincodes and any(int(p) > limit for p in pincodes):
+        raise QueryError(f"pincode must be at most {limit}")
+    return {'states': params.get('state'), 'districts': params.get('district'), 'pincodes': pincodes,
+            'start': start, 'end': end}
+
+
+class QueryService:
+    def __init__(self, csv_path, cache_size=CACHE_SIZE):
+        self.csv_path = csv_path
+        self.cache = LRUCache(cache_size)
+        # (Index, generation) swapped as one reference on reload
+        self.current = (Index.load(csv_path), 0)
+        self.reloads = 0
+
+    @property
+    def index(self):
+        return self.current[0]
+
+    def answer(self, path, params):
+        # JSON bytes for one request, from the cache when the same query has
+        # been answered against the current Index
+        index, generation = self.current
+        if path == '/status':
+            return json.dumps(self._compute(index, path, params)).encode()
+        key = (generation, path, tuple(sorted((name, tuple(values)) for name, values in params.items())))
+        body = self.cache.get(key)
+        if body is None:
+            body = json.dumps(self._compute(index, path, params)).encode()
+            self.cache.put(key, body)
+        return body
+
+    def _compute(self, index, path, params):
+        if path == '/status':
+            return {'source': os.path.abspath(self.csv_path), 'rows': index.rows, 'generation': self.current[1],
+                    'loaded_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(index.loaded_at)),
+                    'reloads': self.reloads, 'cache_entries': len(self.cache.items),
+                    'cache_hits': self.cache.hits, 'cache_misses': self.cache.misses}
+        filters = _filters(params)
+        if path == '/totals':
+            return index.totals(**filters)
+        if path == '/coverage':
+            totals = index.totals(**filters)
+            return {name: totals[name] for name in list(RATES) + list(TOTALS)}
+        if path == '/top':
+            return index.top(_one(params, 'metric', 'total_enrolment', METRICS),
+                             level=_one(params, 'level', 'district', LEVELS),
+                             k=max(1, _one(params, 'k', TOP_K, cast=int)),
+                             order=_one(params, 'order', 'top', ['top', 'bottom']),
+                             nonzero=_one(params, 'nonzero', '0') not in ('0', 'false'), **filters)
+        if path == '/timeseries':
+            return index.timeseries(_one(params, 'metric', 'total_enrolment', METRICS),
+                                    freq=_one(params, 'freq', 'day', ['day', 'month']), **filters)
+        raise LookupError(path)
+
+    def changed(self):
+        source = self.index.source
+        st = os.stat(self.csv_path)
+        if not columnar.source_unchanged(self.csv_path, source['size'], source['mtime_ns'], source['hash']):
+            return True
+        # Touched but unchanged: keep the new mtime, so the next poll does
+        # not hash the file again
+        source['size'], source['mtime_ns'] = st.st_size, st.st_mtime_ns
+        return False
+
+    def reload(self):
+        self.current = (Index.load(self.csv_path), self.current[1] + 1)
+        self.reloads += 1
+        self.cache.clear()
+
+    def watch(self, interval=POLL_SECONDS, stop=None):
+        # Reload once a changed CSV has kept the same size and mtime for one
+        # interval, so a file still being written is not loaded
+        stop = stop or threading.Event()
+        pending = None
+        while not stop.wait(interval):
+            try:
+                if not os.path.exists(self.csv_path) or not self.changed():
+                    pending = None
+                    continue
+                st = os.stat(self.csv_path)
+                stamp = (st.st_size, st.st_mtime_ns)
+                if stamp != pending:
+                    pending = stamp
+                    continue
+                self.reload()
+                pending = None
+                print(f"Reloaded {self.csv_path}: {self.index.rows} rows", flush=True)
+            except Exception as error:  # keep serving the old Index
+                print(f"Reload of {self.csv_path} failed: {error}", flush=True)
+
+
+class Handler(BaseHTTPRequestHandler):
+    service = None
+    verbose = False
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        try:
+            body = self.service.answer(url.path.rstrip('/') or '/', parse_qs(url.query))
+            self._send(200, body)
+        except LookupError:
+            self._send(404, json.dumps({'error': f"unknown endpoint {url.path}"}).encode())
+        except QueryError as error:
+            self._send(400, json.dumps({'error': str(error)}).encode())
+        except Exception as error:
+            self._send(500, json.dumps({'error': f"{type(error).__name__}: {error}"}).encode())
+
+    def _send(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+
+
+def serve(csv_path, host=HOST, port=PORT, cache_size=CACHE_SIZE, poll=POLL_SECONDS, verbose=False):
+    service = QueryService(csv_path, cache_size)
+    handler = type('BoundHandler', (Handler,), {'service': service, 'verbose': verbose})
+    server = ThreadingHTTPServer((host, port), handler)
+    stop = threading.Event()
+    if poll > 0:
+        threading.Thread(target=service.watch, args=(poll, stop), name='aadhaar-reload', daemon=True).start()
+    print(f"Serving {service.index.rows} rows of {csv_path} on http://{host}:{server.server_port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve totals, top-k, time-series and coverage queries as JSON.')
+    parser.add_argument('--csv', default='cleaned_aadhar_data.csv')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE, help='answers kept in the LRU cache')
+    parser.add_argument('--poll', type=float, default=POLL_SECONDS,
+                        help='seconds between checks of the CSV for a new version (0: never reload)')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args()
+    serve(args.csv, args.host, args.port, args.cache_size, args.poll, args.verbose)
@@ -0,0 +1,133 @@
+"""Synthetic api_data_aadhar_* shards for benchmarking.
+
+Writes enrolment, demographic and biometric shards with the real column
+layout, dd-mm-yyyy dates and realistic cardinalities: 36 states, ~780
+districts and ~19,500 pincodes, with district popularity skewed. Generation
+walks one day at a time. On each day every pincode reports with a
+probability set by its district's weight, so keys are unique per dataset
+as in the real drops. The date range grows with the requested row count to
+keep that density. Small fractions of exact duplicate rows and '100000'
+placeholder rows are mixed in for clean_data.py to remove.
+
+Usage: python -m aadhaar.synthetic --rows 1000000 --out bench_data
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+SCHEMAS = {
+    'enrolment': {'age_0_5': 3.6, 'age_5_17': 3.5, 'age_18_greater': 0.1},
+    'demographic': {'demo_age_5_17': 2.2, 'demo_age_17_': 18.0},
+    'biometric': {'bio_age_5_17': 9.5, 'bio_age_17_': 11.0},
+}
+N_STATES = 36
+DISTRICTS_PER_STATE = (8, 36)
+PINCODES_PER_DISTRICT = (10, 40)
+START_DATE = pd.Timestamp('2025-03-01')
+DAILY_DENSITY = 0.35
+SHARD_ROWS = 500000
+DUPLICATE_RATE = 0.001
+PLACEHOLDER_RATE = 0.0001
+DISPERSION = 0.8
+
+
+def geography(seed=0):
+    rng = np.random.default_rng(seed)
+    states, districts, pincodes, weights = [], [], [], []
+    pincode = 110001
+    for s in range(N_STATES):
+        state = f'State {s:02d}'
+        for d in range(rng.integers(*DISTRICTS_PER_STATE)):
+            district = f'District {s:02d}-{d:02d}'
+            weight = rng.pareto(1.5) + 0.2
+            for _ in range(rng.integers(*PINCODES_PER_DISTRICT)):
+                states.append(state)
+                districts.append(district)
+                pincodes.append(pincode)
+                weights.append(weight)
+                pincode += int(rng.integers(1, 3))
+    weights = np.asarray(weights)
+    probability = np.clip(weights / weights.mean() * DAILY_DENSITY, 0, 1)
+    return pd.DataFrame({'state': states, 'district': districts, 'pincode': pincodes,
+                         'probability': probability})
+
+
+def _counts(rng, mean, size):
+    return rng.negative_binomial(DISPERSION, DISPERSION / (DISPERSION + mean), size)
+
+
+def _day_rows(rng, places, day, measures):
+    picked = places[rng.random(len(places)) < places['probability'].to_numpy()]
+    rows = picked[['state', 'district', 'pincode']].copy()
+    rows.insert(0, 'date', (START_DATE + pd.Timedelta(days=day)).strftime('%d-%m-%Y'))
+    for col, mean in measures.items():
+        rows[col] = _counts(rng, mean, len(rows))
+    return rows
+
+
+def _inject_noise(rng, chunk):
+    if chunk.empty:
+        return chunk
+    n_dup = rng.binomial(len(chunk), DUPLICATE_RATE)
+    n_placeholder = rng.binomial(len(chunk), PLACEHOLDER_RATE)
+    extra = [chunk.iloc[rng.integers(0, len(chunk), n_dup)]]
+    if n_placeholder:
+        placeholder = chunk.iloc[rng.integers(0, len(chunk), n_placeholder)].copy()
+        placeholder['district'] = '100000'
+        extra.append(placeholder)
+    return pd.concat([chunk] + extra, ignore_index=True)
+
+
+def generate_dataset(dataset, rows, out_dir, places, seed=0, shard_rows=SHARD_ROWS):
+    rng = np.random.default_rng([seed, list(SCHEMAS).index(dataset)])
+    measures = SCHEMAS[dataset]
+    paths = []
+    written = 0
+    pending = []
+    pending_rows = 0
+    day = 0
+    while written < rows:
+        day_rows = _inject_noise(rng, _day_rows(rng, places, day, measures))
+        day += 1
+        pending.append(day_rows)
+        pending_rows += len(day_rows)
+        target = min(shard_rows, rows - written)
+        if pending_rows < target:
+            continue
+        # Days that overflow the shard carry over into the next one
+        buffered = pd.concat(pending, ignore_index=True)
+        chunk, rest = buffered.iloc[:target], buffered.iloc[target:]
+        path = os.path.join(out_dir, f'api_data_aadhar_{dataset}_{written}_{written + len(chunk)}.csv')
+        chunk.to_csv(path, index=False)
+        paths.append(path)
+        written += len(chunk)
+        pending, pending_rows = [rest], len(rest)
+    return paths
+
+
+def generate(rows, out_dir, seed=0, shard_rows=SHARD_ROWS, datasets=tuple(SCHEMAS)):
+    os.makedirs(out_dir, exist_ok=True)
+    places = geography(seed)
+    shards = {dataset: generate_dataset(dataset, rows, out_dir, places, seed, shard_rows)
+              for dataset in datasets}
+    meta = {'rows': rows, 'seed': seed, 'shard_rows': shard_rows, 'states': int(places['state'].nunique()),
+            'districts': int(places['district'].nunique()), 'pincodes': len(places),
+            'shards': {dataset: [os.path.basename(p) for p in paths] for dataset, paths in shards.items()}}
+    with open(os.path.join(out_dir, 'synthetic.json'), 'w') as f:
+        json.dump(meta, f, indent=1)
+    return meta
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write synthetic api_data_aadhar_* shards.')
+    parser.add_argument('--rows', type=int, default=1000000, help='rows per dataset (e.g. 1000000, 10000000, 100000000)')
+    parser.add_argument('--out', default='bench_data')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--shard-rows', type=int, default=SHARD_ROWS)
+    args = parser.parse_args()
+    meta = generate(args.rows, args.out, args.seed, args.shard_rows)
+    print(f"Wrote {sum(len(s) for s in meta['shards'].values())} shards ({args.rows} rows per dataset, "
+          f"{meta['states']} states, {meta['districts']} districts, {meta['pincodes']} pincodes) to {args.out}")
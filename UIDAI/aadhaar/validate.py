@@ -0,0 +1,310 @@
+"""Single-pass, rule-based validation of merged and cleaned CSVs.
+
+check_merged.py and check_cleaned.py used to load the whole file and make a
+separate pass for each check. Here the CSV is streamed in chunks and every
+rule sees each chunk once, so the run is linear in the rows and memory is
+bounded by the chunk size:
+
+    key_order       (state, district, pincode) never goes backwards
+    duplicate_keys  a (date, state, district, pincode) key repeats
+    missing_values  a row has an empty cell
+    placeholders    state, district or pincode is the '100000' placeholder
+    negative_counts a count column is below zero
+    bad_dates       a date is present but not dd-mm-yyyy
+    bad_pincodes    a pincode is not a six-digit number
+    pincode_state   a pincode appears under more than one state
+
+Order is checked between neighbouring rows, carrying the last row of each
+chunk into the next. For sorted input, duplicate keys are neighbours too. If
+the file turns out not to be in full key order, validate() recounts the
+duplicates in a second pass over the key columns, keeping a 64-bit hash per
+row; DuplicateKeys(exact=True) does that in the first pass instead.
+
+Each rule counts its violations and keeps the first few 0-based row offsets
+(the CSV line is offset + 2). A new rule subclasses Rule and implements
+check(chunk, ctx).
+"""
+import abc
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from aadhaar import cleaning, dates, ingest, join
+
+CHUNK_SIZE = 250000
+MAX_EXAMPLES = 10
+# Missing strings sort last, as in sort_values and the packed key
+MISSING_TEXT = '\U0010ffff'
+
+
+class Rule(abc.ABC):
+    name = None
+    description = None
+
+    def __init__(self, severity='error', max_examples=MAX_EXAMPLES):
+        self.severity = severity
+        self.max_examples = max_examples
+        self.count = 0
+        self.examples = []
+
+    def flag(self, offsets):
+        offsets = np.asarray(offsets)
+        self.count += len(offsets)
+        room = self.max_examples - len(self.examples)
+        if room > 0:
+            self.examples.extend(int(o) for o in offsets[:room])
+
+    @abc.abstractmethod
+    def check(self, chunk, ctx):
+        pass
+
+    def finish(self):
+        pass
+
+    @property
+    def passed(self):
+        return self.count == 0
+
+    def summary(self):
+        status = 'ok' if self.passed else f"{self.count} {self.severity}{'s' if self.count > 1 else ''}"
+        line = f"  {self.name}: {status} - {self.description}"
+        if self.examples:
+            line += f" (rows {', '.join(map(str, self.examples))}{', ...' if self.count > len(self.examples) else ''})"
+        return line
+
+
+class KeyOrder(Rule):
+    name = 'key_order'
+    description = 'rows sorted by state, district, pincode'
+
+    def check(self, chunk, ctx):
+        self.flag(ctx['offsets'][ctx['location_less']])
+
+
+class DuplicateKeys(Rule):
+    name = 'duplicate_keys'
+    description = 'one row per date, state, district, pincode'
+
+    def __init__(self, exact=False, **kwargs):
+        super().__init__(**kwargs)
+        self.exact = exact
+        self.out_of_order = 0
+        self.hashes = []
+        self.rows = 0
+
+    @property
+    def lower_bound(self):
+        # Neighbour comparison misses duplicates that are not adjacent
+        return not self.exact and self.out_of_order > 0
+
+    def _hash(self, chunk):
+        self.hashes.append(pd.util.hash_pandas_object(chunk[join.KEY_COLUMNS], index=False).to_numpy())
+
+    def check(self, chunk, ctx):
+        self.rows += len(chunk)
+        if self.exact:
+            self._hash(chunk)
+            return
+        self.out_of_order += int(ctx['key_less'].sum())
+        self.flag(ctx['offsets'][ctx['key_equal']])
+
+    def recount(self, csv_path, chunksize=CHUNK_SIZE):
+        # Exact count over the key columns only, for input out of key order;
+        # the examples found by neighbour comparison are kept
+        chunks = pd.read_csv(csv_path, chunksize=chunksize, dtype={'state': str, 'district': str},
+                             usecols=lambda col: col.strip() in join.KEY_COLUMNS)
+        for chunk in ingest.prefetch(chunks):
+            chunk.columns = chunk.columns.str.strip()
+            self._hash(chunk)
+        self.count = self._duplicates()
+
+    def _duplicates(self):
+        hashes = np.concatenate(self.hashes) if self.hashes else np.empty(0, dtype=np.uint64)
+        self.hashes = []
+        return len(hashes) - len(np.unique(hashes))
+
+    def finish(self):
+        if self.exact:
+            # Exact mode counts duplicates but does not locate them
+            self.count = self._duplicates()
+
+    def summary(self):
+        line = super().summary()
+        if self.out_of_order and not self.exact:
+            line += "\n    (input is not in full key order; counted exactly in a second pass over the keys)"
+        return line
+
+
+class MissingValues(Rule):
+    name = 'missing_values'
+    description = 'no empty cells'
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.cells = 0
+
+    def check(self, chunk, ctx):
+        missing = chunk.isna()
+        self.cells += int(missing.to_numpy().sum())
+        self.flag(ctx['offsets'][missing.any(axis=1).to_numpy()])
+
+
+class Placeholders(Rule):
+    name = 'placeholders'
+    description = f"no '{cleaning.PLACEHOLDER}' placeholder rows"
+
+    def check(self, chunk, ctx):
+        self.flag(ctx['offsets'][cleaning.placeholder_mask(chunk).to_numpy()])
+
+
+class NegativeCounts(Rule):
+    name = 'negative_counts'
+    description = 'count columns are not negative'
+
+    def check(self, chunk, ctx):
+        values = chunk[ctx['value_columns']].to_numpy(dtype='float64')
+        self.flag(ctx['offsets'][(values < 0).any(axis=1)])
+
+
+class BadDates(Rule):
+    name = 'bad_dates'
+    description = 'dates parse as dd-mm-yyyy'
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.values = Counter()
+
+    def check(self, chunk, ctx):
+        bad = (ctx['days'] == dates.MISSING_DAY) & chunk['date'].notna().to_numpy()
+        self.flag(ctx['offsets'][bad])
+        if bad.any():
+            self.values.update(chunk['date'][bad].astype(str).value_counts().to_dict())
+
+    def summary(self):
+        line = super().summary()
+        if self.values:
+            line += f"\n    ({dates.invalid_summary(self.values)})"
+        return line
+
+
+class BadPincodes(Rule):
+    name = 'bad_pincodes'
+    description = 'pincodes are six-digit numbers'
+
+    def check(self, chunk, ctx):
+        pincode = pd.to_numeric(chunk['pincode'], errors='coerce')
+        bad = chunk['pincode'].notna() & ~(pincode.between(100000, 999999) & (pincode % 1 == 0))
+        self.flag(ctx['offsets'][bad.to_numpy()])
+
+
+class PincodeState(Rule):
+    name = 'pincode_state'
+    description = 'each pincode belongs to one state'
+
+    def __init__(self, severity='warning', **kwargs):
+        super().__init__(severity=severity, **kwargs)
+        # First state seen per pincode; bounded by the number of pincodes
+        self.states = {}
+
+    def check(self, chunk, ctx):
+        pairs = chunk[['pincode', 'state']].dropna()
+        for pincode, state in pairs.drop_duplicates('pincode').itertuples(index=False):
+            self.states.setdefault(pincode, state)
+        expected = pairs['pincode'].map(self.states)
+        # The chunk index holds the row offsets
+        self.flag(pairs.index[(pairs['state'] != expected).to_numpy()].to_numpy())
+
+
+def merged_rules(exact_duplicates=False):
+    # merge_csv.py output: placeholders are expected until clean_data.py runs
+    return [KeyOrder(), DuplicateKeys(exact=exact_duplicates), MissingValues(), Placeholders(severity='warning'),
+            NegativeCounts(), BadDates(), BadPincodes(severity='warning'), PincodeState()]
+
+
+def cleaned_rules(exact_duplicates=False):
+    return [KeyOrder(), DuplicateKeys(exact=exact_duplicates), MissingValues(), Placeholders(),
+            NegativeCounts(), BadDates(), BadPincodes(), PincodeState()]
+
+
+def _sort_columns(chunk, days):
+    state = chunk['state'].fillna(MISSING_TEXT).to_numpy(dtype=object)
+    district = chunk['district'].fillna(MISSING_TEXT).to_numpy(dtype=object)
+    pincode = pd.to_numeric(chunk['pincode'], errors='coerce').fillna(np.inf).to_numpy(dtype='float64')
+    day = np.where(days == dates.MISSING_DAY, np.iinfo(np.int64).max, days.astype(np.int64))
+    return [state, district, pincode, day]
+
+
+def _compare(prev, current):
+    # For every row: is its key below / equal to the row before it, over the
+    # location columns and over the full key. prev holds the last row of the
+    # previous chunk (or nothing for the first chunk).
+    columns = [np.concatenate([p, c]) for p, c in zip(prev, current)] if prev else current
+    start = 1 if prev else 0
+    n = len(columns[0]) - 1
+    less = np.zeros(n, dtype=bool)
+    equal = np.ones(n, dtype=bool)
+    location_less = None
+    for i, col in enumerate(columns):
+        later, earlier = col[1:], col[:-1]
+        less |= equal & (later < earlier)
+        equal &= later == earlier
+        if i == 2:
+            location_less = less.copy()
+    # The first row of the first chunk has no predecessor
+    pad = [np.zeros(1 - start, dtype=bool)]
+    return (np.concatenate(pad + [location_less]), np.concatenate(pad + [less]),
+            np.concatenate(pad + [equal]))
+
+
+class Report:
+    def __init__(self, path, rows, columns, head, rules):
+        self.path = path
+        self.rows = rows
+        self.columns = columns
+        self.head = head
+        self.rules = {rule.name: rule for rule in rules}
+
+    @property
+    def errors(self):
+        return [rule for rule in self.rules.values() if rule.severity == 'error' and not rule.passed]
+
+    def text(self):
+        lines = [f"Validation of {self.path} ({self.rows} rows):"]
+        lines += [rule.summary() for rule in self.rules.values()]
+        lines.append(f"Result: {'FAILED' if self.errors else 'passed'}")
+        return '\n'.join(lines)
+
+
+def validate(csv_path, rules, chunksize=CHUNK_SIZE):
+    rows, columns, head = 0, None, None
+    prev = None
+    chunks = pd.read_csv(csv_path, chunksize=chunksize, dtype={'state': str, 'district': str})
+    for chunk in ingest.prefetch(chunks):
+        chunk.columns = chunk.columns.str.strip()
+        chunk.index = pd.RangeIndex(rows, rows + len(chunk))
+        if columns is None:
+            columns = list(chunk.columns)
+            head = chunk.head(10)
+        if chunk.empty:
+            continue
+        days = dates.parse_days(chunk['date'])
+        current = _sort_columns(chunk, days)
+        location_less, key_less, key_equal = _compare(prev, current)
+        ctx = {
+            'offsets': chunk.index.to_numpy(),
+            'days': days,
+            'value_columns': [col for col in columns if col not in join.KEY_COLUMNS],
+            'location_less': location_less,
+            'key_less': key_less,
+            'key_equal': key_equal,
+        }
+        for rule in rules:
+            rule.check(chunk, ctx)
+        prev = [col[-1:] for col in current]
+        rows += len(chunk)
+    for rule in rules:
+        rule.finish()
+        if isinstance(rule, DuplicateKeys) and rule.lower_bound:
+            rule.recount(csv_path, chunksize)
+    return Report(csv_path, rows, columns or [], head, rules)
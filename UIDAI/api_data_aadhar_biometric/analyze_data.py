@@ -1,5 +1,10 @@
-import pandas as pd
+import argparse
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from aadhaar import metrics, profiler, sketch
 
 # List of CSV files to analyze
 files = [
@@ -9,76 +14,34 @@ files = [
     'api_data_aadhar_biometric_1500000_1861108.csv'
 ]
 
-def analyze_file(file_path):
-    if not os.path.exists(file_path):
-        return f"File {file_path} not found."
-
-    df = pd.read_csv(file_path)
-
-    report = f"Dataset Analysis Report for {file_path}\n"
-    report += "=" * 60 + "\n\n"
-
-    # Dataset Shape
-    report += f"Dataset Shape: {df.shape}\n\n"
-
-    # First 10 Rows
-    report += "First 10 Rows:\n"
-    report += str(df.head(10)) + "\n\n"
-
-    # Data Types
-    report += "Data Types:\n"
-    report += str(df.dtypes) + "\n\n"
-
-    # Missing Values
-    report += "Missing Values per Column:\n"
-    report += str(df.isnull().sum()) + "\n\n"
-
-    # Unique values for categorical columns
-    if 'state' in df.columns:
-        report += f"Unique States: {df['state'].nunique()}\n"
-    if 'district' in df.columns:
-        report += f"Unique Districts: {df['district'].nunique()}\n"
-    if 'pincode' in df.columns:
-        report += f"Unique Pincodes: {df['pincode'].nunique()}\n\n"
-
-    # Totals for bio_age columns
-    if 'bio_age_5_17' in df.columns:
-        report += f"Total Bio Age 5-17: {df['bio_age_5_17'].sum()}\n"
-    if 'bio_age_17_' in df.columns:
-        report += f"Total Bio Age 17+: {df['bio_age_17_'].sum()}\n\n"
-
-    # Summary Statistics for Numeric Columns
-    report += "Summary Statistics for Numeric Columns:\n"
-    report += str(df.describe()) + "\n\n"
-
-    # Additional insights
-    numeric_cols = df.select_dtypes(include=['number']).columns
-    if len(numeric_cols) > 0:
-        report += "Additional Insights:\n"
-        for col in numeric_cols:
-            report += f"{col} - Min: {df[col].min()}, Max: {df[col].max()}, Mean: {df[col].mean():.2f}\n"
-        report += "\n"
-
-    # Check for duplicates
-    duplicates = df.duplicated().sum()
-    report += f"Number of Duplicate Rows: {duplicates}\n\n"
-
-    # Date column analysis if exists
-    if 'date' in df.columns:
-        df['date'] = pd.to_datetime(df['date'], errors='coerce')
-        report += "Date Range:\n"
-        report += f"Earliest Date: {df['date'].min()}\n"
-        report += f"Latest Date: {df['date'].max()}\n"
-        report += f"Number of Unique Dates: {df['date'].nunique()}\n\n"
-
-    return report
-
-# Analyze all files
-for file in files:
-    report_content = analyze_file(file)
-    report_filename = f"analysis_report_{file.replace('.csv', '')}.txt"
-    with open(report_filename, 'w') as f:
-        f.write(report_content)
-    print(f"Analysis for {file} completed. Results saved to '{report_filename}'")
+TOTALS = [
+    ('bio_age_5_17', 'Total Bio Age 5-17'),
+    ('bio_age_17_', 'Total Bio Age 17+')
+]
 
-print("All analyses completed.")
+def analyze_file(file_path):
+    # Streams the shard in chunks; see aadhaar/profiler.py
+    return profiler.analyze_file(file_path, totals=TOTALS)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Profile the biometric shards.')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes (default: one per CPU, 1 = all shards in this process)')
+    parser.add_argument('--readers', type=int, default=None,
+                        help='shards read at once with --workers 1 (default: AADHAAR_READERS or min(4, CPUs))')
+    parser.add_argument('--duplicates', choices=['sorted', 'bloom'], default=None,
+                        help='also locate duplicate rows across shards (bloom: two passes, less memory)')
+    parser.add_argument('--sketch-error', type=float, default=None,
+                        help=f'relative error of the distinct-count sketches (default {sketch.ERROR:.4f})')
+    parser.add_argument('--exact-duplicates', action='store_true',
+                        help='count duplicate rows exactly, keeping a hash of every distinct row (12 bytes each); '
+                             f'by default the count is estimated past {profiler.SAMPLE_CAPACITY} distinct rows')
+    args = parser.parse_args()
+    metrics.begin('profile_biometric')
+
+    # Per-shard reports plus analysis_report_api_data_aadhar_biometric_all.txt for the whole dataset
+    profiler.write_reports(files, TOTALS, dataset='api_data_aadhar_biometric', workers=args.workers,
+                           duplicate_mode=args.duplicates, sketch_error=args.sketch_error,
+                           readers=args.readers, exact_duplicates=args.exact_duplicates)
+
+    print("All analyses completed.")
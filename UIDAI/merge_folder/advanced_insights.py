@@ -1,30 +1,28 @@
-import pandas as pd
-import numpy as np
+import os
+import sys
 
-# Read the cleaned CSV
-df = pd.read_csv('cleaned_aadhar_data.csv')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
-# Clean column names
-df.columns = df.columns.str.strip()
+from aadhaar import metrics
+from aadhaar.anomaly import MIN_COUNT, THRESHOLDS, WINDOW, SeriesIndex
+from aadhaar.cube import Cube
 
-# Fill NaN with 0
-df = df.fillna(0)
+metrics.begin('advanced_insights')
 
-# Convert date to datetime
-df['date'] = pd.to_datetime(df['date'], format='%d-%m-%Y', errors='coerce')
+# Load the rollup cube built by clean_data.py (rebuilt if cleaned_aadhar_data.csv changed)
+cube = Cube.load_or_build('cleaned_aadhar_data.csv')
 
-# Calculate totals
-df['total_enrolment'] = df['age_0_5'] + df['age_5_17'] + df['age_18_greater']
-df['total_demo_population'] = df['demo_age_5_17'] + df['demo_age_17_']
-df['total_bio_updates'] = df['bio_age_5_17'] + df['bio_age_17_']
+# Overall, state, (state, district) and monthly sums in a single pass, like SQL GROUPING SETS
+grouping_sets = cube.grouping_sets([(), ('state',), ('state', 'district'), ('month',)])
+totals = grouping_sets[()]
 
 print("=== ADVANCED INSIGHTS FROM AADHAAR DATA ===\n")
 
 # 1. Overall Statistics
 print("1. OVERALL STATISTICS:")
-total_enrolment = df['total_enrolment'].sum()
-total_population = df['total_demo_population'].sum()
-total_bio_updates = df['total_bio_updates'].sum()
+total_enrolment = totals[['age_0_5', 'age_5_17', 'age_18_greater']].sum()
+total_population = totals[['demo_age_5_17', 'demo_age_17_']].sum()
+total_bio_updates = totals[['bio_age_5_17', 'bio_age_17_']].sum()
 coverage_rate = (total_enrolment / total_population * 100) if total_population > 0 else 0
 bio_update_rate = (total_bio_updates / total_enrolment * 100) if total_enrolment > 0 else 0
 
@@ -36,11 +34,7 @@ print(f"Overall Biometric Update Rate: {bio_update_rate:.2f}%\n")
 
 # 2. State-wise Analysis
 print("2. STATE-WISE ANALYSIS:")
-state_stats = df.groupby('state').agg({
-    'total_enrolment': 'sum',
-    'total_demo_population': 'sum',
-    'total_bio_updates': 'sum'
-}).reset_index()
+state_stats = grouping_sets[('state',)][['state', 'total_enrolment', 'total_demo_population', 'total_bio_updates']]
 
 state_stats['coverage_rate'] = (state_stats['total_enrolment'] / state_stats['total_demo_population'] * 100).fillna(0)
 state_stats['bio_update_rate'] = (state_stats['total_bio_updates'] / state_stats['total_enrolment'] * 100).fillna(0)
@@ -74,11 +68,11 @@ age_groups = {
     '17+': 'age_18_greater'
 }
 
-age_enrolment = df[list(age_groups.values())].sum()
+age_enrolment = totals[list(age_groups.values())]
 age_bio = {
     '0-5': 0,  # No biometric data for 0-5
-    '5-17': df['bio_age_5_17'].sum(),
-    '17+': df['bio_age_17_'].sum()
+    '5-17': totals['bio_age_5_17'],
+    '17+': totals['bio_age_17_']
 }
 
 print("Enrolment by Age Group:")
@@ -88,7 +82,7 @@ for age, col in age_groups.items():
 
 print("\nBiometric Update Rates by Age Group:")
 for age in ['5-17', '17+']:
-    enrolment = age_enrolment[age_groups[17+]]
+    enrolment = age_enrolment[age_groups[age]]
     bio = age_bio[age]
     rate = (bio / enrolment * 100) if enrolment > 0 else 0
     print(f"  {age}: {rate:.2f}% ({bio:,.0f}/{enrolment:,.0f})")
@@ -111,13 +105,10 @@ print()
 
 # 4. Time Trends
 print("4. TIME TRENDS:")
-if df['date'].notna().any():
-    time_trends = df.groupby(df['date'].dt.to_period('M')).agg({
-        'total_enrolment': 'sum',
-        'total_bio_updates': 'sum'
-    }).reset_index()
+if cube.has_dates():
+    time_trends = grouping_sets[('month',)][['month', 'total_enrolment', 'total_bio_updates']]
 
-    time_trends['date'] = time_trends['date'].dt.to_timestamp()
+    time_trends['date'] = time_trends['month'].dt.to_timestamp()
     time_trends = time_trends.sort_values('date')
 
     print("Monthly Enrolment Trends:")
@@ -136,15 +127,28 @@ if df['date'].notna().any():
             change = row['enrolment_change']
             print(f"  {month}: {change:+.1f}% change")
 
+    # The same checks for every district at once, monthly and day by day; see aadhaar/anomaly.py
+    series = SeriesIndex.from_cube(cube)
+    district_months = series.detect('pct_change', 'enrolment', freq='month')
+    district_days = series.detect('mad', 'enrolment')
+    if not district_months.empty:
+        print(f"\nAnomalous District-Months (>{THRESHOLDS['pct_change']:.0f}% change, "
+              f"at least {MIN_COUNT} enrolments): {len(district_months)}")
+        for _, row in district_months.head(5).iterrows():
+            print(f"  {row['district']}, {row['state']} {row['period'].strftime('%b %Y')}: "
+                  f"{row['score']:+.1f}% ({row['baseline']:,.0f} -> {row['value']:,.0f})")
+    if not district_days.empty:
+        print(f"\nAnomalous District-Days (robust z > {THRESHOLDS['mad']} over the previous {WINDOW} days): "
+              f"{len(district_days)}")
+        for _, row in district_days.head(5).iterrows():
+            print(f"  {row['district']}, {row['state']} {row['period'].strftime('%d %b %Y')}: "
+                  f"{row['value']:,.0f} enrolments (median {row['baseline']:,.0f})")
+
 print()
 
 # 5. District-level Anomalies
 print("5. DISTRICT-LEVEL ANOMALIES:")
-district_stats = df.groupby(['state', 'district']).agg({
-    'total_enrolment': 'sum',
-    'total_demo_population': 'sum',
-    'total_bio_updates': 'sum'
-}).reset_index()
+district_stats = grouping_sets[('state', 'district')][['state', 'district', 'total_enrolment', 'total_demo_population', 'total_bio_updates']]
 
 district_stats['coverage_rate'] = (district_stats['total_enrolment'] / district_stats['total_demo_population'] * 100).fillna(0)
 district_stats['bio_update_rate'] = (district_stats['total_bio_updates'] / district_stats['total_enrolment'] * 100).fillna(0)
@@ -170,7 +174,7 @@ print()
 # 6. Correlation Analysis
 print("6. CORRELATION ANALYSIS:")
 correlation_cols = ['age_0_5', 'age_5_17', 'age_18_greater', 'demo_age_5_17', 'demo_age_17_', 'bio_age_5_17', 'bio_age_17_']
-corr_matrix = df[correlation_cols].corr()
+corr_matrix = cube.correlation().loc[correlation_cols, correlation_cols]
 
 print("Key Correlations:")
 # Enrolment vs Demographics
@@ -213,10 +217,11 @@ print("- Enhance inclusion of children and marginalized groups")
 # Save detailed report
 with open('detailed_insights_report.txt', 'w') as f:
     f.write("DETAILED INSIGHTS REPORT FROM AADHAAR DATA ANALYSIS\n\n")
-    f.write(f"Total Records: {len(df)}\n")
-    f.write(f"Date Range: {df['date'].min()} to {df['date'].max()}\n")
-    f.write(f"States Covered: {df['state'].nunique()}\n")
-    f.write(f"Districts Covered: {df['district'].nunique()}\n\n")
+    first_date, last_date = cube.date_range()
+    f.write(f"Total Records: {cube.record_count}\n")
+    f.write(f"Date Range: {first_date} to {last_date}\n")
+    f.write(f"States Covered: {cube.nunique('state')}\n")
+    f.write(f"Districts Covered: {cube.nunique('district')}\n\n")
     f.write("KEY FINDINGS:\n")
     f.write(f"- Overall Coverage: {coverage_rate:.2f}%\n")
     f.write(f"- Biometric Update Rate: {bio_update_rate:.2f}%\n")
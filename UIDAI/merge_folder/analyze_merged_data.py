@@ -1,46 +1,36 @@
-import pandas as pd
-
-# Read the cleaned CSV
-df = pd.read_csv('cleaned_aadhar_data.csv')
+import os
+import sys
 
-# Clean column names if needed (remove trailing spaces)
-df.columns = df.columns.str.strip()
+import pandas as pd
 
-# Fill NaN with 0 for calculations
-df = df.fillna(0)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
-# Calculate total enrolment per row
-df['total_enrolment'] = df['age_0_5'] + df['age_5_17'] + df['age_18_greater']
+from aadhaar import metrics
+from aadhaar.cube import Cube
+from aadhaar.ranking import Ranking
 
-# Calculate total demographic population per row (assuming demo_age_17_ is demo_age_17_19)
-df['total_demo_population'] = df['demo_age_5_17'] + df['demo_age_17_']
+metrics.begin('analyze_merged_data')
 
-# Calculate total biometric updates per row
-df['total_bio_updates'] = df['bio_age_5_17'] + df['bio_age_17_']
+# Load the rollup cube built by clean_data.py (rebuilt if cleaned_aadhar_data.csv changed)
+cube = Cube.load_or_build('cleaned_aadhar_data.csv')
 
 # Analysis 1: High enrolment areas vs population
-# Group by state and district, sum totals
-grouped = df.groupby(['state', 'district']).agg({
-    'total_enrolment': 'sum',
-    'total_demo_population': 'sum'
-}).reset_index()
-
-# Filter out areas with zero population to avoid inf
-grouped = grouped[grouped['total_demo_population'] > 0]
-
-# Calculate enrolment rate (enrolment / population * 100)
-grouped['enrolment_rate'] = (grouped['total_enrolment'] / grouped['total_demo_population'] * 100)
+# Sum totals per state and district; see aadhaar/ranking.py
+grouped = Ranking(['state', 'district']).update(cube.cells)
 
-# Sort by enrolment rate descending
-high_enrolment_areas = grouped.sort_values('enrolment_rate', ascending=False).head(10)
+# Top 10 by enrolment rate (enrolment / population * 100), leaving out areas
+# with zero population to avoid inf
+high_enrolment_areas = grouped.top('coverage_rate', 10, nonzero='total_demo_population')
+high_enrolment_areas = high_enrolment_areas.rename(columns={'coverage_rate': 'enrolment_rate'})
 
 print("Top 10 High Enrolment Areas vs Population (filtered for population > 0):")
 print(high_enrolment_areas[['state', 'district', 'total_enrolment', 'total_demo_population', 'enrolment_rate']])
 
 # Analysis 2: Age group distribution vs biometric updates
 # Group by age groups (simplified: 0-5, 5-17, 18+)
-age_group_enrolment = df[['age_0_5', 'age_5_17', 'age_18_greater']].sum()
-age_group_bio = df[['bio_age_5_17', 'bio_age_17_']].sum()
+totals = cube.totals()
+age_group_enrolment = totals[['age_0_5', 'age_5_17', 'age_18_greater']]
+age_group_bio = totals[['bio_age_5_17', 'bio_age_17_']]
 
 # Assuming bio_age_5_17 corresponds to 5-17, bio_age_17_ to 18+
 # But enrolment has 0-5, 5-17, 18+, bio has 5-17, 17+
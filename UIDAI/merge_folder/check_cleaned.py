@@ -1,22 +1,42 @@
-import pandas as pd
+import argparse
+import os
+import sys
 
-# Load the cleaned CSV
-df = pd.read_csv('cleaned_aadhar_data.csv')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
-print(f"Cleaned CSV Shape: {df.shape}")
+from aadhaar import metrics, validate
+
+parser = argparse.ArgumentParser(description='Validate cleaned_aadhar_data.csv in one streaming pass.',
+                                 epilog='Exits with status 1 when an error-level rule fails; '
+                                        'warnings leave the status at 0.')
+parser.add_argument('--exact-duplicates', action='store_true',
+                    help='hash every key in the first pass rather than re-reading an unsorted file (8 bytes per row)')
+args = parser.parse_args()
+
+metrics.begin('check_cleaned')
+
+# Stream the cleaned CSV once through every rule in aadhaar/validate.py: key
+# order, duplicate keys, NaNs, placeholders, negative counts, dates, pincodes
+with metrics.span('validate') as s:
+    report = validate.validate('cleaned_aadhar_data.csv', validate.cleaned_rules(args.exact_duplicates))
+    s.rows_in = report.rows
+
+print(f"Cleaned CSV Shape: {(report.rows, len(report.columns))}")
 print("First 10 rows (state, district, pincode):")
-print(df[['state', 'district', 'pincode']].head(10))
+print(report.head[['state', 'district', 'pincode']])
+
 print("Duplicates check:")
-duplicates = df.duplicated(subset=['date', 'state', 'district', 'pincode']).sum()
-print(f"Duplicates: {duplicates}")
+print(f"Duplicates: {report.rules['duplicate_keys'].count}")
 
-# Check if sorted by state, district, pincode
-is_sorted = df[['state', 'district', 'pincode']].equals(df[['state', 'district', 'pincode']].sort_values(by=['state', 'district', 'pincode']))
-print(f"Is sorted by state, district, pincode: {is_sorted}")
+print(f"Is sorted by state, district, pincode: {report.rules['key_order'].passed}")
 
-# Check for NaN values
-nan_count = df.isnull().sum().sum()
-print(f"Total NaN values: {nan_count}")
+print(f"Total NaN values: {report.rules['missing_values'].cells}")
 
 print("Column names:")
-print(df.columns.tolist())
+print(report.columns)
+
+print()
+print(report.text())
+
+# Non-zero exit when an error-level rule fails (warnings do not count)
+sys.exit(1 if report.errors else 0)
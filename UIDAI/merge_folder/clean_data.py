@@ -1,25 +1,59 @@
-import pandas as pd
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from aadhaar import cleaning, dedup, metrics, schema
+from aadhaar.cube import Cube
+from aadhaar.partitioned import STORE_DIR, PartitionedStore
+
+parser = argparse.ArgumentParser(description='Deduplicate merged_aadhar_data.csv and drop placeholder rows.')
+parser.add_argument('--out-of-core', action='store_true',
+                    help='stream the merged CSV through hash-partitioned spill buckets instead of loading it')
+parser.add_argument('--memory-mb', type=int, default=dedup.MEMORY_MB,
+                    help='memory budget for one dedup bucket in --out-of-core mode')
+parser.add_argument('--workers', type=int, default=None,
+                    help='processes deduplicating buckets in --out-of-core mode (default: one per CPU)')
+parser.add_argument('--spill-dir', default=None, help='where to put bucket spill files (default: system temp)')
+args = parser.parse_args()
+
+metrics.begin('clean_data')
+
+if args.out_of_core:
+    # Same output as below without holding the merged data in memory; see aadhaar/dedup.py
+    rows, columns, cleaned_rows = dedup.clean_csv('merged_aadhar_data.csv', 'cleaned_aadhar_data.csv',
+                                                  memory_mb=args.memory_mb, workers=args.workers,
+                                                  spill_dir=args.spill_dir)
+    original_shape, cleaned_shape = (rows, len(columns)), (cleaned_rows, len(columns))
+else:
+    # Read the merged CSV with the narrow dtypes of aadhaar/schema.py
+    with metrics.span('read_csv') as s:
+        df = schema.load('merged_aadhar_data.csv')
+        s.rows_out = len(df)
+
+    # Strip the column names, remove duplicates on date, state, district, pincode
+    # (keeping the first occurrence) and drop rows where state, district or
+    # pincode is the '100000' placeholder; see aadhaar/cleaning.py
+    with metrics.span('drop_duplicates', rows_in=len(df)) as s:
+        df_cleaned = cleaning.clean(df)
+        s.rows_out = len(df_cleaned)
+
+    # Save the cleaned dataframe to a new CSV
+    with metrics.span('to_csv', rows_in=len(df_cleaned)):
+        schema.to_csv(df_cleaned, 'cleaned_aadhar_data.csv')
+    original_shape, cleaned_shape = df.shape, df_cleaned.shape
+
+print(f"Original data shape: {original_shape}")
+print(f"Cleaned data shape: {cleaned_shape}")
+print(f"Removed {original_shape[0] - cleaned_shape[0]} duplicate rows and invalid entries")
 
-# Read the merged CSV
-df = pd.read_csv('merged_aadhar_data.csv')
-
-print(f"Original data shape: {df.shape}")
-
-# Clean column names (remove trailing spaces)
-df.columns = df.columns.str.strip()
-
-# Remove duplicates based on key columns: date, state, district, pincode
-# Keep the first occurrence
-key_columns = ['date', 'state', 'district', 'pincode']
-df_cleaned = df.drop_duplicates(subset=key_columns, keep='first')
-
-# Filter out invalid rows where state, district, or pincode are '100000' (placeholder data)
-df_cleaned = df_cleaned[~((df_cleaned['state'] == '100000') | (df_cleaned['district'] == '100000') | (df_cleaned['pincode'] == 100000))]
-
-print(f"Cleaned data shape: {df_cleaned.shape}")
-print(f"Removed {df.shape[0] - df_cleaned.shape[0]} duplicate rows and invalid entries")
+print("Cleaned CSV created successfully: cleaned_aadhar_data.csv")
 
-# Save the cleaned dataframe to a new CSV
-df_cleaned.to_csv('cleaned_aadhar_data.csv', index=False)
+# Build the rollup cube that the analysis and visualization scripts read
+Cube.build('cleaned_aadhar_data.csv').save()
+print("Rollup cube created successfully: aadhar_cube.pkl")
 
-print("Cleaned CSV created successfully: cleaned_aadhar_data.csv")
+# Month x state partitions for date-range and region queries; see aadhaar/partitioned.py
+PartitionedStore.build('cleaned_aadhar_data.csv')
+print(f"Partitioned store created successfully: {STORE_DIR}")
@@ -1,36 +1,33 @@
-import pandas as pd
+import os
+import sys
 
-# Read the cleaned CSV
-df = pd.read_csv('cleaned_aadhar_data.csv')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
-# Clean column names
-df.columns = df.columns.str.strip()
+from aadhaar import metrics
+from aadhaar.cube import Cube
+from aadhaar.ranking import Ranking
 
-# Fill NaN with 0
-df = df.fillna(0)
+metrics.begin('extract_insights')
 
-# Calculate total enrolment per row
-df['total_enrolment'] = df['age_0_5'] + df['age_5_17'] + df['age_18_greater']
+# Load the rollup cube built by clean_data.py (rebuilt if cleaned_aadhar_data.csv changed)
+cube = Cube.load_or_build('cleaned_aadhar_data.csv')
 
-# Calculate total biometric updates per row
-df['total_biometric'] = df['bio_age_5_17'] + df['bio_age_17_']
-
-# Group by district for enrolment insights
-district_enrolment = df.groupby('district')['total_enrolment'].sum().reset_index()
+# Enrolment per district, summed from the cube cells and ranked with a bounded heap; see aadhaar/ranking.py
+district_enrolment = Ranking(['district']).update(cube.cells)
 
 # Top 5 districts with highest enrolment
-top_districts = district_enrolment[district_enrolment['total_enrolment'] > 0].nlargest(5, 'total_enrolment')
+top_districts = district_enrolment.top('total_enrolment', 5, nonzero=True)
 
 # Bottom 5 districts with lowest enrolment (excluding zero)
-bottom_districts = district_enrolment[district_enrolment['total_enrolment'] > 0].nsmallest(5, 'total_enrolment')
+bottom_districts = district_enrolment.bottom('total_enrolment', 5, nonzero=True)
 
 # Age group with most updates
 age_columns = ['age_0_5', 'age_5_17', 'age_18_greater', 'demo_age_5_17', 'demo_age_17_', 'bio_age_5_17', 'bio_age_17_']
-age_totals = df[age_columns].sum()
+age_totals = cube.totals()[age_columns]
 most_updated_age = age_totals.idxmax()
 
 # States with missing biometric data
-state_biometric = df.groupby('state')['total_biometric'].sum().reset_index()
+state_biometric = cube.by(['state']).rename(columns={'total_bio_updates': 'total_biometric'})[['state', 'total_biometric']]
 missing_biometric_states = state_biometric[state_biometric['total_biometric'] == 0]['state'].tolist()
 
 # Print insights
@@ -1,32 +1,81 @@
-import pandas as pd
+import argparse
+import os
+import sys
 
-# Read the CSV files
-enrolment_df = pd.read_csv('api_data_aadhar_enrolment_500000_1000000.csv')
-demographic_df = pd.read_csv('api_data_aadhar_demographic_500000_1000000.csv')
-biometric_df = pd.read_csv('api_data_aadhar_biometric_1000000_1500000.csv')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
-# Merge enrolment with demographic on common columns
-merged_df = pd.merge(enrolment_df, demographic_df, on=['date', 'state', 'district', 'pincode'], how='outer')
+from aadhaar import columnar, dates, incremental, ingest, join, metrics, schema
+from aadhaar.cube import CUBE_FILE
+from aadhaar.partitioned import STORE_DIR
 
-# Merge the result with biometric on common columns
-merged_df = pd.merge(merged_df, biometric_df, on=['date', 'state', 'district', 'pincode'], how='outer')
+OUTPUT = 'merged_aadhar_data.csv'
+CLEANED_OUTPUT = 'cleaned_aadhar_data.csv'
 
-# Clean the merged data
-# Clean column names (remove trailing spaces)
-merged_df.columns = merged_df.columns.str.strip()
+parser = argparse.ArgumentParser(description='Merge enrolment, demographic and biometric shards.')
+parser.add_argument('--all-shards', action='store_true',
+                    help='join every api_data_aadhar_* shard in --data-dir out of core')
+parser.add_argument('--data-dir', default='.')
+parser.add_argument('--memory-mb', type=int, default=join.MEMORY_MB,
+                    help='memory budget for the join (for one join partition in --all-shards mode)')
+parser.add_argument('--spill-dir', default=None, help='where to put partition spill files (default: system temp)')
+parser.add_argument('--aggregate', action='store_true',
+                    help='sum each source to one row per key before joining instead of dropping duplicates')
+parser.add_argument('--incremental', metavar='STORE_DIR',
+                    help='fold shards from --data-dir that are not merged yet into the store (implies --aggregate)')
+parser.add_argument('--export', action='store_true',
+                    help=f'with --incremental, also write {OUTPUT} and {CLEANED_OUTPUT} from the store '
+                         f'and publish its rollup cube and partitioned store for them')
+args = parser.parse_args()
+metrics.begin('merge_csv')
 
-# Remove duplicates based on key columns: date, state, district, pincode
-# Keep the first occurrence
-key_columns = ['date', 'state', 'district', 'pincode']
-merged_df = merged_df.drop_duplicates(subset=key_columns, keep='first')
+if args.incremental:
+    manifest, added = incremental.update_store(args.incremental, join.discover_shards(args.data_dir))
+    for dataset, path in added:
+        entry = manifest['shards'][os.path.basename(path)]
+        print(f"Merged {dataset} shard {path} ({entry['first_date']} to {entry['last_date']})")
+    print(f"Store {args.incremental}: {len(manifest['shards'])} shards, {len(manifest['dates'])} days")
+    if args.export:
+        print(f"Exported {len(incremental.export_csv(args.incremental, 'merged', OUTPUT))} rows to {OUTPUT}")
+        cleaned = incremental.export_csv(args.incremental, 'cleaned', CLEANED_OUTPUT)
+        print(f"Exported {len(cleaned)} rows to {CLEANED_OUTPUT}")
+        # The aggregates the insight scripts read, kept current by update_store
+        incremental.publish(args.incremental, CLEANED_OUTPUT)
+        print(f"Rollup cube and partitioned store published: {CUBE_FILE}, {STORE_DIR}")
+    sys.exit(0)
 
-# Sort by state, district, pincode for neat order
-merged_df = merged_df.sort_values(by=['state', 'district', 'pincode'])
+if args.all_shards:
+    shards = join.discover_shards(args.data_dir)
+    diagnostics = join.JoinDiagnostics(join.DATASETS)
+    try:
+        rows = join.sort_merge_join(shards, OUTPUT, memory_mb=args.memory_mb, spill_dir=args.spill_dir,
+                                    aggregate=args.aggregate, diagnostics=diagnostics)
+    except join.JoinTooLarge as error:
+        print(diagnostics.report())
+        sys.exit(f"Join aborted: {error}")
+    print(f"Joined {sum(len(paths) for paths in shards.values())} shards into {rows} rows")
+    print(diagnostics.report())
+else:
+    # Load the shards through the columnar cache (parsed from CSV on first use only)
+    with metrics.span('read_csv') as s:
+        frames = schema.align_categories(ingest.map_shards(columnar.load_shard, join.SELECTED_SHARDS))
+        s.rows_out = sum(len(df) for df in frames)
 
-# Fill NaN values with 0 for neatness (assuming missing data means 0 enrolments/updates)
-merged_df = merged_df.fillna(0)
+    # Expected join size from the key multiplicities, shown before the join
+    # is allocated so a many-to-many blow-up is reported rather than run
+    diagnostics = join.plan_join(frames)
+    print(diagnostics.plan_report(), end='', flush=True)
+    try:
+        diagnostics.check(join.budget_rows(args.memory_mb), args.aggregate)
+    except join.JoinTooLarge as error:
+        sys.exit(f"Join aborted: {error}")
 
-# Save the cleaned, sorted, and filled merged dataframe to a new CSV
-merged_df.to_csv('merged_aadhar_data.csv', index=False)
+    # Outer join on date, state, district, pincode; keep the first row per key,
+    # sort by state, district, pincode and fill missing counts with 0
+    merged_df = join.merge_frames(frames, aggregate=args.aggregate, diagnostics=diagnostics)
 
-print("Cleaned and sorted merged CSV created successfully: merged_aadhar_data.csv")
+    # Save the cleaned, sorted, and filled merged dataframe to a new CSV
+    with metrics.span('to_csv', rows_in=len(merged_df)):
+        merged_df.to_csv(OUTPUT, index=False, date_format=dates.DATE_FORMAT)
+    print(diagnostics.actual_report())
+
+print(f"Cleaned and sorted merged CSV created successfully: {OUTPUT}")
@@ -0,0 +1,41 @@
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from aadhaar import join, pipeline
+
+parser = argparse.ArgumentParser(
+    description='Run merge_csv.py, clean_data.py and the check and insight scripts as one pipeline, '
+                'skipping stages whose inputs and code are unchanged.')
+parser.add_argument('--all-shards', action='store_true',
+                    help='join every api_data_aadhar_* shard in --data-dir out of core')
+parser.add_argument('--data-dir', default='.')
+parser.add_argument('--memory-mb', type=int, default=join.MEMORY_MB,
+                    help='memory budget for the join (for one join partition in --all-shards mode)')
+parser.add_argument('--spill-dir', default=None, help='where to put partition spill files (default: system temp)')
+parser.add_argument('--aggregate', action='store_true',
+                    help='sum each source to one row per key before joining instead of dropping duplicates')
+parser.add_argument('--workers', type=int, default=None,
+                    help='processes for the check and insight scripts (default: one per CPU)')
+parser.add_argument('--force', nargs='*', metavar='STAGE', default=None,
+                    help='re-run these stages (all of them if none are named) even when unchanged')
+args = parser.parse_args()
+
+if args.all_shards:
+    shards = join.discover_shards(args.data_dir)
+else:
+    shards = [os.path.join(args.data_dir, name) for name in join.SELECTED_SHARDS]
+
+stages = pipeline.build_stages(shards, all_shards=args.all_shards, aggregate=args.aggregate,
+                               memory_mb=args.memory_mb, spill_dir=args.spill_dir)
+runner = pipeline.Pipeline(stages)
+if args.force is None:
+    force = ()
+else:
+    force = args.force or [stage.name for stage in stages]
+status = runner.run(force=force, workers=args.workers)
+
+print("Pipeline summary: " + ", ".join(f"{name} {state}" for name, state in status.items()))
+sys.exit(1 if any(state in ('failed', 'blocked') for state in status.values()) else 0)
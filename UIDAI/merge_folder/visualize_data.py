@@ -1,68 +1,46 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-
-# Read the cleaned CSV
-df = pd.read_csv('cleaned_aadhar_data.csv')
-
-# Clean column names
-df.columns = df.columns.str.strip()
-
-# Fill NaN with 0
-df = df.fillna(0)
-
-# Calculate total enrolment per row
-df['total_enrolment'] = df['age_0_5'] + df['age_5_17'] + df['age_18_greater']
-
-# Convert date to datetime
-df['date'] = pd.to_datetime(df['date'], format='%d-%m-%Y', errors='coerce')
-
-# Visualization 1: Bar chart - Enrolments per state
-state_enrolment = df.groupby('state')['total_enrolment'].sum().sort_values(ascending=False).head(10)
-plt.figure(figsize=(10, 6))
-state_enrolment.plot(kind='bar')
-plt.title('Top 10 States by Total Enrolment')
-plt.xlabel('State')
-plt.ylabel('Total Enrolment')
-plt.xticks(rotation=45)
-plt.tight_layout()
-plt.savefig('enrolment_per_state.png')
-plt.show()
-
-# Visualization 2: Bar chart - Enrolments per district (top 10)
-district_enrolment = df.groupby('district')['total_enrolment'].sum().sort_values(ascending=False).head(10)
-plt.figure(figsize=(10, 6))
-district_enrolment.plot(kind='bar')
-plt.title('Top 10 Districts by Total Enrolment')
-plt.xlabel('District')
-plt.ylabel('Total Enrolment')
-plt.xticks(rotation=45)
-plt.tight_layout()
-plt.savefig('enrolment_per_district.png')
-plt.show()
-
-# Visualization 3: Line chart - Enrolment trends over time
-# Group by date and sum enrolment
-time_trend = df.groupby('date')['total_enrolment'].sum().reset_index()
-plt.figure(figsize=(12, 6))
-plt.plot(time_trend['date'], time_trend['total_enrolment'])
-plt.title('Enrolment Trends Over Time')
-plt.xlabel('Date')
-plt.ylabel('Total Enrolment')
-plt.xticks(rotation=45)
-plt.tight_layout()
-plt.savefig('enrolment_trends_over_time.png')
-plt.show()
-
-# Visualization 4: Heatmap - Correlation between demographic and enrolment/biometric updates
-# Select relevant columns
-correlation_cols = ['age_0_5', 'age_5_17', 'age_18_greater', 'demo_age_5_17', 'demo_age_17_', 'bio_age_5_17', 'bio_age_17_']
-corr_df = df[correlation_cols].corr()
-plt.figure(figsize=(10, 8))
-sns.heatmap(corr_df, annot=True, cmap='coolwarm', fmt='.2f')
-plt.title('Correlation Heatmap: Demographic vs Enrolment/Biometric Updates')
-plt.tight_layout()
-plt.savefig('correlation_heatmap.png')
-plt.show()
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from aadhaar import figures, metrics
+from aadhaar.cube import Cube
+
+parser = argparse.ArgumentParser(description='Plot enrolment per state, per district, over time and the '
+                                             'correlation heatmap.')
+parser.add_argument('--headless', action='store_true',
+                    help='render in a process pool on the Agg backend without showing the figures, skipping those '
+                         'whose data has not changed (the default when MPLBACKEND=Agg, as under run_pipeline.py)')
+parser.add_argument('--states', nargs='*', default=None, metavar='STATE',
+                    help=f'also plot each state into {figures.STATE_DIR}/<state>/ (every state if none are named)')
+parser.add_argument('--workers', type=int, default=None, help='rendering processes (default: one per CPU)')
+parser.add_argument('--force', action='store_true', help='re-render figures whose data has not changed')
+args = parser.parse_args()
+
+metrics.begin('visualize_data')
+
+# Load the rollup cube built by clean_data.py (rebuilt if cleaned_aadhar_data.csv changed)
+cube = Cube.load_or_build('cleaned_aadhar_data.csv')
+
+# Every figure's data from one grouping-sets pass over the cube: top 10
+# states and districts by total enrolment, enrolment by date and the
+# correlation between demographic and enrolment/biometric updates
+states = args.states
+if states == []:
+    states = sorted(cube.cells['state'].dropna().unique())
+plots = figures.plot_inputs(cube, states)
+
+if args.headless or os.environ.get('MPLBACKEND', '').lower() == 'agg':
+    status = figures.render_all(plots, workers=args.workers, force=args.force)
+    unchanged = sum(result == 'unchanged' for result in status.values())
+    print(f"Rendered {len(status) - unchanged} figures ({unchanged} unchanged).")
+else:
+    import matplotlib.pyplot as plt
+
+    for figure in plots:
+        figures.draw(figure)
+        figures.save(figure)
+        plt.show()
 
 print("Visualizations saved as PNG files.")
@@ -0,0 +1,34 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from aadhaar import join, synthetic
+
+ROWS = 6000
+SHARD_ROWS = 2000
+
+
+@pytest.fixture(scope='session')
+def shard_dir(tmp_path_factory):
+    # Three shards per dataset from aadhaar/synthetic.py, exact duplicate and
+    # placeholder rows included
+    out_dir = tmp_path_factory.mktemp('shards')
+    synthetic.generate(ROWS, str(out_dir), seed=0, shard_rows=SHARD_ROWS)
+    return out_dir
+
+
+@pytest.fixture
+def data_dir(shard_dir, tmp_path):
+    # A private copy per test, so columnar caches and edited shards do not leak
+    path = tmp_path / 'data'
+    shutil.copytree(shard_dir, path)
+    return path
+
+
+@pytest.fixture
+def shards(data_dir):
+    return join.discover_shards(str(data_dir))
@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aadhaar import anomaly, cleaning, cube, dates, join
+from aadhaar.anomaly import SeriesIndex
+from aadhaar.cube import BIOMETRIC, DEMOGRAPHIC, ENROLMENT
+
+DAYS = pd.date_range('2025-01-20', '2025-03-10')
+SPIKE = ('State 01', 'District 01-02', pd.Timestamp('2025-02-25'))
+
+
+def daily_cells(seed=0):
+    # Poisson counts for six districts over 50 days, one spike, and one
+    # district with no rows on some days
+    rng = np.random.default_rng(seed)
+    rows = []
+    for s in range(2):
+        for d in range(3):
+            for day in DAYS:
+                if (s, d) == (1, 2) and day.day % 7 == 0:
+                    continue
+                rows.append({'state': f'State {s:02d}', 'district': f'District {s:02d}-{d:02d}', 'date': day})
+    cells = pd.DataFrame(rows)
+    for col in ENROLMENT + DEMOGRAPHIC + BIOMETRIC:
+        cells[col] = rng.poisson(20, len(cells)).astype(float)
+    spike = (cells['state'] == SPIKE[0]) & (cells['district'] == SPIKE[1]) & (cells['date'] == SPIKE[2])
+    cells.loc[spike, 'age_0_5'] += 400
+    return cells
+
+
+def dense(cells, columns):
+    # (series x days) sums the slow way, days without rows as 0
+    totals = cells.assign(x=cells[columns].sum(axis=1)).groupby(['state', 'district', 'date'])['x'].sum()
+    return totals.unstack('date').reindex(columns=DAYS).fillna(0)
+
+
+@pytest.fixture
+def index():
+    return SeriesIndex.from_cells(daily_cells(), anomaly.LEVELS['district'])
+
+
+def flagged(flags):
+    return set(zip(flags['state'], flags['district'], flags['period']))
+
+
+def test_dense_matrix_matches_groupby(index):
+    expected = dense(daily_cells(), ENROLMENT)
+    assert list(zip(index.keys['state'], index.keys['district'])) == expected.index.tolist()
+    assert index.values['enrolment'].dtype == np.float32 and index.values['enrolment'].flags.c_contiguous
+    np.testing.assert_array_equal(index.values['enrolment'], expected.to_numpy())
+    np.testing.assert_array_equal(dates.decode_days(index.days.astype(np.int32)), DAYS.to_numpy())
+
+
+def test_zscore_matches_rolling_reference(index):
+    window = 7
+    series = dense(daily_cells(), ENROLMENT)
+    previous = series.T.shift(1)
+    mean = previous.rolling(window).mean().T.iloc[:, window:]
+    std = previous.rolling(window).std().T.iloc[:, window:]
+    current = series.iloc[:, window:]
+    score = ((current - mean) / std).where(std > 0, 0.0)
+    mask = (score.abs() > 3) & (np.maximum(current, mean) >= anomaly.MIN_COUNT)
+    expected = {(s, d, day) for (s, d), row in mask.iterrows() for day, hit in row.items() if hit}
+    flags = index.zscore(window=window)
+    assert flagged(flags) == expected and SPIKE in expected
+    # Largest scores first
+    assert (np.diff(np.abs(flags['score'].to_numpy())) <= 0).all()
+    np.testing.assert_allclose(flags['baseline'], [mean.loc[(s, d), day] for s, d, day in
+                                                   zip(flags['state'], flags['district'], flags['period'])])
+
+
+@pytest.mark.parametrize('block', [anomaly.MEDIAN_BLOCK, 4])
+def test_mad_matches_rolling_reference(index, monkeypatch, block):
+    monkeypatch.setattr(anomaly, 'MEDIAN_BLOCK', block)
+    window = 7
+    series = dense(daily_cells(), ENROLMENT)
+    previous = series.T.shift(1)
+    median = previous.rolling(window).median()
+    spread = previous.rolling(window).apply(lambda w: np.median(np.abs(w - np.median(w))), raw=True)
+    median, spread = median.T.iloc[:, window:], spread.T.iloc[:, window:]
+    current = series.iloc[:, window:]
+    score = (0.6745 * (current - median) / spread).where(spread > 0, 0.0)
+    flags = index.mad(window=window)
+    expected = score.stack()
+    result = pd.Series(flags['score'].to_numpy(), index=pd.MultiIndex.from_frame(flags[['state', 'district',
+                                                                                         'period']]))
+    np.testing.assert_allclose(result.to_numpy(), expected.reindex(result.index).to_numpy(), rtol=1e-6)
+    assert SPIKE in flagged(flags)
+
+
+def test_monthly_pct_change(index):
+    series = dense(daily_cells(), ENROLMENT)
+    monthly = series.T.groupby(DAYS.to_period('M')).sum().T
+    change = monthly.pct_change(axis=1) * 100
+    periods, sums = index.monthly('enrolment')
+    assert periods.astype(str).tolist() == ['2025-01', '2025-02', '2025-03']
+    np.testing.assert_allclose(sums, monthly.to_numpy())
+    # January has 12 days and March 10, against 28 in February, so every
+    # series jumps both times
+    flags = index.detect('pct_change', threshold=50)
+    expected = change.iloc[:, 1:].stack()
+    expected = expected[expected.abs() > 50]
+    assert len(expected) == 12
+    assert {(s, d, str(p)) for s, d, p in flagged(flags)} == {(s, d, str(p)) for s, d, p in expected.index}
+
+
+def test_small_counts_and_short_series_are_not_flagged():
+    cells = daily_cells()
+    cells[ENROLMENT] = 0.0
+    cells['age_0_5'] = np.arange(len(cells)) % 2 + 1.0
+    spike = (cells['district'] == SPIKE[1]) & (cells['date'] == SPIKE[2])
+    cells.loc[spike, 'age_0_5'] = 9
+    index = SeriesIndex.from_cells(cells, anomaly.LEVELS['district'])
+    # Far above its baseline but below min_count; with a lower min_count it is flagged
+    assert index.detect('zscore').empty
+    assert flagged(index.detect('zscore', min_count=1)) == {SPIKE}
+    short = SeriesIndex.from_cells(cells[cells['date'] < DAYS[5]], anomaly.LEVELS['district'])
+    assert short.detect('mad', min_count=0).empty and short.detect('zscore', min_count=0).empty
+
+
+def test_cube_and_pincode_series_match_the_cleaned_csv(shards, tmp_path):
+    dictionaries = join.global_dictionaries(shards)
+    frames = [pd.concat([join.load_aligned(path, dictionaries) for path in paths], ignore_index=True)
+              for paths in shards.values()]
+    path = str(tmp_path / 'cleaned_aadhar_data.csv')
+    cleaning.clean(join.merge_frames(frames)).to_csv(path, index=False, date_format=dates.DATE_FORMAT)
+    df = pd.read_csv(path)
+    df['date'] = pd.to_datetime(df['date'], format=dates.DATE_FORMAT)
+    days = df['date'].sort_values().unique()
+    for levels, index in [(['state', 'district'], SeriesIndex.from_cube(cube.Cube.build(path))),
+                          (['state', 'district', 'pincode'], SeriesIndex.from_csv(path, chunksize=1000))]:
+        expected = (df.assign(x=df[BIOMETRIC].fillna(0).sum(axis=1)).groupby(levels + ['date'])['x'].sum()
+                    .unstack('date').reindex(columns=days).fillna(0))
+        assert index.keys.astype(str).values.tolist() == expected.index.to_frame().astype(str).values.tolist()
+        np.testing.assert_allclose(index.values['biometric'], expected.to_numpy(), rtol=1e-6)
@@ -0,0 +1,59 @@
+import json
+import os
+
+import pandas as pd
+
+from aadhaar import benchmark, join, synthetic
+
+
+def test_generated_shards_follow_the_schemas(shard_dir, shards):
+    with open(shard_dir / 'synthetic.json') as f:
+        meta = json.load(f)
+    for dataset, measures in synthetic.SCHEMAS.items():
+        assert [os.path.basename(p) for p in shards[dataset]] == meta['shards'][dataset]
+        df = pd.concat([pd.read_csv(p, dtype={'date': str}) for p in shards[dataset]], ignore_index=True)
+        assert len(df) == meta['rows']
+        assert list(df.columns) == join.KEY_COLUMNS + list(measures)
+        assert pd.to_datetime(df['date'], format='%d-%m-%Y').notna().all()
+        # Keys are unique apart from the injected duplicate and placeholder rows
+        real = df[df['district'] != '100000']
+        assert real.duplicated().sum() == real.duplicated(join.KEY_COLUMNS).sum()
+        assert real.duplicated().mean() < 0.01
+        assert df['state'].nunique() <= meta['states'] == synthetic.N_STATES
+
+
+def test_generation_is_deterministic(tmp_path):
+    first = synthetic.generate(1500, str(tmp_path / 'a'), seed=3, shard_rows=1000)
+    second = synthetic.generate(1500, str(tmp_path / 'b'), seed=3, shard_rows=1000)
+    assert first == second
+    for name in first['shards']['biometric']:
+        assert (tmp_path / 'a' / name).read_bytes() == (tmp_path / 'b' / name).read_bytes()
+
+
+def test_ensure_data_reuses_matching_shards(tmp_path, monkeypatch):
+    workdir = str(tmp_path)
+    benchmark.ensure_data(workdir, 1000, shard_rows=1000)
+    calls = []
+    generate = synthetic.generate
+    monkeypatch.setattr(synthetic, 'generate', lambda *args: calls.append(args) or generate(*args))
+    benchmark.ensure_data(workdir, 1000, shard_rows=1000)
+    assert calls == []
+    meta = benchmark.ensure_data(workdir, 1200, shard_rows=1000)
+    assert len(calls) == 1 and meta['rows'] == 1200
+    # The shards of the old size are gone
+    assert sorted(os.path.basename(p) for p in join.discover_shards(workdir)['enrolment']) == \
+        sorted(meta['shards']['enrolment'])
+
+
+def test_benchmark_records_each_stage(tmp_path, capsys):
+    workdir, results = str(tmp_path / 'work'), str(tmp_path / 'results.jsonl')
+    records = benchmark.benchmark(1000, workdir, ['ingest', 'merge'], results, shard_rows=500)
+    with open(results) as f:
+        assert [json.loads(line) for line in f] == records
+    assert [r['stage'] for r in records] == ['ingest', 'merge']
+    for record in records:
+        assert record['returncode'] == 0 and record['rows'] == 3000 and record['dataset_rows'] == 1000
+        assert record['seconds'] > 0 and record['peak_rss_mb'] > 0
+    assert benchmark.count_rows(os.path.join(workdir, benchmark.MERGED)) > 0
+    assert benchmark.previous_results(results, 1000)['merge'] == records[1]
+    assert 'merge' in capsys.readouterr().out
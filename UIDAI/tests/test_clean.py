@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aadhaar import cleaning, dedup, join, schema
+
+
+@pytest.fixture
+def merged_csv(shards, tmp_path):
+    # A merged CSV with later, different copies of some keys, shuffled so
+    # duplicates are neither adjacent nor in key order
+    joined = tmp_path / 'joined.csv'
+    join.sort_merge_join(shards, str(joined), spill_dir=str(tmp_path))
+    merged = pd.read_csv(joined)
+    rng = np.random.default_rng(0)
+    copies = merged.iloc[rng.integers(0, len(merged), 300)].copy()
+    copies['age_0_5'] += 1
+    dirty = pd.concat([merged, copies], ignore_index=True).iloc[rng.permutation(len(merged) + len(copies))]
+    path = tmp_path / 'merged_aadhar_data.csv'
+    dirty.to_csv(path, index=False)
+    return path
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_out_of_core_clean_is_byte_identical(merged_csv, tmp_path, workers):
+    expected = tmp_path / 'expected.csv'
+    output = tmp_path / 'cleaned_aadhar_data.csv'
+    schema.to_csv(cleaning.clean(schema.load(str(merged_csv))), str(expected))
+    # Small chunks and buckets, so keys and duplicates straddle both
+    rows, _, written = dedup.clean_csv(str(merged_csv), str(output), memory_mb=1, workers=workers,
+                                       spill_dir=str(tmp_path), chunksize=1000)
+    assert dedup.plan_buckets(str(merged_csv), 1) > 1
+    assert output.read_bytes() == expected.read_bytes()
+    assert written == len(pd.read_csv(expected))
+
+
+def test_clean_matches_drop_duplicates(merged_csv):
+    df = pd.read_csv(merged_csv)
+    expected = df.drop_duplicates(subset=join.KEY_COLUMNS, keep='first')
+    assert len(expected) < len(df)
+    placeholder = ((expected['state'].astype(str) == cleaning.PLACEHOLDER)
+                   | (expected['district'].astype(str) == cleaning.PLACEHOLDER)
+                   | (expected['pincode'] == int(cleaning.PLACEHOLDER)))
+    assert placeholder.any()
+    expected = expected[~placeholder]
+    cleaned = cleaning.clean(df)
+    assert cleaned.index.equals(expected.index)
@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from aadhaar import columnar
+
+
+def _rebuilds(monkeypatch):
+    calls = []
+    ingest = columnar.ingest
+    monkeypatch.setattr(columnar, 'ingest', lambda path: calls.append(path) or ingest(path))
+    return calls
+
+
+def test_cached_shard_matches_the_csv(shards):
+    path = shards['enrolment'][1]
+    df = columnar.load_shard(path)
+    expected = pd.read_csv(path)
+    assert list(df.columns) == list(expected.columns)
+    assert (df['date'].dt.strftime('%d-%m-%Y') == expected['date']).all()
+    for col in ['state', 'district']:
+        assert list(df[col].cat.categories) == sorted(expected[col].unique())
+        assert (df[col].astype(str) == expected[col]).all()
+    for col in ['pincode', 'age_0_5', 'age_5_17', 'age_18_greater']:
+        assert df[col].dtype.kind == 'u'
+        np.testing.assert_array_equal(df[col].to_numpy(), expected[col].to_numpy())
+
+
+def test_fresh_cache_is_reused(shards, monkeypatch):
+    path = shards['demographic'][0]
+    columnar.ensure_cached(path)
+    calls = _rebuilds(monkeypatch)
+    columnar.load_shard(path)
+    assert calls == []
+
+
+def test_touched_file_is_hashed_once(shards, monkeypatch):
+    path = shards['demographic'][0]
+    columnar.ensure_cached(path)
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    calls = _rebuilds(monkeypatch)
+    hashes = []
+    file_hash = columnar.file_hash
+    monkeypatch.setattr(columnar, 'file_hash', lambda p: hashes.append(p) or file_hash(p))
+    columnar.ensure_cached(path)
+    columnar.ensure_cached(path)
+    assert calls == [] and len(hashes) == 1
+
+
+@pytest.mark.parametrize('grow', [False, True])
+def test_changed_file_is_rebuilt(shards, monkeypatch, grow):
+    path = shards['biometric'][0]
+    columnar.ensure_cached(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    if grow:
+        data += data.splitlines(keepends=True)[1]
+    else:
+        # Same size, different last count
+        data = data[:-2] + (b'8' if data[-2:-1] == b'7' else b'7') + data[-1:]
+    st = os.stat(path)
+    with open(path, 'wb') as f:
+        f.write(data)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    calls = _rebuilds(monkeypatch)
+    df = columnar.load_shard(path)
+    assert calls == [path]
+    expected = pd.read_csv(path)
+    assert len(df) == len(expected)
+    np.testing.assert_array_equal(df['bio_age_17_'].to_numpy(), expected['bio_age_17_'].to_numpy())
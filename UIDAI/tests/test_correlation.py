@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aadhaar.correlation import CorrelationAccumulator, GroupedCorrelation
+
+COLUMNS = ['a', 'b', 'c', 'd']
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(0)
+    n = 6000
+    base = rng.normal(size=n)
+    df = pd.DataFrame({
+        'state': rng.choice(['S1', 'S2', 'S3'], n),
+        'a': 1e6 + base,
+        'b': 2 * base + rng.normal(size=n),
+        'c': rng.poisson(20, n).astype('float64'),
+        'd': -base + 0.1 * rng.normal(size=n),
+    })
+    df.loc[[3, 30, 300], 'c'] = np.nan
+    return df
+
+
+def test_chunked_correlation_matches_pandas(frame):
+    # Large offsets in 'a' would cancel in the raw sum-of-products formula
+    acc = CorrelationAccumulator(COLUMNS)
+    for start in range(0, len(frame), 700):
+        acc.update(frame[COLUMNS].iloc[start:start + 700])
+    expected = frame[COLUMNS].dropna()
+    assert acc.n == len(expected)
+    pd.testing.assert_frame_equal(acc.correlation(), expected.corr(), rtol=1e-10)
+    pd.testing.assert_frame_equal(acc.covariance(), expected.cov(), rtol=1e-10)
+
+
+def test_merged_accumulators_match_one_pass(frame):
+    whole = CorrelationAccumulator(COLUMNS).update(frame[COLUMNS])
+    merged = CorrelationAccumulator(COLUMNS)
+    for part in np.array_split(frame[COLUMNS], 4):
+        merged.merge(CorrelationAccumulator(COLUMNS).update(part))
+    assert merged.n == whole.n
+    np.testing.assert_allclose(merged.comoment, whole.comoment, rtol=1e-10, atol=1e-5)
+    np.testing.assert_allclose(merged.mean, whole.mean, rtol=1e-12)
+
+
+def test_subtract_undoes_merge(frame):
+    first, second = frame[COLUMNS].iloc[:4000], frame[COLUMNS].iloc[4000:]
+    acc = CorrelationAccumulator(COLUMNS).update(frame[COLUMNS])
+    acc.subtract(CorrelationAccumulator(COLUMNS).update(second))
+    expected = CorrelationAccumulator(COLUMNS).update(first)
+    assert acc.n == expected.n
+    np.testing.assert_allclose(acc.comoment, expected.comoment, rtol=1e-8, atol=1e-5)
+    assert acc.subtract(expected).n == 0
+
+
+def test_per_state_matrices_match_groupby(frame):
+    grouped = GroupedCorrelation(COLUMNS)
+    for start in range(0, len(frame), 1000):
+        chunk = frame.iloc[start:start + 1000]
+        grouped.update(chunk['state'], chunk[COLUMNS])
+    matrices = grouped.matrices()
+    assert list(matrices) == ['S1', 'S2', 'S3']
+    for state, rows in frame.groupby('state'):
+        pd.testing.assert_frame_equal(matrices[state], rows[COLUMNS].dropna().corr(), rtol=1e-10)
+
+
+def test_constant_column_has_no_correlation():
+    acc = CorrelationAccumulator(['x', 'y']).update(np.column_stack([np.ones(10), np.arange(10.0)]))
+    corr = acc.correlation()
+    assert np.isnan(corr.loc['x', 'x']) and np.isnan(corr.loc['x', 'y']) and corr.loc['y', 'y'] == 1
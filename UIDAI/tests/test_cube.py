@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aadhaar import cleaning, cube, dates, join
+
+
+@pytest.fixture
+def cleaned_csv(shards, tmp_path):
+    # clean_data.py's output for the synthetic shards
+    dictionaries = join.global_dictionaries(shards)
+    frames = [pd.concat([join.load_aligned(path, dictionaries) for path in paths], ignore_index=True)
+              for paths in shards.values()]
+    path = tmp_path / 'cleaned_aadhar_data.csv'
+    cleaning.clean(join.merge_frames(frames)).to_csv(path, index=False, date_format=dates.DATE_FORMAT)
+    return str(path)
+
+
+def read_cleaned(path):
+    # The scripts' own preparation of the cleaned CSV
+    df = pd.read_csv(path)
+    df[cube.MEASURES] = df[cube.MEASURES].fillna(0)
+    df['date'] = pd.to_datetime(df['date'], format='%d-%m-%Y')
+    df['month'] = df['date'].dt.to_period('M')
+    return cube.add_totals(df)
+
+
+@pytest.mark.parametrize('levels', [['state'], ['state', 'district'], ['month'], ['date']])
+def test_rollups_match_groupby(cleaned_csv, levels):
+    built = cube.Cube.build(cleaned_csv)
+    measures = cube.MEASURES + ['total_enrolment', 'total_demo_population', 'total_bio_updates']
+    expected = read_cleaned(cleaned_csv).groupby(levels)[measures].sum().reset_index()
+    result = built.by(levels)
+    assert result[levels].astype(str).values.tolist() == expected[levels].astype(str).values.tolist()
+    np.testing.assert_allclose(result[measures].to_numpy(dtype=float), expected[measures].to_numpy(dtype=float))
+
+
+def test_totals_and_counts(cleaned_csv):
+    built = cube.Cube.build(cleaned_csv)
+    df = read_cleaned(cleaned_csv)
+    np.testing.assert_allclose(built.totals()[cube.MEASURES], df[cube.MEASURES].sum())
+    assert built.totals()['rows'] == built.record_count == len(df)
+    assert built.date_range() == (df['date'].min(), df['date'].max())
+    assert built.nunique('district') == df['district'].nunique()
+    pd.testing.assert_frame_equal(built.correlation(), df[cube.MEASURES].corr(), check_exact=False)
+
+
+def test_cube_does_not_depend_on_chunk_size(cleaned_csv):
+    whole = cube.Cube.build(cleaned_csv)
+    chunked = cube.Cube.build(cleaned_csv, chunksize=700)
+    pd.testing.assert_frame_equal(chunked.cells, whole.cells)
+    from_frame = cube.Cube.from_frame(pd.read_csv(cleaned_csv), cleaned_csv, chunksize=900)
+    pd.testing.assert_frame_equal(from_frame.cells, whole.cells, check_dtype=False)
+
+
+def test_saved_cube_is_reused_until_the_csv_changes(cleaned_csv, tmp_path, monkeypatch):
+    path = str(tmp_path / cube.CUBE_FILE)
+    cube.Cube.load_or_build(cleaned_csv, path)
+    builds = []
+    build = cube.Cube.build.__func__
+    monkeypatch.setattr(cube.Cube, 'build', classmethod(lambda cls, *args: builds.append(args) or build(cls, *args)))
+    first = cube.Cube.load_or_build(cleaned_csv, path)
+    assert builds == []
+    df = pd.read_csv(cleaned_csv)
+    df.iloc[:-1].to_csv(cleaned_csv, index=False)
+    rebuilt = cube.Cube.load_or_build(cleaned_csv, path)
+    assert builds == [(cleaned_csv,)]
+    assert rebuilt.record_count == first.record_count - 1
+    assert cube.Cube.load(path).is_current(cleaned_csv)
@@ -0,0 +1,54 @@
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from aadhaar import dates
+
+
+def test_day_first_and_round_trip():
+    values = pd.Series(['03-04-2025', '31-12-1999', '01-01-1970', '29-02-2024'])
+    days = dates.parse_days(values)
+    assert days.dtype == np.int32
+    expected = pd.to_datetime(values, format='%d-%m-%Y')
+    np.testing.assert_array_equal(dates.decode_days(days), expected.to_numpy(dtype='datetime64[ns]'))
+    # 03-04-2025 is 3 April, never 4 March
+    assert pd.Timestamp(dates.decode_days(days)[0]).month == 4
+
+
+def test_missing_and_invalid_values_are_counted():
+    values = pd.Series(['01-03-2025', None, '31-02-2025', '2025-03-01', '31-02-2025', '01-03-2025'])
+    invalid = Counter()
+    days = dates.parse_days(values, invalid=invalid)
+    assert (days == dates.MISSING_DAY).tolist() == [False, True, True, True, True, False]
+    # Missing cells are not invalid values
+    assert invalid == Counter({'31-02-2025': 2, '2025-03-01': 1})
+    assert np.isnat(dates.decode_days(days)[1:5]).all()
+    assert dates.invalid_summary(invalid) == "3 rows in 2 values: '31-02-2025' (2 rows), '2025-03-01' (1 row)"
+
+
+def test_each_distinct_string_is_parsed_once(monkeypatch):
+    monkeypatch.setattr(dates, '_cache', {})
+    parsed = []
+    to_datetime = pd.to_datetime
+    monkeypatch.setattr(pd, 'to_datetime', lambda values, **kwargs: parsed.extend(values) or
+                        to_datetime(values, **kwargs))
+    column = pd.Series(['01-03-2025', '02-03-2025'] * 5000)
+    first = dates.parse_days(column)
+    assert sorted(parsed) == ['01-03-2025', '02-03-2025']
+    second = dates.parse_days(pd.Series(['02-03-2025', '03-03-2025']))
+    assert sorted(parsed) == ['01-03-2025', '02-03-2025', '03-03-2025']
+    assert second[0] == first[1] and second[1] == first[1] + 1
+
+
+def test_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(dates, '_cache', {})
+    monkeypatch.setattr(dates, 'MAX_CACHED', 50)
+    for start in range(0, 200, 20):
+        dates.parse_days(pd.Series([f'garbage {i}' for i in range(start, start + 20)]))
+        assert len(dates._cache) <= 50
+
+
+def test_empty_and_all_missing_columns():
+    assert dates.parse_days(pd.Series([], dtype=object)).tolist() == []
+    assert dates.parse_days(pd.Series([None, np.nan])).tolist() == [dates.MISSING_DAY] * 2
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aadhaar import duplicates
+
+
+@pytest.fixture
+def enrolment(shards):
+    # Copy rows of the first shard into the later ones, some of them twice
+    paths = shards['enrolment']
+    first = pd.read_csv(paths[0], dtype=str)
+    for i, path in enumerate(paths[1:]):
+        copies = first.sample(50, random_state=i, replace=True)
+        copies.to_csv(path, mode='a', header=False, index=False)
+    return paths
+
+
+def expected_duplicates(paths):
+    # (shard, row) of every row whose content appeared earlier, in file order
+    frames = [pd.read_csv(path, dtype=str).assign(_shard=i) for i, path in enumerate(paths)]
+    rows = pd.concat([df.assign(_row=np.arange(len(df))) for df in frames], ignore_index=True)
+    dup = rows.drop(columns=['_shard', '_row']).duplicated(keep='first')
+    return list(zip(rows.loc[dup, '_shard'], rows.loc[dup, '_row']))
+
+
+@pytest.mark.parametrize('bloom', [False, True])
+def test_duplicates_match_pandas(enrolment, bloom):
+    expected = expected_duplicates(enrolment)
+    report = duplicates.find_duplicates(enrolment, bloom=bloom, chunksize=500)
+    assert report.duplicates == len(expected)
+    assert report.cross_shard > 0
+    found = [(enrolment.index(path), row) for (path, row), _ in report.pairs(limit=len(expected))]
+    assert found == expected
+
+
+def test_duplicate_pairs_point_at_first_occurrence(enrolment):
+    report = duplicates.find_duplicates(enrolment, chunksize=500)
+    frames = [pd.read_csv(path, dtype=str) for path in enrolment]
+    for (dup_path, dup_row), (orig_path, orig_row) in report.pairs(limit=report.duplicates):
+        duplicate = frames[enrolment.index(dup_path)].iloc[dup_row]
+        original = frames[enrolment.index(orig_path)].iloc[orig_row]
+        assert duplicate.equals(original)
+        assert (enrolment.index(orig_path), orig_row) < (enrolment.index(dup_path), dup_row)
+
+
+def test_bloom_filter_has_no_false_negatives():
+    values = np.random.default_rng(0).integers(0, 2 ** 63, 10000, dtype=np.uint64)
+    bloom = duplicates.BloomFilter(len(values))
+    bloom.add(values[:5000])
+    assert bloom.contains(values[:5000]).all()
+    # About FALSE_POSITIVE_RATE of the unseen values are reported as seen
+    assert bloom.contains(values[5000:]).mean() < 3 * duplicates.FALSE_POSITIVE_RATE
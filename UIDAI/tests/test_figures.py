@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from aadhaar import cleaning, cube, dates, figures, join
+
+
+@pytest.fixture
+def built(shards, tmp_path):
+    dictionaries = join.global_dictionaries(shards)
+    frames = [pd.concat([join.load_aligned(path, dictionaries) for path in paths], ignore_index=True)
+              for paths in shards.values()]
+    path = tmp_path / 'cleaned_aadhar_data.csv'
+    cleaning.clean(join.merge_frames(frames)).to_csv(path, index=False, date_format=dates.DATE_FORMAT)
+    df = pd.read_csv(path)
+    df[cube.MEASURES] = df[cube.MEASURES].fillna(0)
+    df['total_enrolment'] = df[cube.ENROLMENT].sum(axis=1)
+    df['date'] = pd.to_datetime(df['date'], format=dates.DATE_FORMAT)
+    return cube.Cube.build(str(path)), df
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_plot_inputs_match_groupby(built):
+    built, df = built
+    by_state, by_district, trend, heatmap = figures.plot_inputs(built)
+    expected = df.groupby('state')['total_enrolment'].sum().nlargest(figures.TOP_K, keep='first')
+    assert by_state.data.index.astype(str).tolist() == expected.index.tolist()
+    np.testing.assert_allclose(by_state.data.to_numpy(), expected.to_numpy())
+    expected = df.groupby('district')['total_enrolment'].sum().nlargest(figures.TOP_K, keep='first')
+    assert by_district.data.index.astype(str).tolist() == expected.index.tolist()
+    expected = df.groupby('date')['total_enrolment'].sum()
+    assert trend.data['date'].tolist() == expected.index.tolist()
+    np.testing.assert_allclose(trend.data['total_enrolment'].to_numpy(), expected.to_numpy())
+    np.testing.assert_allclose(heatmap.data.to_numpy(), df[figures.CORRELATION_COLUMNS].corr().to_numpy(),
+                               atol=1e-6)
+
+
+def test_per_state_figures(built):
+    built, df = built
+    plots = figures.plot_inputs(built, ['State 04', 'Nowhere'])
+    paths = [figure.path for figure in plots[4:]]
+    assert paths == [os.path.join(figures.STATE_DIR, 'State 04', name) for name in figures.FILES[1:]]
+    rows = df[df['state'] == 'State 04']
+    expected = rows.groupby('district')['total_enrolment'].sum().nlargest(figures.TOP_K, keep='first')
+    assert plots[4].data.index.astype(str).tolist() == expected.index.tolist()
+    np.testing.assert_allclose(plots[5].data['total_enrolment'].to_numpy(),
+                               rows.groupby('date')['total_enrolment'].sum().to_numpy())
+    assert figures.state_dir('Jammu/Kashmir') == os.path.join(figures.STATE_DIR, 'Jammu%2FKashmir')
+
+
+def test_unchanged_figures_are_skipped(built, workdir):
+    plots = figures.plot_inputs(built[0])
+    assert set(figures.render_all(plots, workers=1).values()) == {'rendered'}
+    assert all((workdir / name).stat().st_size > 0 for name in figures.FILES)
+    assert set(figures.render_all(plots, workers=1).values()) == {'unchanged'}
+    # New data, a deleted PNG, and --force each re-render
+    plots[0].data = plots[0].data.head(5)
+    os.remove(figures.FILES[1])
+    status = figures.render_all(plots, workers=1)
+    assert [status[name] for name in figures.FILES] == ['rendered', 'rendered', 'unchanged', 'unchanged']
+    assert figures.render_all(plots[2:3], workers=1, force=True) == {figures.FILES[2]: 'rendered'}
+    assert set(figures.render_all(plots, workers=1).values()) == {'unchanged'}
+
+
+def test_render_in_a_process_pool(built, workdir):
+    plots = figures.plot_inputs(built[0], ['State 01'])
+    status = figures.render_all(plots, workers=2)
+    assert set(status.values()) == {'rendered'} and len(status) == len(plots)
+    assert all(os.path.getsize(figure.path) > 0 for figure in plots)
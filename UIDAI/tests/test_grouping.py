@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aadhaar import grouping
+
+SETS = [(), ('state',), ('state', 'district'), ('month',)]
+MEASURES = ['a', 'b']
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(0)
+    n = 5000
+    return pd.DataFrame({
+        'state': rng.choice(['S1', 'S2', 'S3', None], n, p=[0.4, 0.3, 0.29, 0.01]),
+        'district': rng.choice([f'D{i}' for i in range(40)], n),
+        'month': pd.PeriodIndex(rng.choice(['2025-01', '2025-02', '2025-03'], n), freq='M'),
+        'a': rng.integers(0, 100, n),
+        'b': rng.random(n),
+    })
+
+
+@pytest.mark.parametrize('dense_limit', [grouping.DENSE_LIMIT, 1])
+def test_grouping_sets_match_groupby(frame, monkeypatch, dense_limit):
+    # A limit of 1 takes the np.unique path for every set
+    monkeypatch.setattr(grouping, 'DENSE_LIMIT', dense_limit)
+    results = grouping.grouping_sets(frame, SETS, MEASURES)
+    assert list(results) == SETS
+    np.testing.assert_allclose(results[()][MEASURES].to_numpy(), frame[MEASURES].sum().to_numpy())
+    for levels in SETS[1:]:
+        expected = frame.groupby(list(levels))[MEASURES].sum().reset_index()
+        result = results[levels]
+        assert list(result.columns) == list(levels) + MEASURES
+        pd.testing.assert_frame_equal(result[list(levels)], expected[list(levels)], check_dtype=False)
+        np.testing.assert_allclose(result[MEASURES].to_numpy(dtype=float), expected[MEASURES].to_numpy(dtype=float))
+
+
+def test_empty_groups_are_left_out(frame):
+    # Only the (state, district) pairs that occur come back
+    frame = frame[(frame['state'] != 'S1') | (frame['district'] == 'D0')]
+    result = grouping.grouping_sets(frame, [('state', 'district')], MEASURES)[('state', 'district')]
+    assert len(result) == frame.dropna(subset=['state']).groupby(['state', 'district']).ngroups
+    assert result.loc[result['state'] == 'S1', 'district'].tolist() == ['D0']
@@ -0,0 +1,145 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from aadhaar import incremental, join
+from aadhaar.cube import CELL_KEYS, Cube
+from aadhaar.partitioned import PartitionedStore
+
+
+def new_shard(shards, dataset, date, states, name):
+    # A shard of rows copied from the first shard of the dataset, restricted
+    # to some states and moved to another day
+    df = pd.read_csv(shards[dataset][0], dtype=str)
+    df = df[df['state'].isin(states)].assign(date=date)
+    path = os.path.join(os.path.dirname(shards[dataset][0]), f'api_data_aadhar_{dataset}_{name}.csv')
+    df.to_csv(path, index=False)
+    return path
+
+
+def update(store, data_dir):
+    return incremental.update_store(str(store), join.discover_shards(str(data_dir)))
+
+
+def rows(df):
+    df = df.copy()
+    for col in ['state', 'district']:
+        df[col] = df[col].astype(str)
+    return df.sort_values(['state', 'district', 'pincode', 'date'], ignore_index=True)
+
+
+def assert_cube_equal(cube, expected):
+    key = lambda cells: cells.sort_values(CELL_KEYS, ignore_index=True)
+    cells, expected_cells = key(cube.cells), key(expected.cells)
+    pd.testing.assert_frame_equal(cells[CELL_KEYS], expected_cells[CELL_KEYS], check_dtype=False)
+    np.testing.assert_allclose(cells.drop(columns=CELL_KEYS).to_numpy(dtype=float),
+                               expected_cells.drop(columns=CELL_KEYS).to_numpy(dtype=float))
+    assert cube.moments.n == expected.moments.n
+    np.testing.assert_allclose(cube.moments.comoment, expected.moments.comoment, rtol=1e-9)
+    assert sorted(cube.state_moments.groups) == sorted(expected.state_moments.groups)
+    for state, acc in expected.state_moments.groups.items():
+        np.testing.assert_allclose(cube.state_moments.groups[state].comoment, acc.comoment, rtol=1e-9, atol=1e-6)
+
+
+def assert_aggregates_match_rebuild(store, tmp_path):
+    cleaned = incremental.export_csv(str(store), 'cleaned', str(tmp_path / 'cleaned_aadhar_data.csv'))
+    csv_path = str(tmp_path / 'cleaned_aadhar_data.csv')
+    assert_cube_equal(Cube.load(str(store / incremental.CUBE)), Cube.from_frame(cleaned, csv_path))
+    partitions = PartitionedStore.open(str(store / incremental.PARTITIONS))
+    rebuilt = PartitionedStore.from_frame(cleaned, csv_path, str(tmp_path / 'rebuilt'))
+    assert partitions.rows == rebuilt.rows == len(cleaned)
+    pd.testing.assert_frame_equal(rows(partitions.query()), rows(rebuilt.query()))
+
+
+def test_shards_added_one_at_a_time_match_one_update(shards, data_dir, tmp_path):
+    everything = tmp_path / 'everything'
+    incremental.update_store(str(everything), shards)
+    store = tmp_path / 'store'
+    for added in range(1, 4):
+        manifest, pending = incremental.update_store(
+            str(store), {dataset: paths[:added] for dataset, paths in shards.items()})
+        assert len(pending) == 3 and len(manifest['shards']) == 3 * added
+    assert update(store, data_dir)[1] == []
+    for kind in incremental.KINDS:
+        pd.testing.assert_frame_equal(incremental.load_store(str(store), kind),
+                                      incremental.load_store(str(everything), kind))
+    assert_aggregates_match_rebuild(store, tmp_path)
+
+
+def test_update_rewrites_only_the_affected_partitions(data_dir, shards, tmp_path):
+    store = tmp_path / 'store'
+    update(store, data_dir)
+    partitions = store / incremental.PARTITIONS
+
+    def inodes():
+        return {os.path.relpath(os.path.join(d, name), partitions): os.stat(os.path.join(d, name)).st_ino
+                for d, _, names in os.walk(partitions) for name in names if name.endswith('.npy')}
+
+    before = inodes()
+    new_shard(shards, 'enrolment', '15-04-2025', ['State 01'], '6000_6100')
+    new_shard(shards, 'biometric', '02-03-2025', ['State 02'], '6000_6100')
+    update(store, data_dir)
+    after = inodes()
+    changed = {os.path.dirname(path) for path in after if before.get(path) != after[path]}
+    assert changed == {os.path.join('2025-03', 'State 02'), os.path.join('2025-04', 'State 01')}
+    assert_aggregates_match_rebuild(store, tmp_path)
+
+
+def test_crash_before_commit_is_dropped(shards, tmp_path, monkeypatch):
+    store = tmp_path / 'store'
+    first = {dataset: paths[:1] for dataset, paths in shards.items()}
+    incremental.update_store(str(store), first)
+    monkeypatch.setattr(incremental, 'save_manifest', lambda *args: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        incremental.update_store(str(store), shards)
+    assert (store / incremental.STAGING_DIR).exists()
+    monkeypatch.undo()
+    assert len(incremental.load_manifest(str(store))['shards']) == 3
+    everything = tmp_path / 'everything'
+    incremental.update_store(str(everything), shards)
+    incremental.update_store(str(store), shards)
+    assert not (store / incremental.STAGING_DIR).exists()
+    pd.testing.assert_frame_equal(incremental.load_store(str(store)), incremental.load_store(str(everything)))
+    assert_aggregates_match_rebuild(store, tmp_path)
+
+
+def test_crash_after_commit_is_rolled_forward(shards, tmp_path, monkeypatch):
+    store = tmp_path / 'store'
+    apply = incremental._apply
+    monkeypatch.setattr(incremental, '_apply', lambda *args: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        incremental.update_store(str(store), shards)
+    assert (store / incremental.COMMIT_DIR).exists()
+    monkeypatch.setattr(incremental, '_apply', apply)
+    # Nothing is pending once the committed update is applied
+    assert incremental.update_store(str(store), shards)[1] == []
+    assert len(incremental.load_manifest(str(store))['shards']) == 9
+    assert_aggregates_match_rebuild(store, tmp_path)
+
+
+def test_aggregates_are_backfilled(shards, tmp_path):
+    store = tmp_path / 'store'
+    incremental.update_store(str(store), {dataset: paths[:2] for dataset, paths in shards.items()})
+    # A store from before the aggregates were kept
+    os.remove(store / incremental.CUBE)
+    incremental.update_store(str(store), shards)
+    assert_aggregates_match_rebuild(store, tmp_path)
+
+
+def test_published_aggregates_are_current(shards, tmp_path):
+    store = tmp_path / 'store'
+    incremental.update_store(str(store), shards)
+    csv_path = str(tmp_path / 'cleaned_aadhar_data.csv')
+    cleaned = incremental.export_csv(str(store), 'cleaned', csv_path)
+    cube_path, store_path = str(tmp_path / 'aadhar_cube.pkl'), str(tmp_path / 'aadhar_store')
+    incremental.publish(str(store), csv_path, cube_path, store_path)
+    assert Cube.load(cube_path).is_current(csv_path)
+    published = PartitionedStore.open(store_path)
+    assert published.is_current(csv_path) and published.rows == len(cleaned)
+    # Later updates replace the store's files, leaving the published copy alone
+    query = published.query()
+    new_shard(shards, 'enrolment', '02-03-2025', ['State 00'], '6000_6100')
+    update(store, os.path.dirname(shards['enrolment'][0]))
+    pd.testing.assert_frame_equal(PartitionedStore.open(store_path).query(), query)
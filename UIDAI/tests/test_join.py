@@ -0,0 +1,87 @@
+import os
+
+import pandas as pd
+import pytest
+
+from aadhaar import dates, join
+
+
+def in_memory_join(shards):
+    # merge_csv.py's in-memory join over every shard of each dataset
+    dictionaries = join.global_dictionaries(shards)
+    frames = [pd.concat([join.load_aligned(path, dictionaries) for path in paths], ignore_index=True)
+              for paths in shards.values()]
+    return join.merge_frames(frames)
+
+
+def repeat_key(shards, copies):
+    # Append `copies` rows of the first enrolment key to the first enrolment
+    # and demographic shards, so the two match many-to-many
+    key = pd.read_csv(shards['enrolment'][0], nrows=1)[join.KEY_COLUMNS]
+    for dataset in ['enrolment', 'demographic']:
+        path = shards[dataset][0]
+        columns = pd.read_csv(path, nrows=0).columns
+        rows = pd.concat([key] * copies, ignore_index=True)
+        for col in columns.drop(join.KEY_COLUMNS):
+            rows[col] = range(copies)
+        rows[columns].to_csv(path, mode='a', header=False, index=False)
+
+
+def test_partitioned_join_matches_in_memory_join(shards, tmp_path):
+    output = tmp_path / 'merged_aadhar_data.csv'
+    expected = tmp_path / 'expected.csv'
+    # 1 MB holds about 2,600 rows, so the 18,000 input rows span several partitions
+    rows = join.sort_merge_join(shards, str(output), memory_mb=1, spill_dir=str(tmp_path))
+    merged = in_memory_join(shards)
+    merged.to_csv(expected, index=False, date_format=dates.DATE_FORMAT)
+    assert rows == len(merged)
+    assert output.read_bytes() == expected.read_bytes()
+
+
+def test_plan_predicts_join_size(shards):
+    dictionaries = join.global_dictionaries(shards)
+    frames = [pd.concat([join.load_aligned(path, dictionaries) for path in paths], ignore_index=True)
+              for paths in shards.values()]
+    diagnostics = join.plan_join(frames)
+    join.merge_frames(frames, diagnostics=diagnostics)
+    assert diagnostics.actual_rows == diagnostics.expected_rows
+
+
+def test_many_to_many_join_aborts_before_writing(shards, tmp_path):
+    repeat_key(shards, 100)
+    output = tmp_path / 'merged_aadhar_data.csv'
+    with pytest.raises(join.JoinTooLarge):
+        join.sort_merge_join(shards, str(output), memory_mb=1, spill_dir=str(tmp_path))
+    assert not output.exists()
+    # Summing each source per key first makes the join 1:1
+    rows = join.sort_merge_join(shards, str(output), memory_mb=1, spill_dir=str(tmp_path), aggregate=True)
+    assert rows == len(pd.read_csv(output))
+
+
+def test_header_only_shard_joins(shards, tmp_path):
+    path = os.path.join(os.path.dirname(shards['demographic'][0]), 'api_data_aadhar_demographic_6000_6000.csv')
+    pd.read_csv(shards['demographic'][0], nrows=0).to_csv(path, index=False)
+    with_empty = join.discover_shards(os.path.dirname(path))
+    assert path in with_empty['demographic']
+    output = tmp_path / 'merged_aadhar_data.csv'
+    expected = tmp_path / 'expected.csv'
+    join.sort_merge_join(with_empty, str(output), memory_mb=1, spill_dir=str(tmp_path))
+    in_memory_join(shards).to_csv(expected, index=False, date_format=dates.DATE_FORMAT)
+    assert output.read_bytes() == expected.read_bytes()
+
+
+@pytest.mark.parametrize('aggregate', [False, True])
+def test_all_shards_diagnostics_match_in_memory_diagnostics(shards, tmp_path, aggregate):
+    # Duplicate keys, so the join is larger than its deduplicated output
+    repeat_key(shards, 3)
+    diagnostics = join.JoinDiagnostics(join.DATASETS)
+    join.sort_merge_join(shards, str(tmp_path / 'merged_aadhar_data.csv'), memory_mb=1, spill_dir=str(tmp_path),
+                         aggregate=aggregate, diagnostics=diagnostics)
+    dictionaries = join.global_dictionaries(shards)
+    frames = [pd.concat([join.load_aligned(path, dictionaries) for path in paths], ignore_index=True)
+              for paths in shards.values()]
+    expected = join.plan_join(frames)
+    merged = join.merge_frames(frames, aggregate=aggregate, diagnostics=expected)
+    if not aggregate:
+        assert expected.actual_rows > len(merged)
+    assert diagnostics.report() == expected.report()
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+from aadhaar import keys, synthetic
+
+SORT_COLUMNS = ['state', 'district', 'pincode', 'date']
+
+
+def random_rows(n=20000, seed=0):
+    # Repeated keys, every component missing somewhere, dates over two years
+    rng = np.random.default_rng(seed)
+    places = synthetic.geography(seed).iloc[rng.integers(0, 400, n)].reset_index(drop=True)
+    df = pd.DataFrame({
+        'date': synthetic.START_DATE + pd.to_timedelta(rng.integers(0, 730, n), unit='D'),
+        'state': places['state'].astype(object),
+        'district': places['district'].astype(object),
+        'pincode': places['pincode'].astype('float64'),
+    })
+    for col in SORT_COLUMNS:
+        df.loc[rng.random(n) < 0.01, col] = None
+    return df
+
+
+def test_packed_key_sorts_like_the_columns():
+    df = random_rows()
+    key = keys.KeyEncoder.fit([df]).encode(df)
+    expected = df.sort_values(SORT_COLUMNS, kind='stable', na_position='last').index.to_numpy()
+    assert np.array_equal(np.argsort(key, kind='stable'), expected)
+
+
+def test_location_key_sorts_like_the_location_columns():
+    df = random_rows(seed=1)
+    location = keys.location_key(keys.KeyEncoder.fit([df]).encode(df))
+    expected = df.sort_values(SORT_COLUMNS[:3], kind='stable', na_position='last').index.to_numpy()
+    assert np.array_equal(np.argsort(location, kind='stable'), expected)
+
+
+def test_decode_round_trips():
+    df = random_rows(seed=2)
+    encoder = keys.KeyEncoder.fit([df])
+    decoded = encoder.decode(encoder.encode(df))
+    pd.testing.assert_series_equal(decoded['date'], df['date'].astype('datetime64[ns]'))
+    for col in ['state', 'district']:
+        pd.testing.assert_series_equal(decoded[col], df[col].astype(decoded[col].dtype))
+    pd.testing.assert_series_equal(decoded['pincode'], df['pincode'])
+
+
+def test_first_occurrence_matches_duplicated():
+    df = random_rows(seed=3)
+    key = keys.KeyEncoder.fit([df]).encode(df)
+    assert np.array_equal(keys.first_occurrence(key), ~df.duplicated(SORT_COLUMNS, keep='first').to_numpy())
@@ -0,0 +1,90 @@
+import json
+import os
+import pstats
+import subprocess
+import sys
+
+import pytest
+
+from aadhaar import metrics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def records(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.fixture
+def metrics_file(tmp_path, monkeypatch):
+    path = tmp_path / 'metrics.jsonl'
+    monkeypatch.setenv(metrics.METRICS_ENV, str(path))
+    monkeypatch.delenv(metrics.STAGE_ENV, raising=False)
+    return path
+
+
+def test_disabled_spans_write_nothing(tmp_path, monkeypatch):
+    monkeypatch.delenv(metrics.METRICS_ENV, raising=False)
+    with metrics.span('read_csv') as s:
+        s.rows_out = 3
+    assert s.seconds is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_spans_are_recorded_inside_their_stage(metrics_file):
+    with metrics.stage('clean_data'):
+        with metrics.span('read_csv') as s:
+            s.rows_out = 10
+        with metrics.span('drop_duplicates', rows_in=10) as s:
+            s.rows_out = 7
+    spans = records(metrics_file)
+    assert [(r['kind'], r['span']) for r in spans] == [
+        ('span', 'read_csv'), ('span', 'drop_duplicates'), ('stage', 'clean_data')]
+    assert all(r['stage'] == 'clean_data' and r['pid'] == os.getpid() for r in spans)
+    assert (spans[1]['rows_in'], spans[1]['rows_out']) == (10, 7)
+    assert all(r['seconds'] >= 0 and r['rss_mb'] > 0 and r['peak_rss_mb'] > 0 for r in spans)
+    # Each time is rounded to the millisecond
+    assert spans[2]['seconds'] >= spans[0]['seconds'] + spans[1]['seconds'] - 0.002
+    assert metrics.STAGE_ENV not in os.environ
+
+
+def test_failed_span_is_marked(metrics_file):
+    with pytest.raises(ZeroDivisionError):
+        with metrics.span('groupby'):
+            1 / 0
+    assert records(metrics_file)[0]['failed'] is True
+
+
+def test_nested_stage_is_folded_into_the_outer_one(metrics_file):
+    with metrics.stage('pipeline'):
+        with metrics.stage('extract_insights'):
+            with metrics.span('groupby'):
+                pass
+    assert [(r['stage'], r['span']) for r in records(metrics_file)] == [
+        ('pipeline', 'groupby'), ('pipeline', 'pipeline')]
+
+
+def test_tracemalloc_peaks_and_profile_dump(metrics_file, tmp_path, monkeypatch):
+    monkeypatch.setenv(metrics.TRACEMALLOC_ENV, '1')
+    monkeypatch.setenv(metrics.PROFILE_ENV, str(tmp_path / 'prof'))
+    # A child process, so tracemalloc does not stay on in this one
+    code = ("from aadhaar import metrics\n"
+            "with metrics.stage('to_csv'):\n"
+            "    with metrics.span('big'):\n"
+            "        block = bytearray(20 << 20)\n"
+            "        del block\n"
+            "    with metrics.span('small'):\n"
+            "        block = bytearray(1 << 20)\n")
+    subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True)
+    big, small, stage = records(metrics_file)
+    assert big['tracemalloc_peak_mb'] >= 20 > small['tracemalloc_peak_mb'] >= 1
+    assert stage['tracemalloc_peak_mb'] >= 20
+    assert pstats.Stats(str(tmp_path / 'prof' / 'to_csv.prof')).total_calls > 0
+
+
+def test_begin_closes_the_stage_at_exit(metrics_file):
+    code = "from aadhaar import metrics\nmetrics.begin('check_merged')\nprint('done')\n"
+    subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True, capture_output=True)
+    assert [(r['kind'], r['span'], r['stage']) for r in records(metrics_file)] == [
+        ('stage', 'check_merged', 'check_merged')]
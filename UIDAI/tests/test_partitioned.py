@@ -0,0 +1,119 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from aadhaar import cleaning, dates, join, partitioned
+from aadhaar.partitioned import MEASURES, PartitionedStore
+
+
+@pytest.fixture
+def cleaned_csv(shards, tmp_path):
+    # The cleaned CSV plus one row whose date does not parse
+    dictionaries = join.global_dictionaries(shards)
+    frames = [pd.concat([join.load_aligned(path, dictionaries) for path in paths], ignore_index=True)
+              for paths in shards.values()]
+    df = cleaning.clean(join.merge_frames(frames)).reset_index(drop=True)
+    df['date'] = df['date'].dt.strftime(dates.DATE_FORMAT)
+    df.loc[len(df)] = df.iloc[0].copy()
+    df.loc[len(df) - 1, 'date'] = 'soon'
+    path = tmp_path / 'cleaned_aadhar_data.csv'
+    df.to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture
+def store(cleaned_csv, tmp_path):
+    return PartitionedStore.build(cleaned_csv, str(tmp_path / 'aadhar_store'), chunksize=1000)
+
+
+def expected_rows(cleaned_csv, start=None, end=None, states=None, districts=None):
+    df = pd.read_csv(cleaned_csv)
+    df['day'] = dates.parse_days(df['date'])
+    keep = np.ones(len(df), dtype=bool)
+    if start is not None:
+        keep &= (df['day'] >= partitioned.parse_day(start)) & (df['day'] != dates.MISSING_DAY)
+    if end is not None:
+        keep &= (df['day'] <= partitioned.parse_day(end)) & (df['day'] != dates.MISSING_DAY)
+    if states is not None:
+        keep &= df['state'].isin(states)
+    if districts is not None:
+        keep &= df['district'].isin(districts)
+    return df[keep]
+
+
+@pytest.mark.parametrize('start, end, states, districts', [
+    (None, None, None, None),
+    ('02-03-2025', None, None, None),
+    (None, '01-03-2025', ['State 03', 'State 07'], None),
+    (None, None, None, ['District 05-01', 'District 11-00']),
+    ('01-03-2025', '01-03-2025', ['State 05'], ['District 05-01']),
+])
+def test_totals_match_a_filtered_scan(cleaned_csv, store, start, end, states, districts):
+    expected = expected_rows(cleaned_csv, start, end, states, districts)
+    totals = store.totals(start=start, end=end, states=states, districts=districts)
+    np.testing.assert_allclose(totals[MEASURES].to_numpy(), expected[MEASURES].fillna(0).sum().to_numpy())
+    rows = store.query(['state', 'district', 'pincode', 'date'], start, end, states, districts)
+    assert len(rows) == len(expected)
+    assert sorted(rows['pincode'].tolist()) == sorted(expected['pincode'].tolist())
+
+
+def test_grouped_totals(cleaned_csv, store):
+    df = expected_rows(cleaned_csv)
+    by_state = store.totals(by='state')
+    expected = df.groupby('state')[MEASURES].sum()
+    assert by_state['state'].astype(str).tolist() == expected.index.tolist()
+    np.testing.assert_allclose(by_state[MEASURES].to_numpy(), expected.to_numpy())
+    by_month = store.totals(by='month')
+    assert by_month['month'].tolist() == ['2025-03', partitioned.UNKNOWN_MONTH]
+    with pytest.raises(ValueError, match='cannot group by pincode'):
+        store.totals(by='pincode')
+
+
+def test_only_matching_partitions_are_opened(store):
+    assert store.meta['invalid_dates'] == 1 and store.rows == sum(p['rows'] for p in store.meta['partitions'])
+    # The row with the unparseable date is in State 00
+    parts = store.partitions(states=['State 00'])
+    assert [(p['state'], p['month']) for p in parts] == [('State 00', partitioned.UNKNOWN_MONTH),
+                                                         ('State 00', '2025-03')]
+    # The unknown month is read only without a date range
+    assert all(p['month'] != partitioned.UNKNOWN_MONTH for p in store.partitions(start='01-01-2025'))
+    assert store.partitions(start='01-04-2025') == []
+    with pytest.raises(ValueError):
+        store.partitions(start='2025-03-01')
+
+
+def test_stale_store_is_rebuilt(cleaned_csv, store):
+    assert PartitionedStore.open_or_build(cleaned_csv, store.path).rows == store.rows
+    df = pd.read_csv(cleaned_csv)
+    df.iloc[:-10].to_csv(cleaned_csv, index=False)
+    assert not store.is_current(cleaned_csv)
+    assert PartitionedStore.open_or_build(cleaned_csv, store.path).rows == store.rows - 10
+
+
+def test_too_many_districts_are_refused(cleaned_csv, tmp_path, monkeypatch):
+    monkeypatch.setattr(partitioned, 'MAX_DISTRICTS', 100)
+    with pytest.raises(ValueError, match='distinct districts'):
+        PartitionedStore.build(cleaned_csv, str(tmp_path / 'aadhar_store'))
+
+
+def test_rebuild_swaps_the_store_atomically(cleaned_csv, store, monkeypatch):
+    old = store.totals()
+    # A crash between moving the old store aside and moving the new one in
+    replace = os.replace
+
+    def crash(source, target):
+        if source.endswith('.tmp'):
+            raise OSError('crash')
+        replace(source, target)
+
+    monkeypatch.setattr(partitioned.os, 'replace', crash)
+    with pytest.raises(OSError):
+        PartitionedStore.build(cleaned_csv, store.path)
+    assert not os.path.exists(store.path)
+    pd.testing.assert_series_equal(PartitionedStore.open(store.path).totals(), old)
+    monkeypatch.undo()
+    rebuilt = PartitionedStore.build(cleaned_csv, store.path)
+    assert rebuilt.path == store.path and not os.path.exists(store.path + '.old')
+    pd.testing.assert_series_equal(rebuilt.totals(), old)
@@ -0,0 +1,117 @@
+import os
+
+import pandas as pd
+import pytest
+
+from aadhaar import cleaning, pipeline
+from aadhaar.pipeline import Pipeline, Stage
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'source.txt').write_text('1\n')
+    return tmp_path
+
+
+def copy_stage(name, source, target, runs, params=None):
+    def run(context):
+        runs.append(name)
+        with open(source) as f:
+            text = f.read()
+        with open(target, 'w') as f:
+            f.write(text + name + '\n')
+    return Stage(name, run, inputs=[source], outputs=[target], params=params)
+
+
+def chain(runs, params=None):
+    # source.txt -> a.txt -> b.txt, and a.txt -> c.txt
+    return [copy_stage('b', 'a.txt', 'b.txt', runs), copy_stage('a', 'source.txt', 'a.txt', runs, params),
+            copy_stage('c', 'a.txt', 'c.txt', runs)]
+
+
+def test_stages_run_in_dependency_order(workdir):
+    runs = []
+    assert Pipeline(chain(runs)).run() == {'a': 'ran', 'b': 'ran', 'c': 'ran'}
+    assert runs == ['a', 'b', 'c']
+    assert (workdir / 'b.txt').read_text() == '1\na\nb\n'
+
+
+def test_cycles_are_rejected(workdir):
+    stages = [copy_stage('a', 'b.txt', 'a.txt', []), copy_stage('b', 'a.txt', 'b.txt', [])]
+    with pytest.raises(ValueError, match='cycle'):
+        Pipeline(stages).order()
+
+
+def test_unchanged_stages_are_skipped(workdir):
+    runs = []
+    Pipeline(chain(runs)).run()
+    runs.clear()
+    assert set(Pipeline(chain(runs)).run().values()) == {'skipped'}
+    assert runs == []
+    # An edited output is made again; it comes out as before, so the
+    # stages that read it stay skipped
+    (workdir / 'a.txt').write_text('edited\n')
+    Pipeline(chain(runs)).run()
+    assert runs == ['a']
+    runs.clear()
+    # A changed input reruns the stages downstream of it
+    (workdir / 'source.txt').write_text('2\n')
+    assert Pipeline(chain(runs)).run() == {'a': 'ran', 'b': 'ran', 'c': 'ran'}
+    runs.clear()
+    # So do new parameters, and forcing a stage
+    Pipeline(chain(runs, params={'aggregate': True})).run(force=['c'])
+    assert runs == ['a', 'c']
+
+
+def test_failed_stage_blocks_its_dependents(workdir):
+    runs = []
+    stages = chain(runs)
+    stages[1].run = lambda context: 1 / 0
+    assert Pipeline(stages).run() == {'a': 'failed', 'b': 'blocked', 'c': 'blocked'}
+    # Nothing was recorded, so the next run tries again
+    assert Pipeline(chain(runs)).run() == {'a': 'ran', 'b': 'ran', 'c': 'ran'}
+
+
+def test_parallel_leaves_run_scripts(workdir):
+    script = workdir / 'leaf.py'
+    script.write_text("print('leaf ran')\nopen('leaf.txt', 'w').write(open('a.txt').read())\n")
+    failing = workdir / 'failing.py'
+    failing.write_text("import sys\nsys.exit(3)\n")
+    runs = []
+    stages = chain(runs)[1:2] + [
+        Stage('leaf', str(script), inputs=['a.txt'], outputs=['leaf.txt'], code=[str(script)], parallel=True),
+        Stage('failing', str(failing), inputs=['a.txt'], code=[str(failing)], parallel=True),
+    ]
+    assert Pipeline(stages).run(workers=2) == {'a': 'ran', 'leaf': 'ran', 'failing': 'failed'}
+    assert (workdir / 'leaf.txt').read_text() == '1\na\n'
+    assert (workdir / pipeline.STATE_DIR / 'leaf.log').read_text() == 'leaf ran\n'
+    # Only the failed leaf is tried again
+    assert Pipeline(stages).run(workers=2) == {'a': 'skipped', 'leaf': 'skipped', 'failing': 'failed'}
+    # A parallel stage cannot feed another one
+    with pytest.raises(ValueError):
+        Pipeline(stages + [Stage('after', str(script), inputs=['leaf.txt'], parallel=True)])
+
+
+def test_code_files_follow_imports():
+    script = os.path.join(pipeline.SCRIPTS, 'extract_insights.py')
+    files = {os.path.basename(path) for path in pipeline.code_files([script])}
+    # extract_insights.py imports the cube, which imports the correlation accumulators
+    assert {'extract_insights.py', 'cube.py', 'correlation.py'} <= files
+    assert 'join.py' not in files
+
+
+def test_clean_takes_the_merged_frame_in_memory(shards, workdir, monkeypatch):
+    stages = [stage for stage in pipeline.build_stages(shards, all_shards=True) if not stage.parallel]
+    assert Pipeline(stages).run() == {'merge': 'ran', 'clean': 'ran'}
+    cleaned = pd.read_csv(pipeline.CLEANED)
+    assert len(cleaned) == len(cleaning.clean(pd.read_csv(pipeline.MERGED)))
+    assert os.path.exists(pipeline.CUBE_FILE) and os.path.exists(pipeline.STORE_META)
+    assert Pipeline(stages).run() == {'merge': 'skipped', 'clean': 'skipped'}
+
+    # With the in-memory merge, clean never re-reads the merged CSV
+    in_memory = [path for paths in shards.values() for path in paths[:1]]
+    stages = [stage for stage in pipeline.build_stages(in_memory) if not stage.parallel]
+    monkeypatch.setattr(pipeline.dedup, 'clean_csv', lambda *args: 1 / 0)
+    assert Pipeline(stages).run() == {'merge': 'ran', 'clean': 'ran'}
+    assert len(pd.read_csv(pipeline.CLEANED)) == len(cleaning.clean(pd.read_csv(pipeline.MERGED)))
@@ -0,0 +1,38 @@
+import os
+
+import pandas as pd
+
+from aadhaar import profiler, sketch
+
+
+def test_merged_shard_profiles_match_one_profile_of_all_rows(shards, tmp_path):
+    paths = shards['demographic']
+    combined = tmp_path / 'api_data_aadhar_demographic_0_6000.csv'
+    pd.concat([pd.read_csv(path, dtype=str) for path in paths]).to_csv(combined, index=False)
+    merged = profiler.merge_profiles([profiler.profile_file(path) for path in paths], 'all')
+    whole = profiler.profile_file(str(combined))
+    whole.name = 'all'
+    assert merged.report() == whole.report()
+
+
+def test_process_pool_gives_the_same_profiles(shards):
+    paths = shards['biometric'] + [os.path.join(os.path.dirname(shards['biometric'][0]), 'missing.csv')]
+    serial = profiler.profile_files(paths, workers=1)
+    pooled = profiler.profile_files(paths, workers=2)
+    assert list(pooled) == paths
+    assert pooled[paths[-1]] is None
+    for path in paths[:-1]:
+        assert pooled[path].report() == serial[path].report()
+
+
+def test_write_reports(shards, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    paths = shards['enrolment']
+    profiler.write_reports(paths, dataset='api_data_aadhar_enrolment', workers=1, duplicate_mode='sorted')
+    for path in paths:
+        with open(profiler.report_filename(path)) as f:
+            assert f.read() == profiler.profile_file(path).report()
+        assert os.path.exists(sketch.sketch_filename(path))
+    with open('analysis_report_api_data_aadhar_enrolment_all.txt') as f:
+        assert f'Dataset Shape: ({sum(len(pd.read_csv(p)) for p in paths)}, 7)' in f.read()
+    assert os.path.exists('duplicates_report_api_data_aadhar_enrolment.txt')
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aadhaar import profiler
+
+
+@pytest.fixture
+def shard(shards):
+    # An enrolment shard with some exact duplicate rows and empty cells
+    path = shards['enrolment'][0]
+    df = pd.read_csv(path, dtype=str)
+    df = pd.concat([df, df.sample(40, random_state=0)], ignore_index=True)
+    df.loc[[5, 6, 7], 'age_5_17'] = None
+    df.to_csv(path, index=False)
+    return path
+
+
+def test_profile_matches_pandas(shard):
+    df = pd.read_csv(shard)
+    profile = profiler.profile_file(shard, chunksize=300)
+    assert profile.rows == len(df)
+    assert profile.columns == list(df.columns)
+    assert {col: profile.nulls[col] for col in df.columns} == df.isnull().sum().to_dict()
+    assert profile.duplicates == df.duplicated().sum()
+    assert profile.rows_seen.exact
+    for col in ['age_0_5', 'age_5_17', 'age_18_greater', 'pincode']:
+        np.testing.assert_allclose(profile.numeric[col].describe(), df[col].describe().to_numpy())
+    assert len(profile.uniques['district']) == df['district'].nunique()
+
+
+def test_report_does_not_depend_on_chunk_size(shard):
+    assert profiler.profile_file(shard, chunksize=250).report() == profiler.profile_file(shard).report()
+
+
+def test_row_sample_stays_bounded():
+    rng = np.random.default_rng(0)
+    rows = rng.integers(0, 2 ** 64 - 1, 200000, dtype=np.uint64, endpoint=True)
+    rows = np.concatenate([rows, rows[:3000]])
+    sample = profiler.RowSample(capacity=10000)
+    for start in range(0, len(rows), 7000):
+        sample.add(rows[start:start + 7000])
+        assert len(sample.hashes) <= 10000
+    assert not sample.exact
+    # Duplicate groups are sampled at rate 2**-level
+    assert abs(sample.duplicates - 3000) < 5 * np.sqrt(3000 * (1 << sample.level))
+
+
+def test_row_sample_is_exact_below_capacity():
+    rows = np.arange(5000, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+    sample = profiler.RowSample(capacity=10000).add(rows).add(rows[:100])
+    assert sample.exact and sample.duplicates == 100
+    unbounded = profiler.RowSample(capacity=None)
+    for _ in range(3):
+        unbounded.add(rows)
+    assert unbounded.exact and unbounded.duplicates == 10000
+
+
+def test_row_samples_merge_like_one_sample():
+    rng = np.random.default_rng(1)
+    rows = rng.integers(0, 2 ** 64 - 1, 60000, dtype=np.uint64, endpoint=True)
+    rows = np.concatenate([rows, rows[::7]])
+    whole = profiler.RowSample(capacity=8000).add(rows)
+    merged = profiler.RowSample(capacity=8000)
+    for part in np.array_split(rows, 5):
+        merged.merge(profiler.RowSample(capacity=8000).add(part))
+    assert (merged.duplicates, merged.level) == (whole.duplicates, whole.level)
+
+
+def test_estimated_duplicates_are_labelled(shard, monkeypatch):
+    monkeypatch.setattr(profiler, 'SAMPLE_CAPACITY', 500)
+    report = profiler.profile_file(shard).report()
+    assert 'Number of Duplicate Rows: ~' in report
+    exact = profiler.profile_file(shard, exact_duplicates=True).report()
+    assert f'Number of Duplicate Rows: {pd.read_csv(shard).duplicated().sum()}\n' in exact
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aadhaar import ranking
+
+
+@pytest.mark.parametrize('n', [5, 4096, 10000])
+@pytest.mark.parametrize('k', [1, 10, 500])
+def test_select_breaks_ties_like_nlargest_and_nsmallest(n, k):
+    # Few distinct values, so most of the k best tie with each other
+    values = pd.Series(np.random.default_rng(n + k).integers(0, 20, n).astype('float64'))
+    assert ranking.select(values, k) == values.nlargest(k, keep='first').index.tolist()
+    assert ranking.select(values, k, largest=False) == values.nsmallest(k, keep='first').index.tolist()
+
+
+def grouped(shards):
+    # The scripts' groupby over every shard of every dataset
+    frames = [pd.read_csv(path) for paths in shards.values() for path in paths]
+    table = pd.concat(frames, ignore_index=True).groupby(['state', 'district'])[ranking.MEASURES].sum()
+    return ranking.derive(table)
+
+
+@pytest.mark.parametrize('metric', ['total_enrolment', 'age_18_greater', 'coverage_rate'])
+def test_ranking_matches_groupby(shards, metric):
+    ranked = ranking.from_csv([path for paths in shards.values() for path in paths])
+    table = grouped(shards)
+    for largest, pick in [(True, table[metric].nlargest), (False, table[metric].nsmallest)]:
+        result = ranked.rank(metric, largest=largest)
+        expected = pick(ranking.TOP_K, keep='first')
+        assert list(zip(result['state'], result['district'])) == expected.index.tolist()
+        np.testing.assert_allclose(result[metric].to_numpy(), expected.to_numpy())
+
+
+def test_select_breaks_ties_by_label(monkeypatch):
+    monkeypatch.setattr(ranking, 'BLOCK', 64)
+    rng = np.random.default_rng(0)
+    labels = [f'District {i:04d}' for i in rng.permutation(1000)]
+    values = rng.integers(0, 5, 1000).astype('float64')
+    table = pd.Series(values, index=labels).sort_index()
+    for k in [1, 10, 300]:
+        for largest, pick in [(True, table.nlargest), (False, table.nsmallest)]:
+            chosen = ranking.select(values, k, largest, labels)
+            assert [labels[i] for i in chosen] == pick(k, keep='first').index.tolist()
+
+
+def test_rank_materializes_only_the_winners(monkeypatch):
+    # Keys arrive in reverse order; all but one tie, and one is zero
+    keys = [f'District {i:02d}' for i in range(20, 0, -1)]
+    chunk = pd.DataFrame({'district': keys, 'age_0_5': [5.0] * 19 + [0.0], 'demo_age_17_': 1.0})
+    ranked = ranking.Ranking(['district']).update(chunk)
+    monkeypatch.setattr(ranking.Ranking, 'table', lambda self: 1 / 0)
+    top = ranked.top('age_0_5', 3)
+    assert top['district'].tolist() == ['District 02', 'District 03', 'District 04']
+    assert top.index.tolist() == [0, 1, 2] and top['total_enrolment'].tolist() == [5.0] * 3
+    assert ranked.bottom('age_0_5', 2)['district'].tolist() == ['District 01', 'District 02']
+    assert ranked.bottom('age_0_5', 2, nonzero=True)['district'].tolist() == ['District 02', 'District 03']
+    assert ranked.top('coverage_rate', 2, nonzero='age_0_5')['coverage_rate'].tolist() == [500.0, 500.0]
+    assert ranking.Ranking(['state', 'district']).top('rows').empty
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aadhaar import columnar, ingest, join, profiler, schema
+
+ENGINES = ['c'] + (['pyarrow'] if ingest.pa_csv is not None else [])
+
+
+def blank_counts(path, rows, column):
+    # Empty `column` cells in the given rows of a shard
+    df = pd.read_csv(path, dtype=str)
+    df.loc[rows, column] = None
+    df.to_csv(path, index=False)
+
+
+def header_only(path):
+    empty = path.replace('_0_2000.csv', '_6000_6000.csv')
+    pd.read_csv(path, nrows=0).to_csv(empty, index=False)
+    return empty
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_missing_counts_read_as_nan(shards, engine):
+    path = shards['demographic'][0]
+    blank_counts(path, [3, 4], 'demo_age_5_17')
+    (df,) = schema.read_chunks(path, engine=engine)
+    # A float that holds every value of the column's integer type; columns
+    # without gaps keep theirs
+    assert schema.DEMOGRAPHIC.dtype('demo_age_5_17') == np.uint16
+    assert df['demo_age_5_17'].dtype == np.float32
+    assert df['demo_age_5_17'].isna().sum() == 2
+    assert df['demo_age_17_'].dtype == schema.DEMOGRAPHIC.dtype('demo_age_17_')
+
+
+def test_merged_counts_must_be_present(tmp_path):
+    path = tmp_path / 'merged_aadhar_data.csv'
+    pd.DataFrame({col: [None] if col != 'date' else ['01-03-2025'] for col in schema.MERGED.columns}).assign(
+        state='State 00', district='District 00-00', pincode=110001).to_csv(path, index=False)
+    with pytest.raises(schema.SchemaError):
+        schema.load(str(path))
+
+
+def test_missing_counts_are_profiled_and_zero_filled(shards, tmp_path):
+    path = shards['biometric'][1]
+    blank_counts(path, [3, 4], 'bio_age_5_17')
+    profile = profiler.profile_file(path)
+    assert profile.nulls['bio_age_5_17'] == 2
+    output = tmp_path / 'merged_aadhar_data.csv'
+    join.sort_merge_join(shards, str(output), spill_dir=str(tmp_path))
+    merged = pd.read_csv(output)
+    assert not merged[list(schema.MERGED.counts)].isna().any(axis=None)
+    assert len(merged) == len(merged.drop_duplicates(join.KEY_COLUMNS))
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_header_only_shard(shards, engine):
+    path = header_only(shards['enrolment'][0])
+    chunks = list(schema.read_chunks(path, engine=engine))
+    assert [chunk.shape for chunk in chunks] == [(0, len(schema.ENROLMENT.columns))]
+    assert schema.load(path).shape == (0, len(schema.ENROLMENT.columns))
+    assert columnar.load_shard(path).shape == (0, len(schema.ENROLMENT.columns))
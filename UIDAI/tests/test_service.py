@@ -0,0 +1,129 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from aadhaar import cleaning, columnar, dates, join, service
+from aadhaar.cube import MEASURES
+from aadhaar.service import LRUCache, QueryError, QueryService
+
+
+@pytest.fixture
+def cleaned_csv(shards, tmp_path):
+    dictionaries = join.global_dictionaries(shards)
+    frames = [pd.concat([join.load_aligned(path, dictionaries) for path in paths], ignore_index=True)
+              for paths in shards.values()]
+    df = cleaning.clean(join.merge_frames(frames)).reset_index(drop=True)
+    path = tmp_path / 'cleaned_aadhar_data.csv'
+    df.to_csv(path, index=False, date_format=dates.DATE_FORMAT)
+    return str(path)
+
+
+@pytest.fixture
+def svc(cleaned_csv):
+    return QueryService(cleaned_csv, cache_size=4)
+
+
+def params(**values):
+    return {name: value if isinstance(value, list) else [str(value)] for name, value in values.items()}
+
+
+def test_totals_top_and_timeseries_match_pandas(cleaned_csv, svc):
+    df = pd.read_csv(cleaned_csv)
+    df['total_enrolment'] = df[['age_0_5', 'age_5_17', 'age_18_greater']].sum(axis=1)
+    index = svc.index
+    totals = index.totals(states=['State 03'], start=dates.parse_days(pd.Series(['02-03-2025']))[0])
+    rows = df[(df['state'] == 'State 03') & (df['date'] == '02-03-2025')]
+    np.testing.assert_allclose([totals[col] for col in MEASURES], rows[MEASURES].sum().to_numpy(), rtol=1e-6)
+    assert totals['rows'] == len(rows)
+
+    top = index.top('total_enrolment', level='state', k=3)
+    expected = df.groupby('state')['total_enrolment'].sum().nlargest(3, keep='first')
+    assert [row['state'] for row in top] == expected.index.tolist()
+    np.testing.assert_allclose([row['total_enrolment'] for row in top], expected.to_numpy(), rtol=1e-6)
+    bottom = index.top('total_enrolment', level='district', k=2, order='bottom')
+    expected = df.groupby(['state', 'district'])['total_enrolment'].sum().nsmallest(2, keep='first')
+    assert [(row['district']['state'], row['district']['district']) for row in bottom] == expected.index.tolist()
+
+    series = index.timeseries('rows', districts=['District 05-01'])
+    expected = df[df['district'] == 'District 05-01'].groupby('date').size()
+    assert [(row['period'], row['rows']) for row in series] == list(expected.items())
+    assert [row['period'] for row in index.timeseries('rows', freq='month')] == ['2025-03']
+
+
+def test_answers_are_cached_per_generation(svc):
+    first = svc.answer('/totals', params(state='State 01'))
+    assert (svc.cache.hits, svc.cache.misses) == (0, 1)
+    # The order of parameters does not matter
+    assert svc.answer('/top', params(k=3, metric='rows')) == svc.answer('/top', params(metric='rows', k=3))
+    assert svc.answer('/totals', params(state='State 01')) is first
+    assert (svc.cache.hits, svc.cache.misses) == (2, 2)
+    svc.reload()
+    assert svc.cache.items == {} and svc.current[1] == 1
+    assert svc.answer('/totals', params(state='State 01')) == first
+    assert svc.cache.misses == 3
+
+
+def test_lru_cache_evicts_the_least_recent():
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    assert list(cache.items) == ['a', 'c']
+    assert cache.get('b') is None and (cache.hits, cache.misses) == (1, 1)
+
+
+@pytest.mark.parametrize('path, query', [
+    ('/top', params(metric='height')),
+    ('/top', params(k='ten')),
+    ('/top', params(level='country')),
+    ('/totals', params(start='2025-03-01')),
+    ('/totals', params(pincode='11000a')),
+    ('/totals', params(pincode='99999999999')),
+])
+def test_bad_parameters_are_query_errors(svc, path, query):
+    with pytest.raises(QueryError):
+        svc.answer(path, query)
+
+
+def test_unknown_endpoint(svc):
+    with pytest.raises(LookupError):
+        svc.answer('/nothing', {})
+
+
+def test_touched_file_is_hashed_once(svc, cleaned_csv, monkeypatch):
+    hashed = []
+    file_hash = columnar.file_hash
+    monkeypatch.setattr(columnar, 'file_hash', lambda path: hashed.append(path) or file_hash(path))
+    assert not svc.changed() and hashed == []
+    st = os.stat(cleaned_csv)
+    os.utime(cleaned_csv, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert not svc.changed() and not svc.changed()
+    assert hashed == [cleaned_csv]
+    # A real edit is still seen
+    df = pd.read_csv(cleaned_csv)
+    df.iloc[:-5].to_csv(cleaned_csv, index=False)
+    assert svc.changed()
+
+
+def test_watch_reloads_a_changed_csv(svc, cleaned_csv):
+    rows = svc.index.rows
+    df = pd.read_csv(cleaned_csv)
+    df.iloc[:-5].to_csv(cleaned_csv, index=False)
+    stop = threading.Event()
+    polls = []
+    # Stop after the poll that sees the file, and the one that finds it settled
+    real_wait = stop.wait
+
+    def wait(interval):
+        polls.append(interval)
+        if len(polls) > 3:
+            stop.set()
+        return real_wait(0)
+
+    stop.wait = wait
+    svc.watch(interval=0.01, stop=stop)
+    assert svc.index.rows == rows - 5 and svc.reloads == 1
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aadhaar import dates, sketch
+
+
+@pytest.mark.parametrize('n', [50, 2000, 40000, 400000])
+@pytest.mark.parametrize('precision', [10, sketch.PRECISION, 14])
+def test_estimate_within_error_bound(n, precision):
+    hashes, _ = sketch.hash_values(pd.Series(np.arange(n) * 7919 + precision))
+    hll = sketch.HyperLogLog(precision).add(hashes)
+    # Four standard errors
+    assert abs(hll.estimate() - n) <= 4 * hll.error * n
+
+
+def test_default_error_gives_default_precision():
+    assert sketch.precision_for(sketch.ERROR) == sketch.PRECISION
+    for precision in range(sketch.MIN_PRECISION, sketch.MAX_PRECISION + 1):
+        assert sketch.precision_for(sketch.HyperLogLog(precision).error) == precision
+
+
+def test_union_of_shards_equals_sketch_of_their_rows(shards):
+    paths = shards['enrolment'] + shards['biometric']
+    frames = [pd.read_csv(path) for path in paths]
+    merged = sketch.ShardSketch()
+    for df in frames:
+        merged.merge(sketch.ShardSketch().update(df))
+    combined = sketch.ShardSketch().update(pd.concat(frames, ignore_index=True))
+    for col in sketch.COLUMNS:
+        assert merged.count(col) == combined.count(col)
+    assert merged.count('state') == pd.concat(frames)['state'].nunique()
+
+
+def test_date_range_counts_rows_in_range(shards):
+    df = pd.concat([pd.read_csv(path) for path in shards['demographic']], ignore_index=True)
+    days = dates.parse_days(df['date'])
+    start = int(np.unique(days)[0])
+    in_range = df[days == start]
+    whole = sketch.ShardSketch().update(df)
+    part = sketch.ShardSketch().update(in_range)
+    for col in sketch.COLUMNS:
+        assert whole.count(col, start, start) == part.count(col)
+
+
+def test_save_and_load_round_trip(shards, tmp_path):
+    original = sketch.ShardSketch().update(pd.read_csv(shards['enrolment'][0]))
+    path = tmp_path / 'distinct_sketch.npz'
+    original.save(path)
+    loaded = sketch.ShardSketch.load(path)
+    assert loaded.report() == original.report()
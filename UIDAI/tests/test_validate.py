@@ -0,0 +1,97 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from aadhaar import cleaning, dates, join, validate
+
+SCRIPTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'merge_folder')
+
+
+@pytest.fixture
+def merged(shards):
+    dictionaries = join.global_dictionaries(shards)
+    frames = [pd.concat([join.load_aligned(path, dictionaries) for path in paths], ignore_index=True)
+              for paths in shards.values()]
+    return join.merge_frames(frames)
+
+
+def write(df, path):
+    df.to_csv(path, index=False, date_format=dates.DATE_FORMAT)
+    return str(path)
+
+
+def test_pipeline_outputs_pass(merged, tmp_path):
+    report = validate.validate(write(merged, tmp_path / 'merged.csv'), validate.merged_rules(), chunksize=1000)
+    assert report.errors == [] and report.rows == len(merged)
+    # Placeholders are only a warning before cleaning
+    assert report.rules['placeholders'].count == cleaning.placeholder_mask(merged).sum() > 0
+    cleaned = cleaning.clean(merged)
+    report = validate.validate(write(cleaned, tmp_path / 'cleaned.csv'), validate.cleaned_rules(), chunksize=1000)
+    assert all(rule.passed for rule in report.rules.values())
+    assert 'Result: passed' in report.text()
+
+
+def test_defects_are_counted_and_located(merged, tmp_path):
+    df = cleaning.clean(merged).head(300).reset_index(drop=True).astype({'pincode': object})
+    df['date'] = df['date'].dt.strftime(dates.DATE_FORMAT)
+    df.loc[5, 'age_0_5'] = -1
+    df.loc[7, 'date'] = '31-02-2025'
+    df.loc[9, 'pincode'] = 12345
+    df.loc[11, 'bio_age_17_'] = np.nan
+    path = write(df, tmp_path / 'cleaned.csv')
+    for chunksize in [4, 1000]:
+        report = validate.validate(path, validate.cleaned_rules(), chunksize=chunksize)
+        assert {name: (rule.count, rule.examples) for name, rule in report.rules.items() if not rule.passed} == {
+            'negative_counts': (1, [5]), 'bad_dates': (1, [7]), 'bad_pincodes': (1, [9]),
+            'missing_values': (1, [11]), 'key_order': (1, [9])}
+        assert '31-02-2025' in report.rules['bad_dates'].summary()
+        assert [rule.name for rule in report.errors] == ['key_order', 'missing_values', 'negative_counts',
+                                                         'bad_dates', 'bad_pincodes']
+
+
+def test_unsorted_duplicates_are_counted_exactly(merged, tmp_path):
+    cleaned = cleaning.clean(merged)
+    # Three repeated keys, far from their first rows
+    df = pd.concat([cleaned, cleaned.iloc[[10, 500, 900]]], ignore_index=True)
+    path = write(df.sample(frac=1, random_state=0), tmp_path / 'shuffled.csv')
+    report = validate.validate(path, validate.cleaned_rules(), chunksize=1000)
+    assert not report.rules['key_order'].passed
+    assert report.rules['duplicate_keys'].count == 3
+    assert 'second pass' in report.rules['duplicate_keys'].summary()
+    exact = validate.validate(path, validate.cleaned_rules(exact_duplicates=True), chunksize=1000)
+    assert exact.rules['duplicate_keys'].count == 3
+
+
+def test_pincode_under_two_states_is_a_warning(merged, tmp_path):
+    df = cleaning.clean(merged).reset_index(drop=True)
+    pincode = df.loc[0, 'pincode']
+    other = df.loc[df['state'] != df.loc[0, 'state']].index[-1]
+    df.loc[other, 'pincode'] = pincode
+    report = validate.validate(write(df, tmp_path / 'cleaned.csv'), validate.cleaned_rules())
+    rule = report.rules['pincode_state']
+    assert (rule.count, rule.examples, rule.severity) == (1, [other], 'warning')
+    assert rule not in report.errors
+
+
+def test_rule_without_check_cannot_be_created():
+    class Unfinished(validate.Rule):
+        name = 'unfinished'
+
+    with pytest.raises(TypeError):
+        Unfinished()
+
+
+@pytest.mark.parametrize('negative', [False, True])
+def test_check_cleaned_exit_status(merged, tmp_path, negative):
+    df = cleaning.clean(merged)
+    if negative:
+        df.loc[df.index[3], 'age_0_5'] = -1
+    write(df, tmp_path / 'cleaned_aadhar_data.csv')
+    result = subprocess.run([sys.executable, os.path.join(SCRIPTS, 'check_cleaned.py')], cwd=tmp_path,
+                            capture_output=True, text=True)
+    assert result.returncode == (1 if negative else 0)
+    assert ('Result: FAILED' if negative else 'Result: passed') in result.stdout